@@ -1,12 +1,36 @@
 # -*- coding: utf-8 -*-
 """Top-level package for f5mku."""
-from .f5mku import decrypt, encrypt, extract_salt
 
-__all__ = [
-    "encrypt",
-    "decrypt",
-    "extract_salt",
-]
+import importlib
+
+# public names are imported lazily on first access, keeps `import f5mkupy` and the cli fast
+_LAZY_ATTRIBUTES = {
+    "DecryptCache": ".cache",
+    "F5MkuCipher": ".f5mku",
+    "F5Result": ".f5mku",
+    "encrypt": ".f5mku",
+    "decrypt": ".f5mku",
+    "derive_salt": ".f5mku",
+    "encrypt_many": ".f5mku",
+    "decrypt_many": ".f5mku",
+    "extract_salt": ".f5mku",
+    "matches": ".f5mku",
+    "compare_many": ".f5mku",
+    "encrypt_bytes": ".f5mku",
+    "decrypt_bytes": ".f5mku",
+    "decrypt_many_bytes": ".f5mku",
+    "Validation": ".validation",
+    "validate": ".validation",
+    "validate_many": ".validation",
+    "identify_key": ".identify",
+    "identify_keys": ".identify",
+    "enable_decrypt_cache": ".f5mku",
+    "disable_decrypt_cache": ".f5mku",
+    "clear_caches": ".f5mku",
+}
+
+# the public names are exactly the lazily imported ones
+__all__ = [*_LAZY_ATTRIBUTES]
 __author__ = """Simon Kowallik"""
 __email__ = "github@simonkowallik.com"
 __version__ = "1.0.1"  # pyproject.toml
@@ -15,3 +39,17 @@ __projectname__ = "f5mkupy"
 __description__ = "f5mkupy allows to encrypt and decrypt data using the format used in F5 BIG-IP bigip*.conf files with the key retrieved by f5mku -K."
 __license__ = "ISC"
 __homepage__ = "https://github.com/simonkowallik/f5mkupy"
+
+
+def __getattr__(name):
+    """Imports public names from their submodule on first access."""
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
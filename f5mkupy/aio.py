@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""Asyncio API of f5mkupy.
+
+Encryption, decryption and config rewrites run in an executor, so that large
+batches or configs don't block the event loop. Work is split into batches, the
+number of batches running in the executor at the same time is limited per
+AsyncF5MkuCipher and results are produced in order.
+"""
+
+import asyncio
+import os
+import sys
+from collections import deque
+from concurrent.futures import Executor
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from .conf import (
+    RewriteStats,
+    _atomic_writer,
+    _batches,
+    _line_aligned_chunks,
+)
+from .conf import _rewrite_batch as _rewrite_conf_batch
+from .conf import _rewrite_chunk, _SecretContexts
+from .f5mku import F5MkuCipher, F5Result, _as_cipher
+
+__all__ = [
+    "AsyncF5MkuCipher",
+]
+
+_BATCH_SIZE = 1024
+_CHUNK_SIZE = 4 * 1024 * 1024
+
+_T = TypeVar("_T")
+
+
+class AsyncF5MkuCipher:
+    """Async wrapper of F5MkuCipher running the work in an executor.
+    Examples:
+        >>> async def main():
+        ...     cipher = AsyncF5MkuCipher("BHDLd0bbao1VlwpTk1sioQ==")
+        ...     return await cipher.decrypt("$M$iP$rr0su9oHn9J9p1t3nRzydA==")
+        >>> asyncio.run(main())
+        'KEY45678'
+    Args:
+        f5mku (str): f5mku base64 key or F5MkuCipher.
+        executor (Executor): Optional ThreadPoolExecutor or ProcessPoolExecutor,
+            the default executor of the event loop is used if not provided.
+        max_concurrency (int): Maximum number of batches running in the executor at
+            the same time, further batches wait and are not read from their source.
+        batch_size (int): Number of items or lines processed per executor call.
+    """
+
+    def __init__(
+        self,
+        f5mku: Union[str, F5MkuCipher],
+        executor: Optional[Executor] = None,
+        max_concurrency: int = 4,
+        batch_size: int = _BATCH_SIZE,
+    ):
+        if max_concurrency < 1:
+            raise ValueError(
+                f"max_concurrency must be a positive integer, got: {max_concurrency}"
+            )
+        self.cipher = _as_cipher(f5mku)
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} fingerprint={self.cipher.fingerprint}>"
+
+    async def encrypt(
+        self,
+        plaintext: str,
+        salt: Optional[str] = None,
+        context: Optional[Union[str, bytes]] = None,
+    ) -> str:
+        """Encrypts `plaintext` with `salt` or salt `context`, see `F5MkuCipher.encrypt`."""
+        return await self._run(self.cipher.encrypt, plaintext, salt, context)
+
+    async def decrypt(self, ciphertext: str) -> str:
+        """Decrypts `ciphertext`, see `F5MkuCipher.decrypt`."""
+        return await self._run(self.cipher.decrypt, ciphertext)
+
+    async def matches(self, plaintext: str, ciphertext: str) -> bool:
+        """Checks if `ciphertext` is the encrypted `plaintext`, see `F5MkuCipher.matches`."""
+        return await self._run(self.cipher.matches, plaintext, ciphertext)
+
+    async def encrypt_many(
+        self,
+        plaintexts: Iterable[str],
+        salts: Optional[Iterable[Optional[str]]] = None,
+    ) -> List[F5Result]:
+        """Encrypts all `plaintexts` in batches, see `F5MkuCipher.encrypt_many`."""
+        plaintexts = list(plaintexts)
+        salts = [None] * len(plaintexts) if salts is None else list(salts)
+        if len(salts) != len(plaintexts):
+            raise ValueError(
+                f"Number of salts ({len(salts)}) does not match "
+                f"number of plaintexts ({len(plaintexts)})."
+            )
+        return await self._map_batches(
+            self.cipher.encrypt_many,
+            (
+                (
+                    plaintexts[start : start + self.batch_size],
+                    salts[start : start + self.batch_size],
+                )
+                for start in range(0, len(plaintexts), self.batch_size)
+            ),
+        )
+
+    async def decrypt_many(self, ciphertexts: Iterable[str]) -> List[F5Result]:
+        """Decrypts all `ciphertexts` in batches, see `F5MkuCipher.decrypt_many`."""
+        return await self._map_batches(
+            self.cipher.decrypt_many,
+            ((batch,) for batch in _batches(ciphertexts, self.batch_size)),
+        )
+
+    async def compare_many(self, pairs: Iterable[Tuple[str, str]]) -> List[F5Result]:
+        """Checks all (plaintext, ciphertext) `pairs` in batches, see `F5MkuCipher.compare_many`."""
+        return await self._map_batches(
+            self.cipher.compare_many,
+            ((batch,) for batch in _batches(pairs, self.batch_size)),
+        )
+
+    async def rewrite_lines(
+        self,
+        lines: Union[Iterable[bytes], AsyncIterable[bytes]],
+        target_f5mku: Optional[Union[str, F5MkuCipher]] = None,
+        stats: Optional[RewriteStats] = None,
+        salt_context: Optional[str] = None,
+    ) -> AsyncIterator[bytes]:
+        """Decrypts secrets in `lines` and optionally re-encrypts them with `target_f5mku`.
+        `lines` can be an async iterable, like a StreamReader of a config download.
+        Lines are only read ahead as far as batches can be processed, see `max_concurrency`.
+        Args:
+            lines (AsyncIterable[bytes]): lines of a bigip*.conf file.
+            target_f5mku (str): Optional f5mku base64 key or F5MkuCipher to re-encrypt
+                secrets, secrets are written in plaintext if not provided.
+            stats (RewriteStats): Optional counters to update.
+            salt_context (str): Optional prefix of deterministic salt contexts, see
+                `conf.rewrite_lines`. Batches are rewritten one at a time then, as
+                salt contexts depend on the preceding lines.
+        Returns:
+            Async iterator of rewritten lines.
+        """
+        target_cipher = _as_cipher(target_f5mku) if target_f5mku is not None else None
+        if stats is None:
+            stats = RewriteStats()
+        if salt_context is None or target_cipher is None:
+            batches = (
+                (batch, self.cipher, target_cipher)
+                async for batch in _async_batches(lines, self.batch_size)
+            )
+            results = self._ordered_map(_rewrite_batch, batches)
+        else:
+            results = self._rewrite_batches_in_order(
+                lines, target_cipher, _SecretContexts(salt_context)
+            )
+        async for rewritten, batch_stats, _ in results:
+            stats += batch_stats
+            for line in rewritten:
+                yield line
+
+    async def rewrite_file(
+        self,
+        source: Union[str, os.PathLike],
+        target: Union[str, os.PathLike],
+        target_f5mku: Optional[Union[str, F5MkuCipher]] = None,
+        chunk_size: int = _CHUNK_SIZE,
+        salt_context: Optional[str] = None,
+    ) -> RewriteStats:
+        """Rewrites the secrets of the bigip*.conf file `source` to `target`,
+        see `conf.rewrite_file`.
+        The file is processed in line aligned chunks of about `chunk_size` bytes which
+        are read by the executor, writes to `target` happen in the default executor of
+        the event loop. `target` is written atomically. The file is not split into
+        chunks if `salt_context` is provided, see `conf.rewrite_files`.
+        Returns:
+            RewriteStats of the rewrite.
+        """
+        target_cipher = _as_cipher(target_f5mku) if target_f5mku is not None else None
+        if salt_context is not None:
+            chunk_size = sys.maxsize
+        loop = asyncio.get_running_loop()
+        chunks = await loop.run_in_executor(
+            None, _line_aligned_chunks, source, chunk_size
+        )
+        stats = RewriteStats()
+        writer = _atomic_writer(target)
+        target_file = await loop.run_in_executor(None, writer.__enter__)
+        try:
+            async for rewritten, chunk_stats in self._ordered_map(
+                _rewrite_chunk,
+                (
+                    (
+                        (os.fspath(source), start, end),
+                        self.cipher,
+                        target_cipher,
+                        salt_context,
+                    )
+                    for start, end in chunks
+                ),
+            ):
+                await loop.run_in_executor(None, target_file.write, rewritten)
+                stats += chunk_stats
+        except BaseException as exc:
+            await loop.run_in_executor(
+                None, writer.__exit__, type(exc), exc, exc.__traceback__
+            )
+            raise
+        await loop.run_in_executor(None, writer.__exit__, None, None, None)
+        return stats
+
+    async def _run(self, function: Callable[..., _T], *arguments: Any) -> _T:
+        """Runs `function` in the executor once fewer than `max_concurrency` calls are running."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, function, *arguments
+            )
+
+    async def _ordered_map(
+        self,
+        function: Callable[..., _T],
+        arguments: Union[Iterable[tuple], AsyncIterable[tuple]],
+    ) -> AsyncIterator[_T]:
+        """Yields the results of `function` for all `arguments` in order, with at most
+        2 * `max_concurrency` calls pending, so that arguments are read on demand."""
+        window = 2 * self.max_concurrency
+        pending = deque()
+        try:
+            async for argument in _aiter(arguments):
+                pending.append(asyncio.ensure_future(self._run(function, *argument)))
+                if len(pending) >= window:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _rewrite_batches_in_order(
+        self,
+        lines: Union[Iterable[bytes], AsyncIterable[bytes]],
+        target_cipher: F5MkuCipher,
+        contexts: _SecretContexts,
+    ) -> AsyncIterator[Tuple[List[bytes], RewriteStats, _SecretContexts]]:
+        """Yields the rewritten batches of `lines` one after the other, the salt
+        `contexts` returned by a batch are passed on to the next one."""
+        async for batch in _async_batches(lines, self.batch_size):
+            result = await self._run(
+                _rewrite_batch, batch, self.cipher, target_cipher, contexts
+            )
+            contexts = result[2]
+            yield result
+
+    async def _map_batches(
+        self, function: Callable[..., List[F5Result]], arguments: Iterable[tuple]
+    ) -> List[F5Result]:
+        """Returns the concatenated results of `function` for all batch `arguments`."""
+        results = []
+        async for batch_results in self._ordered_map(function, arguments):
+            results.extend(batch_results)
+        return results
+
+
+def _rewrite_batch(
+    lines: List[bytes],
+    source_cipher: F5MkuCipher,
+    target_cipher: Optional[F5MkuCipher],
+    contexts: Optional[_SecretContexts] = None,
+) -> Tuple[List[bytes], RewriteStats, Optional[_SecretContexts]]:
+    """Rewrites a batch of lines, runs in the executor. The updated salt `contexts`
+    are returned as well, as a process executor works on a copy."""
+    stats = RewriteStats()
+    rewritten = _rewrite_conf_batch(
+        lines, source_cipher, target_cipher, stats, contexts
+    )
+    return rewritten, stats, contexts
+
+
+async def _async_batches(
+    items: Union[Iterable[_T], AsyncIterable[_T]], size: int
+) -> AsyncIterator[List[_T]]:
+    """Yields lists of up to `size` items of a sync or async iterable, see `conf._batches`."""
+    if not hasattr(items, "__aiter__"):
+        for batch in _batches(items, size):
+            yield batch
+        return
+    # aiter() and anext() are not available before python 3.10
+    iterator = items.__aiter__()  # pylint: disable=unnecessary-dunder-call
+    exhausted = False
+    while not exhausted:
+        batch = []
+        while len(batch) < size:
+            try:
+                # pylint: disable-next=unnecessary-dunder-call
+                batch.append(await iterator.__anext__())
+            except StopAsyncIteration:
+                exhausted = True
+                break
+        if batch:
+            yield batch
+
+
+async def _aiter(items: Union[Iterable[_T], AsyncIterable[_T]]) -> AsyncIterator[_T]:
+    """Iterates sync and async iterables alike."""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""Streaming access to bigip*.conf files within UCS archives and other tar files.
+
+UCS archives are gzip compressed tar files, the configs are stored as
+config/bigip*.conf and config/partitions/<partition>/bigip*.conf. Archives are read
+and written in tarfile stream mode, they are never extracted to disk.
+"""
+
+import os
+import re
+import tarfile
+import tempfile
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Tuple, Union
+
+from .conf import RewriteStats, _atomic_writer, rewrite_lines
+from .f5mku import F5MkuCipher
+from .redact import redact_stream
+from .scan import F5Span, scan
+
+__all__ = [
+    "is_archive",
+    "is_config_member",
+    "iter_config_members",
+    "scan_archive",
+    "rewrite_archive",
+    "redact_archive",
+]
+
+# config/bigip*.conf and config/partitions/<partition>/bigip*.conf
+_MEMBER_PATTERN = re.compile(r"(?:\./)?config/(?:partitions/[^/]+/)?bigip[^/]*\.conf")
+_ARCHIVE_SUFFIXES = (".ucs", ".tar", ".tar.gz", ".tgz")
+# rewritten members are kept in memory up to this size, larger ones are spooled to disk
+_SPOOL_SIZE = 64 * 1024 * 1024
+
+
+class _MemorySpool(tempfile.SpooledTemporaryFile):
+    """Spool of a member with plaintext secrets, which is never rolled over to disk."""
+
+    def __init__(self, name: str):
+        super().__init__(max_size=_SPOOL_SIZE)
+        self._member = name
+
+    def rollover(self):
+        raise ValueError(
+            f"Archive member {self._member} exceeds {_SPOOL_SIZE} bytes with plaintext secrets, "
+            "provide a spool directory to buffer it in a temporary file."
+        )
+
+
+def is_archive(path: Union[str, os.PathLike]) -> bool:
+    """Checks if `path` is a UCS or tar archive, by file name suffix or content."""
+    path = os.fspath(path)
+    if path.lower().endswith(_ARCHIVE_SUFFIXES):
+        return True
+    return os.path.isfile(path) and tarfile.is_tarfile(path)
+
+
+def is_config_member(name: str) -> bool:
+    """Checks if archive member `name` is a bigip*.conf file of a UCS archive."""
+    return _MEMBER_PATTERN.fullmatch(name) is not None
+
+
+def iter_config_members(
+    path: Union[str, os.PathLike],
+) -> Iterator[Tuple[str, BinaryIO]]:
+    """Yields (member name, file object) of the bigip*.conf files in archive `path`.
+    The archive is read in stream mode, every file object must be consumed before
+    the next member is requested.
+    Examples:
+        >>> for name, config_file in iter_config_members("backup.ucs"):
+        ...     print(name, len(config_file.read()))
+        config/bigip.conf 1337
+    """
+    with tarfile.open(path, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile() and is_config_member(member.name):
+                yield member.name, archive.extractfile(member)
+
+
+def scan_archive(path: Union[str, os.PathLike]) -> Iterator[Tuple[str, F5Span]]:
+    """Yields (member name, F5Span) for every F5 formatted ciphertext of the
+    bigip*.conf files in archive `path`, offsets are relative to the member."""
+    for name, config_file in iter_config_members(path):
+        offset = 0
+        for line in config_file:
+            for span in scan(line):
+                yield name, span._replace(
+                    start=offset + span.start, end=offset + span.end
+                )
+            offset += len(line)
+
+
+# optional settings are keyword-only, only their total exceeds max-args
+def rewrite_archive(  # pylint: disable=too-many-arguments
+    source: Union[str, os.PathLike],
+    target: Union[str, os.PathLike],
+    source_f5mku: Union[str, F5MkuCipher],
+    target_f5mku: Optional[Union[str, F5MkuCipher]] = None,
+    *,
+    salt_context: Optional[str] = None,
+    spool_dir: Optional[Union[str, os.PathLike]] = None,
+) -> Dict[str, RewriteStats]:
+    """Writes archive `source` to `target` with the secrets of its bigip*.conf files
+    rewritten, see `conf.rewrite_lines`. All other members are copied unchanged.
+    Both archives are processed in a single pass in stream mode, only rewritten
+    configs are buffered (spooled to a temporary file if large) as tar headers
+    need their size. `target` is gzip compressed unless it ends with .tar and is
+    written atomically. Members with plaintext secrets larger than 64 MiB are only
+    spooled if `spool_dir` is provided, otherwise ValueError is raised.
+    Examples:
+        >>> rewrite_archive(
+        ...     "backup.ucs", "migrated.ucs", "BHDLd0bbao1VlwpTk1sioQ==", "ukDKiN3j4YfWPI8FPbZLoA=="
+        ... )
+        {'config/bigip.conf': RewriteStats(found=5, converted=5, failed=0)}
+    Args:
+        source (str): path of the source UCS or tar archive.
+        target (str): path of the target archive, may be equal to `source`.
+        source_f5mku (str): f5mku base64 key or F5MkuCipher to decrypt secrets.
+        target_f5mku (str): Optional f5mku base64 key or F5MkuCipher to re-encrypt
+            secrets, secrets are written in plaintext if not provided.
+        salt_context (str): Optional prefix of deterministic salt contexts, see
+            `conf.rewrite_lines`. The member name is appended to the prefix, so
+            equal objects of different partitions get different salts.
+        spool_dir (str): Optional directory of the temporary files of large members,
+            created with mode 0600 and removed once the member is written.
+    Returns:
+        Dict of member name to RewriteStats.
+    """
+
+    def _rewrite(name: str, member_file: BinaryIO, spool: BinaryIO) -> RewriteStats:
+        stats = RewriteStats()
+        spool.writelines(
+            rewrite_lines(
+                member_file,
+                source_f5mku,
+                target_f5mku=target_f5mku,
+                stats=stats,
+                salt_context=(
+                    None if salt_context is None else f"{salt_context}{name} "
+                ),
+            )
+        )
+        return stats
+
+    return _transform_archive(
+        source, target, _rewrite, spool_dir, plaintext=target_f5mku is None
+    )
+
+
+def redact_archive(
+    source: Union[str, os.PathLike],
+    target: Union[str, os.PathLike],
+) -> Dict[str, int]:
+    """Writes archive `source` to `target` with the secrets of its bigip*.conf files
+    replaced by placeholders, see `redact.redact_stream`. No f5mku key is needed.
+    All other members are copied unchanged, like the private keys in the filestore
+    of UCS archives. Processed like `rewrite_archive`.
+    Examples:
+        >>> redact_archive("backup.ucs", "redacted.ucs")
+        {'config/bigip.conf': 5}
+    Args:
+        source (str): path of the source UCS or tar archive.
+        target (str): path of the target archive, may be equal to `source`.
+    Returns:
+        Dict of member name to the number of redacted secrets.
+    """
+    return _transform_archive(
+        source,
+        target,
+        lambda _name, member_file, spool: redact_stream(member_file, spool),
+    )
+
+
+def _transform_archive(
+    source: Union[str, os.PathLike],
+    target: Union[str, os.PathLike],
+    transform: Callable[[str, BinaryIO, BinaryIO], Any],
+    spool_dir: Optional[Union[str, os.PathLike]] = None,
+    plaintext: bool = False,
+) -> Dict[str, Any]:
+    """Writes archive `source` to `target` with the bigip*.conf members written by
+    `transform(name, member file, spool file)`, returns its results by member name.
+    `plaintext` members are kept in memory unless `spool_dir` is provided."""
+    mode = "w|" if os.fspath(target).lower().endswith(".tar") else "w|gz"
+    summary = {}
+    with tarfile.open(source, mode="r|*") as source_archive, _atomic_writer(
+        target
+    ) as target_file, tarfile.open(
+        fileobj=target_file, mode=mode, format=tarfile.PAX_FORMAT
+    ) as target_archive:
+        for member in source_archive:
+            if not member.isfile():
+                target_archive.addfile(member)
+                continue
+            member_file = source_archive.extractfile(member)
+            if not is_config_member(member.name):
+                target_archive.addfile(member, member_file)
+                continue
+            if plaintext and spool_dir is None:
+                spool = _MemorySpool(member.name)
+            else:
+                spool = tempfile.SpooledTemporaryFile(
+                    max_size=_SPOOL_SIZE, dir=spool_dir
+                )
+            with spool:
+                summary[member.name] = transform(member.name, member_file, spool)
+                member.size = spool.tell()
+                spool.seek(0)
+                target_archive.addfile(member, spool)
+    return summary
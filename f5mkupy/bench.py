@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""Offline benchmarks of f5mkupy and a generator for synthetic bigip*.conf files."""
+
+import os
+import platform
+import random
+import string
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from . import __version__
+from .conf import rewrite_file, rotate_key
+from .f5mku import F5MkuCipher
+from .pool import F5MkuPool
+from .redact import redact_file
+from .scan import scan
+
+__all__ = [
+    "BENCH_F5MKU",
+    "generate_config",
+    "write_config",
+    "run_benchmarks",
+]
+
+# key used for synthetic configs, same as the example key in README.md
+BENCH_F5MKU = "BHDLd0bbao1VlwpTk1sioQ=="
+_BENCH_TARGET_F5MKU = "ukDKiN3j4YfWPI8FPbZLoA=="
+
+# the stanzas are kept as tmsh writes them, including long filestore paths
+# pylint: disable=line-too-long
+_SECRET_OBJECTS = [
+    """ltm monitor https /Common/monitor_{index} {{
+    defaults-from /Common/https
+    destination *:443
+    password {secret}
+    send "GET /health HTTP/1.1\\r\\nHost: app{index}.example.com\\r\\n\\r\\n"
+    username monitor_user_{index}
+}}
+""",
+    """ltm profile client-ssl /Common/clientssl_{index} {{
+    app-service none
+    cert-key-chain {{
+        app{index}_example_com {{
+            cert /Common/app{index}.example.com.crt
+            key /Common/app{index}.example.com.key
+            passphrase {secret}
+        }}
+    }}
+    defaults-from /Common/clientssl
+    inherit-ca-certkeychain true
+    inherit-certkeychain false
+}}
+""",
+    """ltm profile http /Common/http_cookie_{index} {{
+    app-service none
+    defaults-from /Common/http
+    encrypt-cookie-secret {secret}
+    encrypt-cookies {{ session_{index} }}
+}}
+""",
+    """sys file ssl-key /Common/app{index}.example.com.key {{
+    cache-path /config/filestore/files_d/Common_d/certificate_key_d/:Common:app{index}.example.com.key_1
+    key-size 2048
+    passphrase {secret}
+    revision 1
+    security-type password
+}}
+""",
+]
+
+# pylint: enable=line-too-long
+_PLAIN_OBJECTS = [
+    """ltm pool /Common/pool_{index} {{
+    members {{
+        /Common/10.{a}.{b}.10:443 {{
+            address 10.{a}.{b}.10
+        }}
+        /Common/10.{a}.{b}.11:443 {{
+            address 10.{a}.{b}.11
+        }}
+    }}
+    monitor /Common/https
+}}
+""",
+    """ltm virtual /Common/vs_{index} {{
+    creation-time 2023-01-01:00:00:00
+    destination /Common/192.0.{a}.{b}:443
+    ip-protocol tcp
+    mask 255.255.255.255
+    pool /Common/pool_{index}
+    profiles {{
+        /Common/http {{ }}
+        /Common/tcp {{ }}
+    }}
+    source 0.0.0.0/0
+    translate-address enabled
+    translate-port enabled
+}}
+""",
+    """ltm node /Common/10.{a}.{b}.10 {{
+    address 10.{a}.{b}.10
+}}
+""",
+]
+
+_PERCENTILES = (50, 90, 99)
+
+
+def generate_config(
+    objects: int = 1000,
+    secret_density: float = 0.3,
+    repeat_ratio: float = 0.2,
+    f5mku: str = BENCH_F5MKU,
+    seed: int = 0,
+) -> Iterator[bytes]:
+    """Generates a synthetic bigip*.conf file of tmsh objects.
+    Examples:
+        >>> lines = list(generate_config(objects=10))
+    Args:
+        objects (int): Number of tmsh objects.
+        secret_density (float): Share of objects carrying a secret.
+        repeat_ratio (float): Share of secrets re-using a previously used secret,
+            like the same passphrase on many client-ssl profiles.
+        f5mku (str): f5mku base64 key to encrypt the secrets with.
+        seed (int): Seed of the random generator, same seed gives the same config.
+    Returns:
+        Iterator of config lines.
+    """
+    rng = random.Random(seed)
+    cipher = F5MkuCipher(f5mku)
+    used_secrets = []
+    for index in range(objects):
+        if rng.random() < secret_density:
+            if used_secrets and rng.random() < repeat_ratio:
+                secret = rng.choice(used_secrets[-16:])
+            else:
+                plaintext = "".join(
+                    rng.choice(string.ascii_letters + string.digits)
+                    for _ in range(rng.randint(8, 40))
+                )
+                salt = "".join(rng.choice(string.ascii_letters) for _ in range(2))
+                secret = cipher.encrypt(plaintext, salt=salt)
+                used_secrets.append(secret)
+            template = rng.choice(_SECRET_OBJECTS)
+        else:
+            secret = None
+            template = rng.choice(_PLAIN_OBJECTS)
+        stanza = template.format(
+            index=index, a=index // 256 % 256, b=index % 256, secret=secret
+        )
+        yield from stanza.encode().splitlines(keepends=True)
+
+
+def write_config(path: str, **kwargs) -> int:
+    """Writes a synthetic bigip*.conf file to `path`, see `generate_config`.
+    Returns:
+        Size of the file in bytes.
+    """
+    with open(path, "wb") as config_file:
+        config_file.writelines(generate_config(**kwargs))
+        return config_file.tell()
+
+
+def run_benchmarks(
+    objects: Iterable[int] = (1000, 10000, 100000),
+    operations: int = 10000,
+    repeat: int = 3,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Runs all benchmarks and returns machine-readable results.
+    Args:
+        objects (Iterable[int]): Config sizes (number of tmsh objects) to benchmark
+            scanning and rewriting with.
+        operations (int): Number of secrets for single and batch operation benchmarks.
+        repeat (int): Number of runs of every benchmark, the best run is reported.
+        workers (int): Number of workers of the F5MkuPool benchmarks, defaults to
+            the number of CPUs.
+    Returns:
+        Dict with `meta` information and a list of `results`.
+    """
+    if operations < 1 or repeat < 1:
+        raise ValueError(
+            f"operations and repeat must be positive integers, got: {operations}, {repeat}"
+        )
+    cipher = F5MkuCipher(BENCH_F5MKU)
+    plaintexts = [f"secret_{index:08d}" for index in range(operations)]
+    ciphertexts = [result.value for result in cipher.encrypt_many(plaintexts)]
+
+    results = [
+        _bench_single("encrypt", cipher.encrypt, plaintexts, repeat),
+        _bench_single("decrypt", cipher.decrypt, ciphertexts, repeat),
+        _bench_batch("encrypt_many", cipher.encrypt_many, plaintexts, repeat),
+        _bench_batch("decrypt_many", cipher.decrypt_many, ciphertexts, repeat),
+        _bench_batch(
+            "compare_many",
+            cipher.compare_many,
+            list(zip(plaintexts, ciphertexts)),
+            repeat,
+        ),
+    ]
+    for processes in (False, True):
+        with F5MkuPool(cipher, workers=workers, processes=processes) as pool:
+            results.append(_bench_pool(results[3], pool, ciphertexts, repeat))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for object_count in objects:
+            path = os.path.join(temp_dir, f"bigip_{object_count}.conf")
+            write_config(path, objects=object_count)
+            results.append(_bench_scan(path, object_count, repeat))
+            results.append(_bench_rewrite(path, object_count, repeat))
+            results.append(_bench_rotate(path, object_count, repeat))
+            results.append(_bench_redact(path, object_count, repeat))
+
+    return {"meta": _meta(), "results": results}
+
+
+def _bench_single(
+    name: str, function: Callable[[str], str], items: List[str], repeat: int
+) -> Dict[str, Any]:
+    """Measures ops/sec and latency percentiles of calling `function` once per item."""
+    best_seconds = None
+    best_latencies = None
+    for _ in range(repeat):
+        latencies = []
+        perf_counter_ns = time.perf_counter_ns
+        for item in items:
+            start = perf_counter_ns()
+            function(item)
+            latencies.append(perf_counter_ns() - start)
+        seconds = sum(latencies) / 1e9
+        if best_seconds is None or seconds < best_seconds:
+            best_seconds, best_latencies = seconds, latencies
+    return {
+        "name": name,
+        "items": len(items),
+        "seconds": best_seconds,
+        "ops_per_sec": _per_second(len(items), best_seconds),
+        "latency_us": _percentiles(best_latencies),
+    }
+
+
+def _bench_batch(
+    name: str, function: Callable[[List[str]], list], items: List[str], repeat: int
+) -> Dict[str, Any]:
+    """Measures ops/sec of calling `function` with all items at once."""
+    seconds = _best_of(repeat, lambda: function(items))
+    return {
+        "name": name,
+        "items": len(items),
+        "seconds": seconds,
+        "ops_per_sec": _per_second(len(items), seconds),
+    }
+
+
+def _bench_pool(
+    baseline: Dict[str, Any], pool: F5MkuPool, ciphertexts: List[str], repeat: int
+) -> Dict[str, Any]:
+    """Measures `pool.decrypt_many`, `baseline` is the single-threaded decrypt_many result.
+    Workers are started and the chunk size is tuned by a warm-up run first."""
+    pool.decrypt_many(ciphertexts)
+    seconds = _best_of(repeat, lambda: pool.decrypt_many(ciphertexts))
+    return {
+        "name": f"{'process' if pool.processes else 'thread'}_pool_decrypt_many",
+        "items": len(ciphertexts),
+        "workers": pool.workers,
+        "chunk_size": pool.chunk_size,
+        "seconds": seconds,
+        "ops_per_sec": _per_second(len(ciphertexts), seconds),
+        "speedup": baseline["seconds"] / seconds if seconds > 0 else None,
+    }
+
+
+def _bench_scan(path: str, object_count: int, repeat: int) -> Dict[str, Any]:
+    """Measures scanning a synthetic config in memory."""
+    with open(path, "rb") as config_file:
+        buffer = config_file.read()
+    secrets = sum(1 for _ in scan(buffer))
+    seconds = _best_of(repeat, lambda: sum(1 for _ in scan(buffer)))
+    return {
+        "name": "scan",
+        "objects": object_count,
+        "bytes": len(buffer),
+        "secrets": secrets,
+        "seconds": seconds,
+        "mb_per_sec": _per_second(len(buffer) / 1e6, seconds),
+        "secrets_per_sec": _per_second(secrets, seconds),
+    }
+
+
+def _bench_rewrite(path: str, object_count: int, repeat: int) -> Dict[str, Any]:
+    """Measures re-encrypting all secrets of a synthetic config file."""
+    target = f"{path}.rewritten"
+    stats = rewrite_file(path, BENCH_F5MKU, _BENCH_TARGET_F5MKU, target=target)
+    seconds = _best_of(
+        repeat,
+        lambda: rewrite_file(path, BENCH_F5MKU, _BENCH_TARGET_F5MKU, target=target),
+    )
+    size = os.path.getsize(path)
+    return {
+        "name": "rewrite_file",
+        "objects": object_count,
+        "bytes": size,
+        "secrets": stats.found,
+        "seconds": seconds,
+        "mb_per_sec": _per_second(size / 1e6, seconds),
+        "secrets_per_sec": _per_second(stats.found, seconds),
+    }
+
+
+def _bench_rotate(path: str, object_count: int, repeat: int) -> Dict[str, Any]:
+    """Measures re-encrypting only the secret byte ranges of a synthetic config file."""
+    target = f"{path}.rotated"
+    stats = rotate_key(path, BENCH_F5MKU, _BENCH_TARGET_F5MKU, target=target)
+    seconds = _best_of(
+        repeat,
+        lambda: rotate_key(path, BENCH_F5MKU, _BENCH_TARGET_F5MKU, target=target),
+    )
+    return {
+        "name": "rotate_key",
+        "objects": object_count,
+        "bytes": stats.source_size,
+        "secrets": stats.found,
+        "seconds": seconds,
+        "mb_per_sec": _per_second(stats.source_size / 1e6, seconds),
+        "secrets_per_sec": _per_second(stats.found, seconds),
+    }
+
+
+def _bench_redact(path: str, object_count: int, repeat: int) -> Dict[str, Any]:
+    """Measures replacing all secrets of a synthetic config file with placeholders."""
+    target = f"{path}.redacted"
+    secrets = redact_file(path, target)
+    seconds = _best_of(repeat, lambda: redact_file(path, target))
+    size = os.path.getsize(path)
+    return {
+        "name": "redact_file",
+        "objects": object_count,
+        "bytes": size,
+        "secrets": secrets,
+        "seconds": seconds,
+        "mb_per_sec": _per_second(size / 1e6, seconds),
+        "secrets_per_sec": _per_second(secrets, seconds),
+    }
+
+
+def _best_of(repeat: int, function: Callable[[], Any]) -> float:
+    """Returns the fastest of `repeat` runs of `function` in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _per_second(amount: float, seconds: float) -> Optional[float]:
+    """Returns `amount` per second, None if `seconds` is below the timer resolution."""
+    return amount / seconds if seconds > 0 else None
+
+
+def _percentiles(latencies_ns: List[int]) -> Dict[str, Optional[float]]:
+    """Returns p50, p90 and p99 of `latencies_ns` in microseconds."""
+    ordered = sorted(latencies_ns)
+    if not ordered:
+        return {f"p{percentile}": None for percentile in _PERCENTILES}
+    return {
+        f"p{percentile}": ordered[
+            min(len(ordered) - 1, len(ordered) * percentile // 100)
+        ]
+        / 1e3
+        for percentile in _PERCENTILES
+    }
+
+
+def _meta() -> Dict[str, Optional[str]]:
+    """Returns information about the environment the benchmarks ran in."""
+    try:
+        # pylint: disable-next=import-outside-toplevel
+        from cryptography import __version__ as cryptography_version
+    except ImportError:  # pragma: no cover
+        cryptography_version = None
+    return {
+        "f5mkupy": __version__,
+        "python": sys.version.split()[0],
+        "cryptography": cryptography_version,
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Memoization of decrypted secrets."""
+
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Optional
+
+CacheInfo = namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+__all__ = [
+    "CacheInfo",
+    "DecryptCache",
+]
+
+
+class DecryptCache:
+    """Bounded LRU cache of decrypted secrets keyed by key fingerprint and ciphertext.
+
+    Plaintexts are stored as bytearray and overwritten with zeros when they are
+    evicted or the cache is cleared.
+    Examples:
+        >>> cache = DecryptCache(maxsize=2)
+        >>> cache.put("fingerprint", "$M$iP$rr0su9oHn9J9p1t3nRzydA==", b"KEY45678")
+        >>> cache.get("fingerprint", "$M$iP$rr0su9oHn9J9p1t3nRzydA==")
+        b'KEY45678'
+        >>> cache.info()
+        CacheInfo(hits=1, misses=0, maxsize=2, currsize=1)
+    Args:
+        maxsize (int): Maximum number of cached plaintexts.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be a positive integer, got: {maxsize}")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.info()}>"
+
+    def get(self, fingerprint: str, ciphertext: str) -> Optional[bytes]:
+        """Returns the cached plaintext of `ciphertext` or `None`."""
+        with self._lock:
+            plaintext = self._entries.get((fingerprint, ciphertext))
+            if plaintext is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((fingerprint, ciphertext))
+            self.hits += 1
+            return bytes(plaintext)
+
+    def put(self, fingerprint: str, ciphertext: str, plaintext: bytes) -> None:
+        """Caches `plaintext` of `ciphertext`, evicting the least recently used entry if full."""
+        with self._lock:
+            previous = self._entries.pop((fingerprint, ciphertext), None)
+            if previous is not None:
+                _wipe(previous)
+            self._entries[(fingerprint, ciphertext)] = bytearray(plaintext)
+            while len(self._entries) > self.maxsize:
+                _, evicted = self._entries.popitem(last=False)
+                _wipe(evicted)
+
+    def clear(self) -> None:
+        """Wipes and removes all cached plaintexts and resets the counters."""
+        with self._lock:
+            for plaintext in self._entries.values():
+                _wipe(plaintext)
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        """Returns hits, misses, maxsize and current size of the cache."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+def _wipe(buffer: bytearray) -> None:
+    """Overwrites `buffer` with zeros."""
+    buffer[:] = bytes(len(buffer))
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 """CLI for f5mkupy."""
 
-# pylint: disable=line-too-long
+# pylint: disable=line-too-long,import-outside-toplevel
+# modules doing the actual work are imported where needed, so that --help, --version
+# and extract_salt don't pay for importing cryptography, multiprocessing, ...
 
 import argparse
+import os
+import sys
 
 from . import __description__, __homepage__, __license__, __projectname__, __version__
-from .f5mku import decrypt, encrypt, extract_salt
 
 
 def _cli_arg_parser():
@@ -21,56 +24,880 @@ def _cli_arg_parser():
         action="version",
         version=f"%(prog)s {__version__}",
     )
-    sub_parser = parser.add_subparsers(dest="function")
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print counters and latencies per stage (parse, decode, crypt, unpad, scan, write, ...) to STDERR.",
+    )
+    sub_parser = parser.add_subparsers(dest="function", required=True)
+    _add_encrypt_parser(sub_parser)
+    _add_decrypt_parser(sub_parser)
+    _add_extract_salt_parser(sub_parser)
+    _add_rewrite_parser(sub_parser)
+    _add_rotate_key_parser(sub_parser)
+    _add_identify_key_parser(sub_parser)
+    _add_redact_parser(sub_parser)
+    _add_index_parser(sub_parser)
+    _add_incremental_parser(sub_parser)
+    _add_diff_parser(sub_parser)
+    _add_serve_parser(sub_parser)
+    _add_bench_parser(sub_parser)
+    return parser.parse_args()
+
+
+def _add_encrypt_parser(sub_parser):
+    """Add the encrypt subcommand to `sub_parser`."""
     sp_encrypt = sub_parser.add_parser(
         "encrypt", help="Encrypt plaintext string to F5 formatted ciphertext."
     )
+    sp_encrypt.add_argument(
+        "-k",
+        "--f5mku",
+        type=str,
+        required=True,
+        help="f5mku base64 key, retrieved by: f5mku -K",
+    )
+    sp_encrypt_salt = sp_encrypt.add_mutually_exclusive_group()
+    sp_encrypt_salt.add_argument("-s", "--salt", type=str, help="Optional salt.")
+    sp_encrypt_salt.add_argument(
+        "--salt-context",
+        type=str,
+        help="Optional context to derive a deterministic salt from, e.g. 'ltm profile client-ssl /Common/foo passphrase'.",
+    )
+    _add_batch_arguments(
+        sp_encrypt,
+        "plaintext",
+        help="Plaintext string to encrypt, - reads one plaintext per line from STDIN.",
+    )
+
+
+def _add_decrypt_parser(sub_parser):
+    """Add the decrypt subcommand to `sub_parser`."""
     sp_decrypt = sub_parser.add_parser(
         "decrypt", help="Decrypt F5 formatted ciphertext to plaintext string."
     )
+    sp_decrypt.add_argument(
+        "-k",
+        "--f5mku",
+        type=str,
+        required=True,
+        help="f5mku base64 key, retrieved by: f5mku -K",
+    )
+    _add_batch_arguments(
+        sp_decrypt,
+        "ciphertext",
+        help="Ciphertext in F5 format (as listed in *.conf files), - reads one ciphertext per line from STDIN.",
+    )
+
+
+def _add_extract_salt_parser(sub_parser):
+    """Add the extract_salt subcommand to `sub_parser`."""
     sp_extract_salt = sub_parser.add_parser(
         "extract_salt", help="Extract salt from F5 formatted ciphertext."
     )
-    sp_encrypt.add_argument(
+    _add_batch_arguments(
+        sp_extract_salt,
+        "ciphertext",
+        help="Ciphertext in F5 format (as listed in *.conf files), - reads one ciphertext per line from STDIN.",
+    )
+
+
+def _add_rewrite_parser(sub_parser):
+    """Add the rewrite subcommand to `sub_parser`."""
+    sp_rewrite = sub_parser.add_parser(
+        "rewrite",
+        help="Decrypt secrets in a bigip*.conf file and optionally re-encrypt them with a new f5mku.",
+    )
+    sp_rewrite.add_argument(
         "-k",
         "--f5mku",
         type=str,
         required=True,
-        help="f5mku base64 key, retrieved by: f5mku -K",
+        help="f5mku base64 key of the source config (used to decrypt).",
+    )
+    sp_rewrite.add_argument(
+        "-t",
+        "--target-f5mku",
+        type=str,
+        help="Optional f5mku base64 key to re-encrypt secrets with, secrets are written in plaintext otherwise.",
+    )
+    sp_rewrite_output = sp_rewrite.add_mutually_exclusive_group()
+    sp_rewrite_output.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help="Optional target bigip*.conf file, written atomically. Prints to STDOUT otherwise.",
+    )
+    sp_rewrite_output.add_argument(
+        "-d",
+        "--output-dir",
+        type=str,
+        help="Directory to write rewritten files to, required for multiple sources unless --in-place is used.",
+    )
+    sp_rewrite_output.add_argument(
+        "-i",
+        "--in-place",
+        action="store_true",
+        help="Rewrite source files in place.",
+    )
+    sp_rewrite.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of worker processes for multiple sources, defaults to the number of CPUs.",
+    )
+    sp_rewrite.add_argument(
+        "--salt-context",
+        action="store_true",
+        help="Re-encrypt with deterministic salts derived from the object and attribute of every secret, so unchanged secrets give identical output. Requires --target-f5mku.",
+    )
+    sp_rewrite.add_argument(
+        "--salt-prefix",
+        type=str,
+        metavar="PREFIX",
+        help="Prefix of the salt contexts, e.g. the hostname, so equal objects of different devices get different salts. Implies --salt-context.",
+    )
+    sp_rewrite.add_argument(
+        "--spool-dir",
+        type=str,
+        help="Directory for temporary files of archive members larger than 64 MiB with plaintext secrets, such members are refused without it.",
+    )
+    sp_rewrite.add_argument(
+        "source",
+        type=str,
+        nargs="+",
+        help="Source bigip*.conf files, directories containing bigip*.conf files or a UCS (tar) archive.",
     )
-    sp_encrypt.add_argument("-s", "--salt", type=str, help="Optional salt.")
-    sp_encrypt.add_argument("plaintext", type=str, help="Plaintext string to encrypt.")
 
-    sp_decrypt.add_argument(
+
+def _add_rotate_key_parser(sub_parser):
+    """Add the rotate-key subcommand to `sub_parser`."""
+    sp_rotate_key = sub_parser.add_parser(
+        "rotate-key",
+        help="Re-encrypt the secrets of a bigip*.conf file with a new f5mku, only the secrets are rewritten.",
+    )
+    sp_rotate_key.add_argument(
         "-k",
         "--f5mku",
         type=str,
         required=True,
-        help="f5mku base64 key, retrieved by: f5mku -K",
+        help="Old f5mku base64 key of the source config (used to decrypt).",
     )
-    sp_decrypt.add_argument(
-        "ciphertext",
+    sp_rotate_key.add_argument(
+        "-t",
+        "--target-f5mku",
+        type=str,
+        required=True,
+        help="New f5mku base64 key to re-encrypt secrets with.",
+    )
+    sp_rotate_key.add_argument(
+        "-o",
+        "--output",
         type=str,
-        help="Ciphertext in F5 format (as listed in *.conf files).",
+        help="Optional target bigip*.conf file, written atomically. The source file is replaced otherwise.",
     )
+    sp_rotate_key.add_argument(
+        "--new-salt",
+        action="store_true",
+        help="Use new random salts instead of keeping the salt of every secret.",
+    )
+    sp_rotate_key.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report counts and sizes, nothing is written.",
+    )
+    sp_rotate_key.add_argument("source", type=str, help="Source bigip*.conf file.")
 
-    sp_extract_salt.add_argument(
-        "ciphertext",
+
+def _add_identify_key_parser(sub_parser):
+    """Add the identify-key subcommand to `sub_parser`."""
+    sp_identify_key = sub_parser.add_parser(
+        "identify-key",
+        help="Identify which of many f5mku keys the secrets of bigip*.conf files were encrypted with.",
+    )
+    sp_identify_key.add_argument(
+        "-k",
+        "--f5mku",
+        type=str,
+        action="append",
+        default=[],
+        help="Candidate f5mku base64 key as KEY or NAME:KEY, can be used multiple times. Keys without name are reported by fingerprint.",
+    )
+    sp_identify_key.add_argument(
+        "--key-file",
+        type=str,
+        help="File with one candidate KEY or NAME:KEY per line, keeps keys out of the process list.",
+    )
+    sp_identify_key.add_argument(
+        "--sample-size",
+        type=int,
+        default=8,
+        help="Number of secrets to check per file, defaults to 8.",
+    )
+    sp_identify_key.add_argument(
+        "source",
         type=str,
-        help="Ciphertext in F5 format (as listed in *.conf files).",
+        nargs="+",
+        help="bigip*.conf files or directories containing bigip*.conf files.",
     )
 
-    return parser.parse_args()
+
+def _add_redact_parser(sub_parser):
+    """Add the redact subcommand to `sub_parser`."""
+    sp_redact = sub_parser.add_parser(
+        "redact",
+        help="Replace the secrets of a bigip*.conf file or UCS archive with placeholders carrying a fingerprint of the ciphertext, no f5mku key is needed.",
+    )
+    sp_redact.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help="Optional target file or archive, written atomically. Prints to STDOUT otherwise, required for archives unless --member is used.",
+    )
+    sp_redact.add_argument(
+        "-m",
+        "--member",
+        type=str,
+        help="Only redact the bigip*.conf member of the archive, e.g. config/bigip.conf.",
+    )
+    sp_redact.add_argument(
+        "source", type=str, help="Source bigip*.conf file or UCS (tar) archive."
+    )
+
+
+def _add_index_parser(sub_parser):
+    """Add the index subcommand to `sub_parser`."""
+    sp_index = sub_parser.add_parser(
+        "index",
+        help="Maintain and query a SQLite inventory of the secrets in bigip*.conf files.",
+    )
+    sp_index.add_argument(
+        "--db",
+        type=str,
+        required=True,
+        help="SQLite file of the index, created if it doesn't exist.",
+    )
+    sp_index.add_argument(
+        "--path", type=str, help="List secrets of files matching the glob pattern."
+    )
+    sp_index.add_argument(
+        "--object",
+        type=str,
+        help="List secrets of tmsh objects matching the glob pattern, e.g. 'ltm profile client-ssl *'.",
+    )
+    sp_index.add_argument(
+        "--attribute",
+        type=str,
+        help="List secrets of attributes matching the glob pattern, e.g. '*passphrase'.",
+    )
+    sp_index.add_argument(
+        "--token", type=str, help="List locations of the F5 formatted ciphertext."
+    )
+    sp_index.add_argument(
+        "--list",
+        action="store_true",
+        help="List all indexed secrets, one JSON object per line.",
+    )
+    sp_index.add_argument(
+        "source",
+        type=str,
+        nargs="*",
+        help="bigip*.conf files, directories containing bigip*.conf files or UCS (tar) archives to index, unchanged files are skipped.",
+    )
+
+
+def _add_incremental_parser(sub_parser):
+    """Add the incremental subcommand to `sub_parser`."""
+    sp_incremental = sub_parser.add_parser(
+        "incremental",
+        help="Report tmsh objects of bigip*.conf files which changed since the last run, only changed objects are decrypted.",
+    )
+    sp_incremental.add_argument(
+        "-k",
+        "--f5mku",
+        type=str,
+        required=True,
+        help="f5mku base64 key of the configs.",
+    )
+    sp_incremental.add_argument(
+        "--state",
+        type=str,
+        required=True,
+        help="JSON state file of the previous run, created if it doesn't exist.",
+    )
+    sp_incremental.add_argument(
+        "--full",
+        action="store_true",
+        help="Force a full rebuild, processes all objects and reports changes against the previous state, which is discarded if it was created with another key.",
+    )
+    sp_incremental.add_argument(
+        "source",
+        type=str,
+        nargs="+",
+        help="bigip*.conf files or directories containing bigip*.conf files.",
+    )
+
+
+def _add_diff_parser(sub_parser):
+    """Add the diff subcommand to `sub_parser`."""
+    sp_diff = sub_parser.add_parser(
+        "diff",
+        help="Compare two bigip*.conf files, secrets only differ if their decrypted values differ.",
+    )
+    sp_diff.add_argument(
+        "-k",
+        "--f5mku",
+        type=str,
+        required=True,
+        help="f5mku base64 key of the first config.",
+    )
+    sp_diff.add_argument(
+        "-K",
+        "--other-f5mku",
+        type=str,
+        help="Optional f5mku base64 key of the second config, defaults to --f5mku.",
+    )
+    sp_diff.add_argument(
+        "-U",
+        "--unified",
+        type=int,
+        default=3,
+        help="Number of context lines, defaults to 3.",
+    )
+    sp_diff.add_argument("source_a", type=str, help="First bigip*.conf file.")
+    sp_diff.add_argument("source_b", type=str, help="Second bigip*.conf file.")
+
+
+def _add_serve_parser(sub_parser):
+    """Add the serve subcommand to `sub_parser`."""
+    sp_serve = sub_parser.add_parser(
+        "serve",
+        help="Serve encrypt, decrypt and compare requests on a local socket with keys held in memory.",
+    )
+    sp_serve.add_argument(
+        "-k",
+        "--f5mku",
+        type=str,
+        action="append",
+        default=[],
+        help="f5mku base64 key as KEY or NAME:KEY, can be used multiple times. The first key is the default key.",
+    )
+    sp_serve.add_argument(
+        "--key-file",
+        type=str,
+        help="File with one KEY or NAME:KEY per line, keeps keys out of the process list.",
+    )
+    sp_serve_listen = sp_serve.add_mutually_exclusive_group(required=True)
+    sp_serve_listen.add_argument(
+        "--socket", type=str, help="Unix domain socket path to listen on."
+    )
+    sp_serve_listen.add_argument(
+        "--port", type=int, help="TCP port to listen on (localhost)."
+    )
+    sp_serve.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Loopback address to listen on with --port, defaults to 127.0.0.1. Requests are not authenticated, other addresses are rejected.",
+    )
+
+
+def _add_bench_parser(sub_parser):
+    """Add the bench subcommand to `sub_parser`."""
+    sp_bench = sub_parser.add_parser(
+        "bench",
+        help="Run offline benchmarks with synthetic bigip*.conf files and print JSON results.",
+    )
+    sp_bench.add_argument(
+        "--objects",
+        type=_positive_int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="Sizes of synthetic configs (number of tmsh objects) for scan and rewrite benchmarks.",
+    )
+    sp_bench.add_argument(
+        "--operations",
+        type=_positive_int,
+        default=10000,
+        help="Number of secrets for single and batch operation benchmarks.",
+    )
+    sp_bench.add_argument(
+        "--repeat",
+        type=_positive_int,
+        default=3,
+        help="Number of runs per benchmark, the best run is reported.",
+    )
+    sp_bench.add_argument(
+        "--workers",
+        type=_positive_int,
+        help="Number of workers of the thread and process pool benchmarks, defaults to the number of CPUs.",
+    )
+    sp_bench.add_argument(
+        "-o", "--output", type=str, help="Write JSON results to file instead of STDOUT."
+    )
+    sp_bench.add_argument(
+        "--generate",
+        type=str,
+        metavar="FILE",
+        help="Only write a synthetic bigip*.conf file with the first --objects size to FILE.",
+    )
+    sp_bench.add_argument(
+        "--secret-density",
+        type=float,
+        default=0.3,
+        help="Share of objects carrying a secret in synthetic configs.",
+    )
+    sp_bench.add_argument(
+        "--repeat-ratio",
+        type=float,
+        default=0.2,
+        help="Share of secrets re-using a previous secret in synthetic configs.",
+    )
+
+
+def _positive_int(value):
+    """argparse type of integer arguments which must be at least 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got: {value}")
+    return number
+
+
+def _add_batch_arguments(parser, value_name, help):  # pylint: disable=redefined-builtin
+    """Add positional `value_name` argument and the mutually exclusive batch mode arguments."""
+    value_group = parser.add_mutually_exclusive_group(required=True)
+    value_group.add_argument(value_name, type=str, nargs="?", help=help)
+    value_group.add_argument(
+        "-b",
+        "--batch",
+        type=str,
+        nargs="?",
+        const="-",
+        metavar="FILE",
+        help=f"Batch mode, reads one {value_name} per line from FILE or STDIN if omitted.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["plain", "ndjson"],
+        default="plain",
+        help="Output format of batch mode, plain prints one result per line and errors to STDERR.",
+    )
 
 
 def cli():
     """Handle CLI interaction."""
     args = _cli_arg_parser()
+    if not args.stats:
+        _cli_dispatch(args)
+        return
+
+    from .metrics import disable_metrics, enable_metrics
+
+    metrics = enable_metrics()
+    try:
+        _cli_dispatch(args)
+    finally:
+        disable_metrics()
+        for line in metrics.summary():
+            print(line, file=sys.stderr)
+
+
+def _cli_dispatch(args):
+    """Run the function selected by `args`, exits with its exit code if it returns one."""
+    function = {
+        "encrypt": _cli_single,
+        "decrypt": _cli_single,
+        "extract_salt": _cli_single,
+        "rewrite": _cli_rewrite,
+        "rotate-key": _cli_rotate_key,
+        "identify-key": _cli_identify_key,
+        "redact": _cli_redact,
+        "index": _cli_index,
+        "incremental": _cli_incremental,
+        "diff": _cli_diff,
+        "serve": _cli_serve,
+        "bench": _cli_bench,
+    }[args.function]
+    exit_code = function(args)
+    if exit_code is not None:
+        sys.exit(exit_code)
+
+
+def _cli_single(args):
+    """Handle encrypt, decrypt and extract_salt of a single value or in batch mode."""
+    value = args.plaintext if args.function == "encrypt" else args.ciphertext
+    if args.batch is not None or value == "-":
+        return _cli_batch(args)
+
     if args.function == "encrypt":
-        result = encrypt(plaintext=args.plaintext, f5mku=args.f5mku, salt=args.salt)
+        from .f5mku import encrypt
+
+        result = encrypt(
+            plaintext=args.plaintext,
+            f5mku=args.f5mku,
+            salt=args.salt,
+            context=args.salt_context,
+        )
     elif args.function == "decrypt":
+        from .f5mku import decrypt
+
         result = decrypt(ciphertext=args.ciphertext, f5mku=args.f5mku)
-    elif args.function == "extract_salt":
-        result = extract_salt(ciphertext=args.ciphertext)
+    else:
+        from .f5mku import extract_salt
 
+        result = extract_salt(ciphertext=args.ciphertext)
     print(result)
+    return None
+
+
+def _cli_rewrite(args):
+    """Handle rewrite of one or many config files."""
+    from .archive import is_archive, rewrite_archive
+    from .conf import rewrite_file, rewrite_files
+
+    salt_context = None
+    if args.salt_prefix is not None:
+        salt_context = f"{args.salt_prefix} "
+    elif args.salt_context:
+        salt_context = ""
+    if salt_context is not None and args.target_f5mku is None:
+        sys.exit(
+            f"{__projectname__} rewrite: error: --salt-context requires --target-f5mku"
+        )
+    single_file = len(args.source) == 1 and not os.path.isdir(args.source[0])
+    if single_file and is_archive(args.source[0]):
+        if not (args.output or args.in_place):
+            sys.exit(
+                f"{__projectname__} rewrite: error: --output or --in-place is required for archives"
+            )
+        summary = rewrite_archive(
+            source=args.source[0],
+            target=args.output or args.source[0],
+            source_f5mku=args.f5mku,
+            target_f5mku=args.target_f5mku,
+            salt_context=salt_context,
+            spool_dir=args.spool_dir,
+        )
+        for member, stats in summary.items():
+            print(
+                f"{member}: found: {stats.found}, converted: {stats.converted}, failed: {stats.failed}",
+                file=sys.stderr,
+            )
+        return
+
+    if single_file and not (args.output_dir or args.in_place):
+        stats = rewrite_file(
+            source=args.source[0],
+            source_f5mku=args.f5mku,
+            target_f5mku=args.target_f5mku,
+            target=args.output,
+            salt_context=salt_context,
+        )
+        print(
+            f"found: {stats.found}, converted: {stats.converted}, failed: {stats.failed}",
+            file=sys.stderr,
+        )
+        return
+
+    if not (args.output_dir or args.in_place):
+        sys.exit(
+            f"{__projectname__} rewrite: error: --output-dir or --in-place is required for multiple sources or directories"
+        )
+    summary = rewrite_files(
+        sources=args.source,
+        source_f5mku=args.f5mku,
+        target_f5mku=args.target_f5mku,
+        output_dir=args.output_dir,
+        workers=args.jobs,
+        salt_context=salt_context,
+    )
+    for source, stats in summary.items():
+        print(
+            f"{source}: found: {stats.found}, converted: {stats.converted}, failed: {stats.failed}",
+            file=sys.stderr,
+        )
+
+
+def _cli_redact(args):
+    """Handle redact of a config file, an archive or a config member of an archive."""
+    from .archive import is_archive, iter_config_members, redact_archive
+    from .redact import redact_file, redact_stream
+
+    if args.member is not None:
+        for name, config_file in iter_config_members(args.source):
+            if name not in (args.member, f"./{args.member}"):
+                continue
+            if args.output:
+                with open(args.output, "wb") as output_file:
+                    redacted = redact_stream(config_file, output_file)
+            else:
+                redacted = redact_stream(config_file, sys.stdout.buffer)
+                sys.stdout.buffer.flush()
+            print(f"{name}: redacted: {redacted}", file=sys.stderr)
+            return
+        sys.exit(
+            f"{__projectname__} redact: error: no bigip*.conf member {args.member} in {args.source}"
+        )
+
+    if is_archive(args.source):
+        if not args.output:
+            sys.exit(
+                f"{__projectname__} redact: error: --output or --member is required for archives"
+            )
+        for name, redacted in redact_archive(args.source, args.output).items():
+            print(f"{name}: redacted: {redacted}", file=sys.stderr)
+        return
+
+    redacted = redact_file(args.source, args.output)
+    print(f"redacted: {redacted}", file=sys.stderr)
+
+
+def _cli_rotate_key(args):
+    """Handle rotate-key of a config file."""
+    from .conf import rotate_key
+
+    stats = rotate_key(
+        source=args.source,
+        source_f5mku=args.f5mku,
+        target_f5mku=args.target_f5mku,
+        target=args.output,
+        keep_salt=not args.new_salt,
+        dry_run=args.dry_run,
+    )
+    print(
+        f"{'dry run: ' if args.dry_run else ''}found: {stats.found}, converted: {stats.converted}, failed: {stats.failed}, "
+        f"size: {stats.source_size}, target size: {stats.target_size}, secret bytes: {stats.secret_bytes}",
+        file=sys.stderr,
+    )
+
+
+def _cli_batch(args) -> int:
+    """Handle batch mode of encrypt, decrypt and extract_salt.
+    Every input line results in one output line, which is flushed immediately.
+    Empty lines are passed through as empty lines, or skipped with ndjson output.
+    Lines which are not valid UTF-8 fail like any other invalid input.
+    Returns exit code 1 if any line failed, 0 otherwise."""
+    import json
+
+    from .f5mku import F5MkuCipher, extract_salt
+
+    if args.function == "encrypt":
+        cipher = F5MkuCipher(args.f5mku)
+        salt, context = args.salt, args.salt_context
+
+        def operation(value):
+            return cipher.encrypt(value, salt=salt, context=context)
+
+    elif args.function == "decrypt":
+        operation = F5MkuCipher(args.f5mku).decrypt
+    else:
+        operation = extract_salt
+
+    exit_code = 0
+    for line_number, value in enumerate(_read_batch(args.batch), start=1):
+        if not value:
+            if args.format != "ndjson":
+                print("", flush=True)
+            continue
+        try:
+            value.encode("utf-8")
+            result, error = operation(value), None
+        except UnicodeEncodeError:
+            result, error = None, "Line is not valid UTF-8."
+            exit_code = 1
+        except ValueError as exc:
+            result, error = None, str(exc)
+            exit_code = 1
+
+        if args.format == "ndjson":
+            record = {"line": line_number}
+            record.update({"error": error} if error else {"result": result})
+            print(json.dumps(record), flush=True)
+        elif error:
+            print("", flush=True)
+            print(f"line {line_number}: {error}", file=sys.stderr, flush=True)
+        else:
+            print(result, flush=True)
+    return exit_code
+
+
+def _read_batch(batch):
+    """Yields the lines of the batch file `batch` or STDIN without line breaks.
+    Undecodable bytes are kept as surrogates, so that they fail on their line only."""
+    if batch in (None, "-"):
+        if hasattr(sys.stdin, "reconfigure"):
+            sys.stdin.reconfigure(errors="surrogateescape")
+        for line in sys.stdin:
+            yield line.rstrip("\r\n")
+    else:
+        with open(batch, encoding="utf-8", errors="surrogateescape") as input_file:
+            for line in input_file:
+                yield line.rstrip("\r\n")
+
+
+def _cli_identify_key(args) -> int:
+    """Handle identify-key, prints the name or fingerprint of the matching key per file.
+    Returns exit code 1 if the key of any file could not be identified, 0 otherwise."""
+    from .conf import identify_config_keys
+    from .f5mku import F5MkuCipher
+
+    candidates = {}
+    for number, key in enumerate(_read_keys(args), start=1):
+        name, _, f5mku = key.rpartition(":")
+        try:
+            cipher = F5MkuCipher(f5mku)
+        except ValueError:
+            # the key itself is not printed, it may be a typo of a valid key
+            print(
+                f"skipped invalid key {name or f'#{number}'}",
+                file=sys.stderr,
+            )
+            continue
+        candidates[name or cipher.fingerprint] = cipher
+
+    exit_code = 0
+    for path, name in identify_config_keys(
+        args.source, candidates, sample_size=args.sample_size
+    ).items():
+        if name is None:
+            exit_code = 1
+        print(f"{path}: {name or 'unknown'}")
+    return exit_code
+
+
+def _cli_index(args):
+    """Handle index, updates the index with the sources and lists matching secrets."""
+    import json
+
+    from .index import SecretIndex
+
+    with SecretIndex(args.db) as index:
+        if args.source:
+            stats = index.update(args.source)
+            print(
+                f"indexed: {stats.indexed}, unchanged: {stats.unchanged}, removed: {stats.removed}, secrets: {stats.secrets}",
+                file=sys.stderr,
+            )
+        filters = {
+            "path": args.path,
+            "object": args.object,
+            "attribute": args.attribute,
+            "token": args.token,
+        }
+        if args.list or any(value is not None for value in filters.values()):
+            for record in index.secrets(**filters):
+                print(json.dumps(dict(record._asdict(), token=record.token)))
+
+
+def _cli_incremental(args) -> int:
+    """Handle incremental, prints changed objects since the last run.
+    Returns exit code 1 if any object changed, 0 otherwise."""
+    from .incremental import process_incremental
+
+    changes, stats = process_incremental(
+        args.source, args.f5mku, args.state, full=args.full
+    )
+    for change in changes:
+        secrets = f" (secrets: {', '.join(change.secrets)})" if change.secrets else ""
+        print(f"{change.path}: {change.status}: {change.header}{secrets}")
+    print(
+        f"stanzas: {stats.stanzas}, reused: {stats.reused}, processed: {stats.processed}, decrypted: {stats.decrypted}",
+        file=sys.stderr,
+    )
+    return 1 if changes else 0
+
+
+def _cli_diff(args) -> int:
+    """Handle diff of two config files.
+    Returns exit code 1 if the configs differ, 0 otherwise."""
+    from .diff import diff_files
+
+    counts = {"added": 0, "removed": 0, "changed": 0}
+    print(f"--- {args.source_a}")
+    print(f"+++ {args.source_b}")
+    for stanza_diff in diff_files(
+        args.source_a,
+        args.source_b,
+        f5mku_a=args.f5mku,
+        f5mku_b=args.other_f5mku,
+        context=args.unified,
+    ):
+        counts[stanza_diff.status] += 1
+        print(f"{stanza_diff.status}: {stanza_diff.header}")
+        for line in stanza_diff.diff:
+            print(line)
+    print(
+        ", ".join(f"{status}: {count}" for status, count in counts.items()),
+        file=sys.stderr,
+    )
+    return 1 if any(counts.values()) else 0
+
+
+def _cli_serve(args):
+    """Handle serve, runs until interrupted."""
+    from .server import make_server, parse_keys
+
+    try:
+        server = make_server(
+            parse_keys(_read_keys(args)),
+            path=args.socket,
+            host=args.host,
+            port=args.port,
+        )
+    except ValueError as exc:
+        sys.exit(f"{__projectname__} {args.function}: error: {exc}")
+    print(f"listening on {server.server_address}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _read_keys(args):
+    """Returns the keys of -k/--f5mku arguments and --key-file, exits if there are none."""
+    keys = list(args.f5mku)
+    if args.key_file:
+        with open(args.key_file, encoding="utf-8") as key_file:
+            keys.extend(line.strip() for line in key_file if line.strip())
+    if not keys:
+        sys.exit(
+            f"{__projectname__} {args.function}: error: at least one key is required"
+        )
+    return keys
+
+
+def _cli_bench(args):
+    """Handle bench, runs benchmarks or generates a synthetic config."""
+    import json
+
+    from .bench import run_benchmarks, write_config
+
+    if args.generate:
+        size = write_config(
+            args.generate,
+            objects=args.objects[0],
+            secret_density=args.secret_density,
+            repeat_ratio=args.repeat_ratio,
+        )
+        print(f"{args.generate}: {size} bytes", file=sys.stderr)
+        return
+
+    results = json.dumps(
+        run_benchmarks(
+            objects=args.objects,
+            operations=args.operations,
+            repeat=args.repeat,
+            workers=args.workers,
+        ),
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(results + "\n")
+    else:
+        print(results)
@@ -0,0 +1,854 @@
+# -*- coding: utf-8 -*-
+"""Processing of F5 BIG-IP bigip*.conf files."""
+
+import glob
+import mmap
+import os
+import re
+import sys
+import tempfile
+from collections import deque, namedtuple
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import chain, islice
+from time import perf_counter
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from . import metrics as _metrics
+from .f5mku import F5MkuCipher, _as_cipher
+from .identify import identify_keys
+from .scan import F5Span, scan, scan_file
+
+__all__ = [
+    "RewriteStats",
+    "Stanza",
+    "StanzaSecret",
+    "read_lines",
+    "iter_stanzas",
+    "stanza_key",
+    "stanza_secrets",
+    "find_ciphertexts",
+    "rewrite_lines",
+    "write_lines",
+    "rewrite_file",
+    "find_config_files",
+    "rewrite_files",
+    "RotateStats",
+    "rotate_key",
+    "identify_config_keys",
+]
+
+_BATCH_SIZE = 1024
+_CHUNK_SIZE = 32 * 1024 * 1024
+_CONFIG_FILE_PATTERN = "bigip*.conf"
+_COPY_SIZE = 8 * 1024 * 1024
+
+# quoted strings and escaped braces don't change the nesting depth of a stanza
+_QUOTED_PATTERN = re.compile(rb'"(?:\\.|[^"\\])*"|\\[{}]')
+
+
+class Stanza(namedtuple("Stanza", "header line offset lines")):
+    """Top-level tmsh object of a bigip*.conf file.
+    `header` is the first line without the opening brace, e.g. b"ltm pool /Common/pool",
+    `line` and `offset` are the 1-based line number and byte offset of the first line
+    and `lines` are the lines of the stanza including line endings."""
+
+    __slots__ = ()
+
+
+class StanzaSecret(
+    namedtuple("StanzaSecret", "line offset object attribute salt ciphertext")
+):
+    """Secret of a Stanza, see `stanza_secrets`.
+    `line` and `offset` are the 1-based line number and byte offset of the secret,
+    `object` is the stanza header and `attribute` the path of nested blocks and the
+    attribute name in front of the secret, e.g. "users snmp_user auth-password"."""
+
+    __slots__ = ()
+
+
+@dataclass
+class RewriteStats:
+    """Counters of a config rewrite."""
+
+    found: int = 0
+    converted: int = 0
+    failed: int = 0
+
+    def __iadd__(self, other: "RewriteStats") -> "RewriteStats":
+        self.found += other.found
+        self.converted += other.converted
+        self.failed += other.failed
+        return self
+
+
+@dataclass
+class RotateStats(RewriteStats):
+    """Counters and sizes in bytes of a key rotation."""
+
+    source_size: int = 0
+    target_size: int = 0
+    secret_bytes: int = 0
+
+
+def read_lines(path: Union[str, os.PathLike]) -> Iterator[bytes]:
+    """Yields the lines of the file `path` as bytes, line endings are preserved."""
+    with open(path, "rb") as config_file:
+        yield from config_file
+
+
+def iter_stanzas(
+    lines: Iterable[bytes], line: int = 1, offset: int = 0
+) -> Iterator[Stanza]:
+    """Splits `lines` of a bigip*.conf file into top-level stanzas by brace matching.
+    Only one stanza is held in memory at a time. Blank lines belong to the preceding
+    stanza, lines outside of braces (like comments) are stanzas of their own.
+    Examples:
+        >>> lines = [b"ltm node n {\\n", b"    address 10.0.0.1\\n", b"}\\n"]
+        >>> [s.header for s in iter_stanzas(lines)]
+        [b'ltm node n']
+    Args:
+        lines (Iterable[bytes]): lines of a bigip*.conf file.
+        line (int): Line number of the first line.
+        offset (int): Byte offset of the first line.
+    Returns:
+        Iterator of Stanza.
+    """
+    stanza = None
+    depth = 0
+    for current in lines:
+        if depth == 0 and current.strip() and stanza is not None:
+            yield stanza
+            stanza = None
+        if stanza is None:
+            header = current.strip()
+            if header.endswith(b"{"):
+                header = header[:-1].rstrip()
+            stanza = Stanza(header, line, offset, [])
+        stanza.lines.append(current)
+        unquoted = _QUOTED_PATTERN.sub(b"", current)
+        depth = max(0, depth + unquoted.count(b"{") - unquoted.count(b"}"))
+        line += 1
+        offset += len(current)
+    if stanza is not None:
+        yield stanza
+
+
+def stanza_key(stanza: Stanza, occurrences: Dict[bytes, int]) -> Tuple[bytes, int]:
+    """Returns the header of `stanza` and how often it occurred before in the same file,
+    headers like comments can repeat. `occurrences` counts the headers of a file.
+    Examples:
+        >>> occurrences = {}
+        >>> [stanza_key(s, occurrences) for s in iter_stanzas([b"# a\n", b"# a\n"])]
+        [(b'# a', 0), (b'# a', 1)]
+    """
+    occurrence = occurrences.get(stanza.header, 0)
+    occurrences[stanza.header] = occurrence + 1
+    return stanza.header, occurrence
+
+
+def stanza_secrets(stanza: Stanza) -> Iterator[StanzaSecret]:
+    """Yields the secrets of `stanza` with their location and attribute path.
+    Examples:
+        >>> lines = [
+        ...     b"sys file ssl-key k {\\n",
+        ...     b"    passphrase $M$ot$tjQRL4+Md7egq3uxcYIN8g==\\n",
+        ...     b"}\\n",
+        ... ]
+        >>> [s.attribute for s in stanza_secrets(next(iter_stanzas(lines)))]
+        ['passphrase']
+    """
+    header = stanza.header.decode("utf-8", "replace")
+    contexts = _SecretContexts()
+    offset = stanza.offset
+    for line_number, line in enumerate(stanza.lines, start=stanza.line):
+        spans = list(scan(line))
+        for span, attribute in zip(spans, contexts.attributes(line, spans)):
+            yield StanzaSecret(
+                line_number,
+                offset + span.start,
+                header,
+                attribute,
+                span.salt.decode("ascii"),
+                span.ciphertext.decode("ascii"),
+            )
+        offset += len(line)
+
+
+def find_ciphertexts(line: bytes) -> List[bytes]:
+    """Returns all F5 formatted ciphertexts found in `line`.
+    Examples:
+        >>> find_ciphertexts(b"    passphrase $M$ot$tjQRL4+Md7egq3uxcYIN8g==\\n")
+        [b'$M$ot$tjQRL4+Md7egq3uxcYIN8g==']
+    """
+    return [span.token for span in scan(line)]
+
+
+# optional settings are keyword-only, only their total exceeds max-args
+def rewrite_lines(  # pylint: disable=too-many-arguments
+    lines: Iterable[bytes],
+    source_f5mku: Union[str, F5MkuCipher],
+    target_f5mku: Optional[Union[str, F5MkuCipher]] = None,
+    *,
+    stats: Optional[RewriteStats] = None,
+    batch_size: int = _BATCH_SIZE,
+    salt_context: Optional[str] = None,
+) -> Iterator[bytes]:
+    """Decrypts secrets in `lines` and optionally re-encrypts them with `target_f5mku`.
+    Lines are processed in batches of `batch_size`, all secrets of a batch are
+    decrypted and encrypted at once. Secrets which fail to decrypt are kept as is.
+    Args:
+        lines (Iterable[bytes]): lines of a bigip*.conf file.
+        source_f5mku (str): f5mku base64 key or F5MkuCipher to decrypt secrets.
+        target_f5mku (str): Optional f5mku base64 key or F5MkuCipher to re-encrypt
+            secrets, secrets are written in plaintext if not provided.
+        stats (RewriteStats): Optional counters to update.
+        batch_size (int): Number of lines processed at once.
+        salt_context (str): Optional prefix to derive deterministic salts for
+            re-encrypted secrets from, see `f5mku.derive_salt`. The context of a
+            secret is the prefix followed by its object and attribute, e.g.
+            "ltm profile client-ssl /Common/foo cert-key-chain foo passphrase".
+            `lines` must start at the beginning of an object. Random salts are
+            used if not provided.
+    Returns:
+        Iterator of rewritten lines.
+    """
+    source_cipher = _as_cipher(source_f5mku)
+    target_cipher = _as_cipher(target_f5mku) if target_f5mku is not None else None
+    if stats is None:
+        stats = RewriteStats()
+    contexts = (
+        _SecretContexts(salt_context)
+        if salt_context is not None and target_cipher is not None
+        else None
+    )
+
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield from _rewrite_batch(
+                batch, source_cipher, target_cipher, stats, contexts
+            )
+            batch = []
+    if batch:
+        yield from _rewrite_batch(batch, source_cipher, target_cipher, stats, contexts)
+
+
+def write_lines(lines: Iterable[bytes], path: Union[str, os.PathLike]) -> None:
+    """Writes `lines` to `path` atomically.
+    The lines are written to a temporary file in the directory of `path` which
+    replaces `path` only after all lines have been written successfully."""
+    with _atomic_writer(path) as target_file:
+        _write_timed(target_file, lines)
+
+
+def rewrite_file(
+    source: Union[str, os.PathLike],
+    source_f5mku: Union[str, F5MkuCipher],
+    target_f5mku: Optional[Union[str, F5MkuCipher]] = None,
+    target: Optional[Union[str, os.PathLike]] = None,
+    salt_context: Optional[str] = None,
+) -> RewriteStats:
+    """Rewrites the secrets of the bigip*.conf file `source`, see `rewrite_lines`.
+    Args:
+        source (str): path of the source bigip*.conf file.
+        source_f5mku (str): f5mku base64 key or F5MkuCipher to decrypt secrets.
+        target_f5mku (str): Optional f5mku base64 key or F5MkuCipher to re-encrypt secrets.
+        target (str): Optional path of the target file, written atomically.
+            Writes to STDOUT if not provided, `target` may be equal to `source`.
+        salt_context (str): Optional prefix of deterministic salt contexts, see `rewrite_lines`.
+    Returns:
+        RewriteStats of the rewrite.
+    """
+    stats = RewriteStats()
+    lines = rewrite_lines(
+        read_lines(source),
+        source_f5mku,
+        target_f5mku=target_f5mku,
+        stats=stats,
+        salt_context=salt_context,
+    )
+    if target is None:
+        _write_stdout(lines)
+    else:
+        write_lines(lines, target)
+    return stats
+
+
+def find_config_files(
+    paths: Iterable[Union[str, os.PathLike]],
+) -> List[Tuple[str, str]]:
+    """Expands `paths` to bigip*.conf files.
+    Files are used as is, directories are searched recursively for bigip*.conf files.
+    Returns:
+        List of (path, relative path) tuples, the relative path is relative to the
+        directory the file was found in or the file name for files.
+    """
+    config_files = []
+    for path in paths:
+        path = os.fspath(path)
+        if os.path.isdir(path):
+            for config_file in sorted(
+                glob.glob(
+                    os.path.join(glob.escape(path), "**", _CONFIG_FILE_PATTERN),
+                    recursive=True,
+                )
+            ):
+                config_files.append((config_file, os.path.relpath(config_file, path)))
+        else:
+            config_files.append((path, os.path.basename(path)))
+    return config_files
+
+
+# optional settings are keyword-only, only their total exceeds max-args
+def rewrite_files(  # pylint: disable=too-many-arguments
+    sources: Iterable[Union[str, os.PathLike]],
+    source_f5mku: Union[str, F5MkuCipher],
+    target_f5mku: Optional[Union[str, F5MkuCipher]] = None,
+    *,
+    output_dir: Optional[Union[str, os.PathLike]] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = _CHUNK_SIZE,
+    salt_context: Optional[str] = None,
+) -> Dict[str, RewriteStats]:
+    """Rewrites the secrets of many bigip*.conf files using a process pool, see `rewrite_lines`.
+    Files are split into line aligned chunks of about `chunk_size` bytes, every chunk
+    is processed by a worker process and the results are joined in order.
+    Args:
+        sources (Iterable[str]): bigip*.conf files or directories containing them.
+        source_f5mku (str): f5mku base64 key or F5MkuCipher to decrypt secrets.
+        target_f5mku (str): Optional f5mku base64 key or F5MkuCipher to re-encrypt secrets.
+        output_dir (str): Optional directory to write the files to, preserving the
+            directory structure below directories in `sources`. Files are rewritten
+            in place if not provided.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+            Processing happens in the current process if set to 1.
+        chunk_size (int): Approximate size of chunks in bytes.
+        salt_context (str): Optional prefix of deterministic salt contexts, see
+            `rewrite_lines`. Files are not split into chunks then, as salt contexts
+            depend on the preceding lines of a secret.
+    Returns:
+        Dict of source path to RewriteStats.
+    """
+    jobs = _rewrite_jobs(
+        sources, output_dir, sys.maxsize if salt_context is not None else chunk_size
+    )
+    chunks = [
+        (chunk, source_f5mku, target_f5mku, salt_context)
+        for _source, _target, file_chunks in jobs
+        for chunk in file_chunks
+    ]
+    if workers == 1:
+        results = (_rewrite_chunk(*chunk) for chunk in chunks)
+        return {
+            source: _join_chunks(target, (next(results) for _ in file_chunks))
+            for source, target, file_chunks in jobs
+        }
+
+    # pylint: disable-next=import-outside-toplevel
+    from concurrent.futures import ProcessPoolExecutor  # imports multiprocessing
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = _ordered_map(executor, _rewrite_chunk, chunks, window=2 * workers)
+        return {
+            source: _join_chunks(target, (next(results) for _ in file_chunks))
+            for source, target, file_chunks in jobs
+        }
+
+
+# optional settings are keyword-only, only their total exceeds max-args
+def rotate_key(  # pylint: disable=too-many-arguments
+    source: Union[str, os.PathLike],
+    source_f5mku: Union[str, F5MkuCipher],
+    target_f5mku: Union[str, F5MkuCipher],
+    target: Optional[Union[str, os.PathLike]] = None,
+    *,
+    keep_salt: bool = True,
+    dry_run: bool = False,
+    batch_size: int = _BATCH_SIZE,
+) -> RotateStats:
+    """Re-encrypts the secrets of the bigip*.conf file `source` with `target_f5mku`.
+    Unlike `rewrite_file` only the secrets are touched. The source file is memory mapped
+    and scanned for secrets, the bytes between secrets are copied to the target file
+    in large chunks (by `os.copy_file_range` where available) and the re-encrypted
+    secrets are spliced in. Secrets which fail to decrypt are kept as is.
+    Examples:
+        >>> stats = rotate_key(
+        ...     "bigip.conf", "BHDLd0bbao1VlwpTk1sioQ==", "ukDKiN3j4YfWPI8FPbZLoA=="
+        ... )
+        >>> stats.converted, stats.source_size, stats.target_size, stats.secret_bytes
+        (5, 812, 812, 170)
+    Args:
+        source (str): path of the source bigip*.conf file.
+        source_f5mku (str): f5mku base64 key or F5MkuCipher to decrypt secrets.
+        target_f5mku (str): f5mku base64 key or F5MkuCipher to re-encrypt secrets.
+        target (str): Optional path of the target file, written atomically.
+            `source` is replaced if not provided.
+        keep_salt (bool): Re-encrypt secrets with their original salt, random salts
+            are used otherwise.
+        dry_run (bool): Only count secrets and sizes, nothing is written.
+        batch_size (int): Number of secrets decrypted and encrypted at once.
+    Returns:
+        RotateStats of the rotation.
+    """
+    source_cipher = _as_cipher(source_f5mku)
+    target_cipher = _as_cipher(target_f5mku)
+    stats = RotateStats()
+    with open(source, "rb") as source_file:
+        stats.source_size = os.fstat(source_file.fileno()).st_size
+        stats.target_size = stats.source_size
+        buffer = (
+            mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if stats.source_size
+            else b""
+        )
+        try:
+            replacements = (
+                (span.start, span.end, replacement)
+                for spans in _batches(scan(buffer), batch_size)
+                for span, replacement in zip(
+                    spans,
+                    _rotate_spans(
+                        spans, source_cipher, target_cipher, keep_salt, stats
+                    ),
+                )
+                if replacement is not None
+            )
+            if dry_run:
+                for _ in replacements:
+                    pass
+            else:
+                with _atomic_writer(
+                    source if target is None else target
+                ) as target_file:
+                    _write_spliced(source_file, buffer, target_file, replacements)
+        finally:
+            if stats.source_size:
+                buffer.close()
+    return stats
+
+
+def identify_config_keys(
+    paths: Iterable[Union[str, os.PathLike]],
+    candidate_keys: Union[
+        Dict[str, Union[str, F5MkuCipher]], Iterable[Union[str, F5MkuCipher]]
+    ],
+    sample_size: int = 8,
+) -> Dict[str, Optional[Any]]:
+    """Identifies which of `candidate_keys` the secrets of every bigip*.conf file were
+    encrypted with.
+    Only the first `sample_size` secrets of every file are read, see `identify_keys`.
+    Examples:
+        >>> identify_config_keys(
+        ...     ["bigip.conf"],
+        ...     {"old": "BHDLd0bbao1VlwpTk1sioQ==", "new": "ukDKiN3j4YfWPI8FPbZLoA=="},
+        ... )
+        {'bigip.conf': 'old'}
+    Args:
+        paths (Iterable[str]): bigip*.conf files or directories containing them.
+        candidate_keys (Dict[str, str]): f5mku base64 keys or F5MkuCiphers by name,
+            or an iterable of them.
+        sample_size (int): Maximum number of secrets to check per file.
+    Returns:
+        Dict of path to the name of the matching key, None if no key matches or the
+        file has no secrets.
+    """
+    samples = {
+        path: [
+            span.token.decode("ascii") for span in islice(scan_file(path), sample_size)
+        ]
+        for path, _ in find_config_files(paths)
+    }
+    return identify_keys(samples, candidate_keys, sample_size=sample_size)
+
+
+def _rewrite_jobs(
+    sources: Iterable[Union[str, os.PathLike]],
+    output_dir: Optional[Union[str, os.PathLike]],
+    chunk_size: int,
+) -> List[Tuple[str, str, List[Tuple[str, int, int]]]]:
+    """Returns the source, target and (source, start, end) chunks of every
+    bigip*.conf file of `sources`, see `rewrite_files`."""
+    jobs = []
+    for source, relative_path in find_config_files(sources):
+        target = (
+            source if output_dir is None else os.path.join(output_dir, relative_path)
+        )
+        file_chunks = [
+            (source, start, end)
+            for start, end in _line_aligned_chunks(source, chunk_size=chunk_size)
+        ]
+        jobs.append((source, target, file_chunks))
+    return jobs
+
+
+def _ordered_map(
+    executor: Executor,
+    function: Callable[..., Any],
+    arguments: Iterable[tuple],
+    window: int,
+) -> Iterator[Any]:
+    """Like `executor.map` but with at most `window` pending calls, so that results
+    which can't be consumed yet don't pile up in memory."""
+    pending = deque()
+    for argument in arguments:
+        pending.append(executor.submit(function, *argument))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _line_aligned_chunks(
+    path: Union[str, os.PathLike], chunk_size: int = _CHUNK_SIZE
+) -> List[Tuple[int, int]]:
+    """Splits file `path` into (start, end) byte ranges of about `chunk_size`, ending
+    on a line break."""
+    chunks = []
+    start = 0
+    with open(path, "rb") as config_file:
+        file_size = os.fstat(config_file.fileno()).st_size
+        while start < file_size:
+            config_file.seek(min(start + chunk_size, file_size))
+            config_file.readline()
+            end = min(config_file.tell(), file_size)
+            chunks.append((start, end))
+            start = end
+    return chunks or [(0, 0)]
+
+
+def _rewrite_chunk(
+    chunk: Tuple[str, int, int],
+    source_f5mku: Union[str, F5MkuCipher],
+    target_f5mku: Optional[Union[str, F5MkuCipher]],
+    salt_context: Optional[str] = None,
+) -> Tuple[bytes, RewriteStats]:
+    """Rewrites the lines of `chunk`, a (source, start, end) tuple of the file
+    `source` and the byte offsets `start` and `end`."""
+    source, start, end = chunk
+    with open(source, "rb") as config_file:
+        config_file.seek(start)
+        lines = config_file.read(end - start).splitlines(keepends=True)
+    stats = RewriteStats()
+    rewritten = b"".join(
+        rewrite_lines(
+            lines,
+            source_f5mku,
+            target_f5mku=target_f5mku,
+            stats=stats,
+            salt_context=salt_context,
+        )
+    )
+    return rewritten, stats
+
+
+def _join_chunks(
+    target: str, chunks: Iterable[Tuple[bytes, RewriteStats]]
+) -> RewriteStats:
+    """Writes rewritten `chunks` in order to `target` and returns the summed up RewriteStats."""
+    stats = RewriteStats()
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    with _atomic_writer(target) as target_file:
+        for rewritten, chunk_stats in chunks:
+            _write_timed(target_file, [rewritten])
+            stats += chunk_stats
+    return stats
+
+
+def _rewrite_batch(
+    batch: List[bytes],
+    source_cipher: F5MkuCipher,
+    target_cipher: Optional[F5MkuCipher],
+    stats: RewriteStats,
+    contexts: Optional["_SecretContexts"] = None,
+) -> List[bytes]:
+    """Rewrites the secrets of a batch of lines, with deterministic salts derived
+    from the salt context of every secret if `contexts` is provided."""
+    metrics = _metrics.active
+    start = perf_counter() if metrics is not None else 0.0
+    line_spans = [list(scan(line)) for line in batch]
+    if metrics is not None:
+        metrics.lap("scan", start, len(batch))
+    # replacements are looked up by token or by (token, salt context)
+    line_keys = [
+        (
+            [span.token for span in spans]
+            if contexts is None
+            else [
+                (span.token, context)
+                for span, context in zip(spans, contexts.feed(line, spans))
+            ]
+        )
+        for line, spans in zip(batch, line_spans)
+    ]
+    stats.found += sum(len(spans) for spans in line_spans)
+    tokens = list(dict.fromkeys(span.token for spans in line_spans for span in spans))
+    if not tokens:
+        return batch
+    replacements = _batch_replacements(
+        tokens,
+        (
+            None
+            if contexts is None
+            else list(dict.fromkeys(key for keys in line_keys for key in keys))
+        ),
+        source_cipher,
+        target_cipher,
+    )
+    return [
+        _splice_line(line, spans, keys, replacements, stats) if spans else line
+        for line, spans, keys in zip(batch, line_spans, line_keys)
+    ]
+
+
+def _batch_replacements(
+    tokens: List[bytes],
+    keys: Optional[List[Tuple[bytes, str]]],
+    source_cipher: F5MkuCipher,
+    target_cipher: Optional[F5MkuCipher],
+) -> Dict[Any, bytes]:
+    """Decrypts the distinct `tokens` of a batch and returns their replacements by
+    token, or by (token, salt context) of `keys` if provided. Tokens which fail to
+    decrypt have no replacement."""
+    decrypted = source_cipher.decrypt_many(token.decode("ascii") for token in tokens)
+    plaintexts = {
+        token: result.value
+        for token, result in zip(tokens, decrypted)
+        if result.error is None
+    }
+    if target_cipher is None:
+        return {
+            token: plaintext.encode("utf-8") for token, plaintext in plaintexts.items()
+        }
+    if keys is None:
+        encrypted = target_cipher.encrypt_many(plaintexts.values())
+        return {
+            token: result.value.encode("ascii")
+            for token, result in zip(plaintexts, encrypted)
+        }
+    keys = [key for key in keys if key[0] in plaintexts]
+    encrypted = target_cipher.encrypt_many(
+        [plaintexts[token] for token, _ in keys],
+        salts=[target_cipher.derive_salt(context) for _, context in keys],
+    )
+    return {key: result.value.encode("ascii") for key, result in zip(keys, encrypted)}
+
+
+def _splice_line(
+    line: bytes,
+    spans: List[F5Span],
+    keys: List[Any],
+    replacements: Dict[Any, bytes],
+    stats: RewriteStats,
+) -> bytes:
+    """Returns `line` with the secrets of `spans` replaced, secrets without a
+    replacement are kept as is and counted as failed."""
+    parts = []
+    position = 0
+    for span, key in zip(spans, keys):
+        replacement = replacements.get(key)
+        if replacement is None:
+            stats.failed += 1
+            continue
+        stats.converted += 1
+        parts.append(line[position : span.start])
+        parts.append(replacement)
+        position = span.end
+    parts.append(line[position:])
+    return b"".join(parts)
+
+
+class _SecretContexts:
+    """Tracks the tmsh object and nested blocks of consecutive bigip*.conf lines to
+    name the secrets found in them, see `iter_stanzas`."""
+
+    __slots__ = ("prefix", "header", "blocks", "depth")
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self.header = ""
+        self.blocks: List[str] = []
+        self.depth = 0
+
+    def feed(self, line: bytes, spans: Iterable[F5Span]) -> List[str]:
+        """Returns the salt context of every span of `line`, the next line of the config."""
+        return [
+            f"{self.prefix}{self.header} {attribute}"
+            for attribute in self.attributes(line, spans)
+        ]
+
+    def attributes(self, line: bytes, spans: Iterable[F5Span]) -> List[str]:
+        """Returns the attribute path of every span of `line`, the next line of the
+        config, e.g. "users snmp_user auth-password"."""
+        unquoted = _QUOTED_PATTERN.sub(b"", line)
+        change = unquoted.count(b"{") - unquoted.count(b"}")
+        starts_object = self.depth == 0 and bool(line.strip())
+        if starts_object:
+            header = line.strip()
+            if header.endswith(b"{"):
+                header = header[:-1].rstrip()
+            self.header = header.decode("utf-8", "replace")
+            self.blocks = []
+        attributes = []
+        for span in spans:
+            words = line[: span.start].split()
+            attribute = words[-1].decode("utf-8", "replace") if words else ""
+            attributes.append(" ".join(self.blocks + [attribute]))
+        if not starts_object:
+            if change > 0:
+                self.blocks.append(
+                    unquoted.strip().rstrip(b"{").strip().decode("utf-8", "replace")
+                )
+            elif change < 0:
+                del self.blocks[change:]
+        self.depth = max(0, self.depth + change)
+        return attributes
+
+
+def _rotate_spans(
+    spans: List[F5Span],
+    source_cipher: F5MkuCipher,
+    target_cipher: F5MkuCipher,
+    keep_salt: bool,
+    stats: RotateStats,
+) -> List[Optional[bytes]]:
+    """Returns the re-encrypted token per span, or None if the span failed to decrypt."""
+    salts = {span.token: span.salt.decode("ascii") for span in spans}
+    tokens = list(salts)
+    decrypted = source_cipher.decrypt_many(token.decode("ascii") for token in tokens)
+    plaintexts = {
+        token: result.value
+        for token, result in zip(tokens, decrypted)
+        if result.error is None
+    }
+    encrypted = target_cipher.encrypt_many(
+        plaintexts.values(),
+        salts=[salts[token] if keep_salt else None for token in plaintexts],
+    )
+    tokens = {
+        token: result.value.encode("ascii")
+        for token, result in zip(plaintexts, encrypted)
+    }
+
+    replacements = []
+    for span in spans:
+        replacement = tokens.get(span.token)
+        stats.found += 1
+        stats.secret_bytes += span.end - span.start
+        if replacement is None:
+            stats.failed += 1
+        else:
+            stats.converted += 1
+            stats.target_size += len(replacement) - (span.end - span.start)
+        replacements.append(replacement)
+    return replacements
+
+
+def _write_spliced(
+    source_file: BinaryIO,
+    buffer: Union[bytes, mmap.mmap],
+    target_file: BinaryIO,
+    replacements: Iterable[Tuple[int, int, bytes]],
+) -> None:
+    """Writes `source_file` to `target_file` with the (start, end, replacement) byte
+    ranges of `replacements` replaced. Ranges in between are copied by the kernel if
+    possible, from the memory mapped `buffer` of `source_file` otherwise."""
+    target_file.flush()
+    source_fd = source_file.fileno()
+    target_fd = target_file.fileno()
+    copy_file_range = getattr(os, "copy_file_range", None)
+    metrics = _metrics.active
+    position = 0
+    for start, end, replacement in chain(replacements, [(len(buffer), None, b"")]):
+        timer = perf_counter() if metrics is not None else 0.0
+        while position < start:
+            copied = 0
+            if copy_file_range is not None:
+                try:
+                    copied = copy_file_range(
+                        source_fd,
+                        target_fd,
+                        min(start - position, _COPY_SIZE),
+                        position,
+                    )
+                except OSError:
+                    # e.g. not supported by the file system, copy from the buffer
+                    copy_file_range = None
+            if not copied:
+                copied = os.write(
+                    target_fd, buffer[position : min(start, position + _COPY_SIZE)]
+                )
+            position += copied
+        while replacement:
+            replacement = replacement[os.write(target_fd, replacement) :]
+        position = end
+        if metrics is not None:
+            metrics.lap("write", timer)
+
+
+def _batches(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Yields lists of up to `size` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _write_stdout(lines: Iterable[bytes]) -> None:
+    """Writes `lines` to STDOUT."""
+    stdout = sys.stdout.buffer
+    _write_timed(stdout, lines)
+    stdout.flush()
+
+
+def _write_timed(target_file: BinaryIO, lines: Iterable[bytes]) -> None:
+    """Writes `lines` to `target_file`, timing only the writes if metrics are enabled.
+    Lines are often produced lazily by a rewrite, so batches are collected first."""
+    metrics = _metrics.active
+    if metrics is None:
+        target_file.writelines(lines)
+        return
+    for batch in _batches(lines, _BATCH_SIZE):
+        start = perf_counter()
+        target_file.writelines(batch)
+        metrics.lap("write", start, len(batch))
+
+
+@contextmanager
+def _atomic_writer(path: Union[str, os.PathLike]) -> Iterator[BinaryIO]:
+    """Context manager providing a temporary file which atomically replaces `path` on success."""
+    path = os.fspath(path)
+    directory, filename = os.path.split(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(
+        prefix=f".{filename}.", suffix=".tmp", dir=directory
+    )
+    try:
+        with os.fdopen(file_descriptor, "wb") as temp_file:
+            yield temp_file
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""Secrets-aware comparison of F5 BIG-IP bigip*.conf files."""
+
+import difflib
+import hashlib
+import hmac
+import os
+import secrets
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .conf import Stanza, iter_stanzas, read_lines, stanza_key
+from .f5mku import F5MkuCipher, _as_cipher
+from .scan import scan
+
+__all__ = [
+    "StanzaDiff",
+    "diff_files",
+]
+
+_FINGERPRINT_LENGTH = 16
+
+StanzaDiff = namedtuple("StanzaDiff", "status header diff")
+
+
+def diff_files(
+    source_a: Union[str, os.PathLike],
+    source_b: Union[str, os.PathLike],
+    f5mku_a: Union[str, F5MkuCipher],
+    f5mku_b: Optional[Union[str, F5MkuCipher]] = None,
+    context: int = 3,
+) -> Iterator[StanzaDiff]:
+    """Compares two bigip*.conf files stanza by stanza, ignoring salts and master keys.
+    Secrets are decrypted with the key of their file and replaced by a keyed hash of
+    the plaintext, which is equal for equal plaintexts within one call. Secrets
+    therefore only show up as changed if their decrypted values differ, plaintexts
+    never show up in the output. Every distinct ciphertext is decrypted once.
+    `source_a` is indexed by stanza header and content hash, `source_b` is streamed,
+    only stanzas which differ are read again from `source_a` to build the diff.
+    Examples:
+        >>> for stanza_diff in diff_files(
+        ...     "a/bigip.conf",
+        ...     "b/bigip.conf",
+        ...     "BHDLd0bbao1VlwpTk1sioQ==",
+        ...     "ukDKiN3j4YfWPI8FPbZLoA==",
+        ... ):
+        ...     print(stanza_diff.status, stanza_diff.header)
+        changed ltm profile client-ssl /Common/clientssl
+    Args:
+        source_a (str): path of the first bigip*.conf file.
+        source_b (str): path of the second bigip*.conf file.
+        f5mku_a (str): f5mku base64 key or F5MkuCipher of `source_a`.
+        f5mku_b (str): Optional f5mku base64 key or F5MkuCipher of `source_b`,
+            defaults to `f5mku_a`.
+        context (int): Number of unified diff context lines.
+    Returns:
+        Iterator of StanzaDiff with status `added`, `removed` or `changed`, the stanza
+        header and the unified diff lines of the stanza.
+    """
+    hash_key = secrets.token_bytes(32)
+    normalize_a = _secret_normalizer(_as_cipher(f5mku_a), hash_key)
+    normalize_b = _secret_normalizer(
+        _as_cipher(f5mku_a if f5mku_b is None else f5mku_b), hash_key
+    )
+    index_a = _index_stanzas(source_a, normalize_a)
+
+    occurrences: Dict[bytes, int] = {}
+    for stanza in iter_stanzas(read_lines(source_b)):
+        lines_b = normalize_b(stanza.lines)
+        indexed = index_a.pop(stanza_key(stanza, occurrences), None)
+        if indexed is None:
+            yield _stanza_diff("added", stanza.header, [], lines_b, context)
+        elif indexed[0] != _digest(lines_b):
+            lines_a = normalize_a(_read_stanza(source_a, indexed[1], indexed[2]).lines)
+            yield _stanza_diff("changed", stanza.header, lines_a, lines_b, context)
+
+    # stanzas left in the index are not in `source_b`
+    yield from _removed_stanzas(source_a, index_a, normalize_a, context)
+
+
+def _index_stanzas(
+    path: Union[str, os.PathLike], normalize: Callable[[List[bytes]], List[bytes]]
+) -> Dict[Tuple[bytes, int], Tuple[bytes, int, int]]:
+    """Returns the content hash, line and offset of the stanzas of file `path` by
+    `stanza_key`, the content hash is taken of the `normalize`d lines."""
+    index: Dict[Tuple[bytes, int], Tuple[bytes, int, int]] = {}
+    occurrences: Dict[bytes, int] = {}
+    for stanza in iter_stanzas(read_lines(path)):
+        index[stanza_key(stanza, occurrences)] = (
+            _digest(normalize(stanza.lines)),
+            stanza.line,
+            stanza.offset,
+        )
+    return index
+
+
+def _removed_stanzas(
+    path: Union[str, os.PathLike],
+    index: Dict[Tuple[bytes, int], Tuple[bytes, int, int]],
+    normalize: Callable[[List[bytes]], List[bytes]],
+    context: int,
+) -> Iterator[StanzaDiff]:
+    """Yields a `removed` StanzaDiff per stanza of `index` in file order."""
+    for (header, _), (_, line, offset) in sorted(
+        index.items(), key=lambda item: item[1][2]
+    ):
+        lines = normalize(_read_stanza(path, line, offset).lines)
+        yield _stanza_diff("removed", header, lines, [], context)
+
+
+def _secret_normalizer(
+    cipher: F5MkuCipher, hash_key: bytes
+) -> Callable[[List[bytes]], List[bytes]]:
+    """Returns a function which returns lines with secrets replaced by a keyed hash
+    of their plaintext, blank lines and line endings removed.
+    Only the hashes are kept per ciphertext, not the plaintexts."""
+    replacements: Dict[bytes, bytes] = {}
+
+    def normalize(lines: List[bytes]) -> List[bytes]:
+        line_spans = [list(scan(line)) for line in lines]
+        _add_replacements(
+            cipher,
+            hash_key,
+            replacements,
+            (
+                span.token
+                for spans in line_spans
+                for span in spans
+                if span.token not in replacements
+            ),
+        )
+        normalized = []
+        for line, spans in zip(lines, line_spans):
+            if not line.strip():
+                continue
+            parts = []
+            position = 0
+            for span in spans:
+                parts.append(line[position : span.start])
+                parts.append(replacements[span.token])
+                position = span.end
+            parts.append(line[position:])
+            normalized.append(b"".join(parts).rstrip())
+        return normalized
+
+    return normalize
+
+
+def _add_replacements(
+    cipher: F5MkuCipher,
+    hash_key: bytes,
+    replacements: Dict[bytes, bytes],
+    tokens: Iterable[bytes],
+) -> None:
+    """Decrypts `tokens` in one batch and stores their replacements."""
+    tokens = list(dict.fromkeys(tokens))
+    if not tokens:
+        return
+    results = cipher.decrypt_many([token.decode("ascii") for token in tokens])
+    for token, result in zip(tokens, results):
+        if result.error is not None:
+            # keep secrets which can't be decrypted, they are compared as is
+            replacements[token] = token
+            continue
+        fingerprint = hmac.new(
+            hash_key, result.value.encode("utf-8"), hashlib.sha256
+        ).hexdigest()[:_FINGERPRINT_LENGTH]
+        replacements[token] = f"<secret:{fingerprint}>".encode("ascii")
+
+
+def _digest(lines: List[bytes]) -> bytes:
+    """Returns the content hash of normalized stanza `lines`."""
+    digest = hashlib.sha256()
+    for line in lines:
+        digest.update(line)
+        digest.update(b"\n")
+    return digest.digest()
+
+
+def _read_stanza(path: Union[str, os.PathLike], line: int, offset: int) -> Stanza:
+    """Reads the stanza starting at byte `offset` of file `path`."""
+    with open(path, "rb") as config_file:
+        config_file.seek(offset)
+        return next(iter_stanzas(config_file, line=line, offset=offset))
+
+
+def _stanza_diff(
+    status: str,
+    header: bytes,
+    lines_a: List[bytes],
+    lines_b: List[bytes],
+    context: int,
+) -> StanzaDiff:
+    """Returns a StanzaDiff with the unified diff of normalized stanza lines."""
+    diff = difflib.unified_diff(
+        [line.decode("utf-8", "replace") for line in lines_a],
+        [line.decode("utf-8", "replace") for line in lines_b],
+        n=context,
+        lineterm="",
+    )
+    # skip the ---/+++ file header lines, the stanza header is reported instead
+    return StanzaDiff(status, header.decode("utf-8", "replace"), list(diff)[2:])
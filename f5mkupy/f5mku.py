@@ -1,27 +1,467 @@
 # -*- coding: utf-8 -*-
 """Main functions for f5mkupy."""
 
+import hashlib
+import hmac
 import secrets
 import string
+import threading
 from base64 import b64decode, b64encode
+from binascii import b2a_base64
 from collections import namedtuple
-from typing import Optional
+from functools import lru_cache
+from time import perf_counter
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+from . import metrics as _metrics
+from .cache import DecryptCache, _wipe
+from .validation import (
+    _BLOCK_SIZE,
+    _VALIDATION_ERRORS,
+    BytesLike,
+    F5Ciphertext,
+    Validation,
+    _parse_ciphertext,
+    _parse_ciphertext_bytes,
+    validate,
+    validate_many,
+)
 
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-
-F5Ciphertext = namedtuple("F5Ciphertext", "salt ciphertext")
 F5Plaintext = namedtuple("F5Plaintext", "salt plaintext")
+F5Result = namedtuple("F5Result", "value error")
+
+_SALT_ALPHABET = string.ascii_letters + string.digits
+_PADDINGS = [bytes((length,)) * length for length in range(_BLOCK_SIZE + 1)]
+
+# cache of ciphers without an own cache, rebound by enable_decrypt_cache and
+# disable_decrypt_cache, hence not a constant
+_default_cache: Optional[DecryptCache] = None  # pylint: disable=invalid-name
 
 __all__ = [
+    "F5MkuCipher",
+    "F5Result",
     "encrypt",
     "decrypt",
+    "derive_salt",
+    "encrypt_many",
+    "decrypt_many",
     "extract_salt",
+    "matches",
+    "compare_many",
+    "encrypt_bytes",
+    "decrypt_bytes",
+    "decrypt_many_bytes",
+    "Validation",
+    "validate",
+    "validate_many",
+    "enable_decrypt_cache",
+    "disable_decrypt_cache",
+    "clear_caches",
 ]
 
 
-def encrypt(plaintext: str, f5mku: str, salt: Optional[str] = None) -> str:
+class F5MkuCipher:
+    """Cipher bound to a single f5mku key.
+
+    The key is decoded and validated once, the AES-ECB cipher contexts are
+    created once per thread and reused for every secret. Use this class instead
+    of the module level functions when many secrets share the same key.
+    Examples:
+        >>> cipher = F5MkuCipher("BHDLd0bbao1VlwpTk1sioQ==")
+        >>> cipher.decrypt("$M$iP$rr0su9oHn9J9p1t3nRzydA==")
+        'KEY45678'
+        >>> cipher.encrypt("KEY45678", salt="ab")
+        '$M$ab$mmIL9xEWGe7pbNtvS/QAQA=='
+    Args:
+        f5mku (str): f5mku base64 key.
+        cache (DecryptCache): Optional cache of decrypted secrets, the cache enabled
+            by `enable_decrypt_cache` is used if not provided.
+    """
+
+    def __init__(self, f5mku: str, cache: Optional[DecryptCache] = None):
+        self._key = _f5mku_decode(f5mku)
+        self._cipher = _aes_ecb_cipher(self._key)
+        self._local = threading.local()
+        self.cache = cache
+        self.fingerprint = hashlib.sha256(self._key).hexdigest()[:16]
+        self._salt_key: Optional[bytes] = None
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__}>"
+
+    def __reduce__(self):
+        # cipher contexts and caches can't be pickled, re-create the cipher from the key instead
+        return (type(self), (_force_str(b64encode(self._key)),))
+
+    def encrypt(
+        self,
+        plaintext: str,
+        salt: Optional[str] = None,
+        context: Optional[Union[str, bytes]] = None,
+    ) -> str:
+        """Encrypts `plaintext` with optional `salt` or salt `context`, see `encrypt`."""
+        if salt is None and context is not None:
+            salt = self.derive_salt(context)
+        f5plaintext = _salt_plaintext(plaintext=_force_bytes(plaintext), salt=salt)
+        _ciphertext = self._encrypt_salted(f5plaintext.plaintext)
+        return _format_ciphertext(ciphertext=_ciphertext, salt=f5plaintext.salt)
+
+    def decrypt(self, ciphertext: str) -> str:
+        """Decrypts `ciphertext`, see `decrypt`."""
+        cache = self._decrypt_cache
+        if cache is not None:
+            _plaintext = cache.get(self.fingerprint, ciphertext)
+            _count_cache_lookup(_plaintext is not None)
+            if _plaintext is not None:
+                return _force_str(_plaintext)
+
+        _f5_ciphertext = _deconstruct_ciphertext(ciphertext)
+        _plaintext = self._decrypt_salted(
+            _f5_ciphertext.ciphertext, _f5_ciphertext.salt
+        )
+        _result = _force_str(_plaintext)
+        if cache is not None:
+            cache.put(self.fingerprint, ciphertext, _plaintext)
+        return _result
+
+    def derive_salt(self, context: Union[str, bytes], length: int = 2) -> str:
+        """Derives a deterministic salt from `context`, see `derive_salt`."""
+        if self._salt_key is None:
+            self._salt_key = hmac.new(
+                self._key, b"f5mkupy deterministic salt", hashlib.sha256
+            ).digest()
+        digest = hmac.new(self._salt_key, _force_bytes(context), hashlib.sha256)
+        number = int.from_bytes(digest.digest(), "big")
+        salt = []
+        for _ in range(length):
+            number, index = divmod(number, len(_SALT_ALPHABET))
+            salt.append(_SALT_ALPHABET[index])
+        return "".join(salt)
+
+    @staticmethod
+    def extract_salt(ciphertext: str) -> str:
+        """Extracts the salt from `ciphertext`, see `extract_salt`."""
+        return extract_salt(ciphertext)
+
+    # the stages of a batch share its buffer, spans and results in locals
+    def encrypt_many(  # pylint: disable=too-many-locals
+        self,
+        plaintexts: Iterable[str],
+        salts: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[F5Result]:
+        """Encrypts all `plaintexts` with a single cipher operation, see `encrypt_many`."""
+        plaintexts = list(plaintexts)
+        if salts is None:
+            salts = [None] * len(plaintexts)
+        elif len(salts) != len(plaintexts):
+            raise ValueError(
+                f"Number of salts ({len(salts)}) does not match "
+                f"number of plaintexts ({len(plaintexts)})."
+            )
+
+        metrics = _metrics.active
+        timer = perf_counter() if metrics is not None else 0.0
+        results = []
+        spans = []
+        buffer = bytearray()
+        for plaintext, salt in zip(plaintexts, salts):
+            try:
+                f5plaintext = _salt_plaintext(_force_bytes(plaintext), salt=salt)
+            except ValueError as exc:
+                results.append(F5Result(None, exc))
+                continue
+            start = len(buffer)
+            buffer += _pkcs7_pad(f5plaintext.plaintext)
+            spans.append((len(results), f5plaintext.salt, start, len(buffer)))
+            results.append(None)
+
+        if metrics is not None:
+            timer = metrics.lap("pad", timer, len(results))
+        encrypted = self._encryptor.update(bytes(buffer))
+        if metrics is not None:
+            timer = metrics.lap("crypt", timer, len(spans))
+        for index, salt, start, end in spans:
+            results[index] = F5Result(
+                _format_ciphertext(ciphertext=encrypted[start:end], salt=salt), None
+            )
+        if metrics is not None:
+            metrics.lap("encode", timer, len(spans))
+        return results
+
+    # the stages of a batch share its buffer, spans and results in locals
+    def decrypt_many(  # pylint: disable=too-many-locals
+        self, ciphertexts: Iterable[str]
+    ) -> List[F5Result]:
+        """Decrypts all `ciphertexts` with a single cipher operation, see `decrypt_many`."""
+        cache = self._decrypt_cache
+        results = []
+        spans = []
+        buffer = bytearray()
+        for ciphertext in ciphertexts:
+            if cache is not None:
+                _plaintext = cache.get(self.fingerprint, ciphertext)
+                _count_cache_lookup(_plaintext is not None)
+                if _plaintext is not None:
+                    results.append(F5Result(_force_str(_plaintext), None))
+                    continue
+            _f5_ciphertext = _parse_ciphertext(ciphertext)
+            if isinstance(_f5_ciphertext, Validation):
+                results.append(_invalid_result(_f5_ciphertext))
+                continue
+            start = len(buffer)
+            buffer += _f5_ciphertext.ciphertext
+            spans.append(
+                (len(results), ciphertext, _f5_ciphertext.salt, start, len(buffer))
+            )
+            results.append(None)
+
+        metrics = _metrics.active
+        timer = perf_counter() if metrics is not None else 0.0
+        decrypted = self._decryptor.update(bytes(buffer))
+        if metrics is not None:
+            timer = metrics.lap("crypt", timer, len(spans))
+        for index, ciphertext, salt, start, end in spans:
+            try:
+                _plaintext = _remove_salt(
+                    plaintext=_pkcs7_unpad(decrypted[start:end]), salt=salt
+                )
+                results[index] = F5Result(_force_str(_plaintext), None)
+            except ValueError as exc:
+                results[index] = F5Result(None, exc)
+                continue
+            if cache is not None:
+                cache.put(self.fingerprint, ciphertext, _plaintext)
+        if metrics is not None:
+            metrics.lap("unpad", timer, len(spans))
+        return results
+
+    def matches(self, plaintext: str, ciphertext: str) -> bool:
+        """Checks if `ciphertext` is the encrypted `plaintext`, see `matches`."""
+        _f5_ciphertext = _deconstruct_ciphertext(ciphertext)
+        _check_block_alignment(_f5_ciphertext.ciphertext)
+        _candidate = self._encrypt_salted(_f5_ciphertext.salt + _force_bytes(plaintext))
+        return hmac.compare_digest(_candidate, _f5_ciphertext.ciphertext)
+
+    # the stages of a batch share its buffer, spans and results in locals
+    def compare_many(  # pylint: disable=too-many-locals
+        self, pairs: Iterable[Tuple[str, str]]
+    ) -> List[F5Result]:
+        """Checks all (plaintext, ciphertext) `pairs` with a single cipher operation,
+        see `compare_many`."""
+        results = []
+        spans = []
+        buffer = bytearray()
+        for plaintext, ciphertext in pairs:
+            _f5_ciphertext = _parse_ciphertext(ciphertext)
+            if isinstance(_f5_ciphertext, Validation):
+                results.append(_invalid_result(_f5_ciphertext))
+                continue
+            try:
+                padded = _pkcs7_pad(_f5_ciphertext.salt + _force_bytes(plaintext))
+            except ValueError as exc:
+                results.append(F5Result(None, exc))
+                continue
+            start = len(buffer)
+            buffer += padded
+            spans.append((len(results), _f5_ciphertext.ciphertext, start, len(buffer)))
+            results.append(None)
+
+        metrics = _metrics.active
+        timer = perf_counter() if metrics is not None else 0.0
+        encrypted = self._encryptor.update(bytes(buffer))
+        if metrics is not None:
+            metrics.lap("crypt", timer, len(spans))
+        for index, expected, start, end in spans:
+            results[index] = F5Result(
+                hmac.compare_digest(encrypted[start:end], expected), None
+            )
+        return results
+
+    def encrypt_bytes(
+        self, plaintext: BytesLike, salt: Optional[BytesLike] = None
+    ) -> bytes:
+        """Encrypts bytes-like `plaintext` with optional `salt`, see `encrypt_bytes`."""
+        salt = _generate_salt() if salt is None else salt
+        salt_length = len(salt)
+        length = salt_length + len(plaintext)
+        padded_length = (length // _BLOCK_SIZE + 1) * _BLOCK_SIZE
+        padded = bytearray(padded_length)
+        padded[:salt_length] = salt
+        padded[salt_length:length] = plaintext
+        padded[length:] = _PADDINGS[padded_length - length]
+        encrypted = bytearray(padded_length + _BLOCK_SIZE - 1)
+        try:
+            self._update_into(self._encryptor, padded, encrypted)
+        finally:
+            _wipe(padded)
+        return b"".join(
+            (
+                b"$M$",
+                salt,
+                b"$",
+                b2a_base64(memoryview(encrypted)[:padded_length], newline=False),
+            )
+        )
+
+    def decrypt_bytes(self, ciphertext: BytesLike) -> bytearray:
+        """Decrypts bytes-like `ciphertext`, see `decrypt_bytes`."""
+        salt, encrypted = _split_ciphertext_bytes(ciphertext)
+        plaintext = bytearray(len(encrypted) + _BLOCK_SIZE - 1)
+        length = self._update_into(self._decryptor, encrypted, plaintext)
+        try:
+            start, end = _unpad_bytes(plaintext, 0, length, salt)
+        except ValueError:
+            _wipe(plaintext)
+            raise
+        # trim in place, no copy of the plaintext is made
+        del plaintext[end:]
+        del plaintext[:start]
+        return plaintext
+
+    def decrypt_into(
+        self, ciphertext: BytesLike, out: Union[bytearray, memoryview]
+    ) -> int:
+        """Decrypts bytes-like `ciphertext` into the writable buffer `out`.
+        If `out` has room for the ciphertext and another AES block, it is decrypted in
+        place, otherwise through a temporary buffer which is wiped. Bytes of `out`
+        after the plaintext which were used for decryption are zeroed.
+        Examples:
+            >>> buffer = bytearray(64)
+            >>> length = cipher.decrypt_into(b"$M$iP$rr0su9oHn9J9p1t3nRzydA==", buffer)
+            >>> bytes(buffer[:length])
+            b'KEY45678'
+        Returns:
+            Length of the plaintext written to the start of `out`.
+        """
+        salt, encrypted = _split_ciphertext_bytes(ciphertext)
+        out = memoryview(out).cast("B")
+        required = len(encrypted) + _BLOCK_SIZE - 1
+        work = out if len(out) >= required else memoryview(bytearray(required))
+        length = 0
+        try:
+            length = self._update_into(self._decryptor, encrypted, work)
+            start, end = _unpad_bytes(work, 0, length, salt)
+            if end - start > len(out):
+                raise ValueError(
+                    f"Buffer of {len(out)} bytes is too small "
+                    f"for the plaintext of {end - start} bytes."
+                )
+            out[: end - start] = work[start:end]
+        except ValueError:
+            work[:length] = bytes(length)
+            raise
+        if work is out:
+            out[end - start : length] = bytes(length - end + start)
+        else:
+            work[:] = bytes(len(work))
+        return end - start
+
+    def decrypt_many_bytes(self, ciphertexts: Iterable[BytesLike]) -> List[F5Result]:
+        """Decrypts all bytes-like `ciphertexts` with a single cipher operation,
+        see `decrypt_many_bytes`."""
+        results = []
+        spans = []
+        buffer = bytearray()
+        for ciphertext in ciphertexts:
+            _f5_ciphertext = _parse_ciphertext_bytes(ciphertext)
+            if isinstance(_f5_ciphertext, Validation):
+                results.append(_invalid_result(_f5_ciphertext))
+                continue
+            start = len(buffer)
+            buffer += _f5_ciphertext.ciphertext
+            spans.append((len(results), _f5_ciphertext.salt, start, len(buffer)))
+            results.append(None)
+
+        decrypted = bytearray(len(buffer) + _BLOCK_SIZE - 1)
+        self._update_into(self._decryptor, buffer, decrypted, len(spans))
+        view = memoryview(decrypted)
+        for index, salt, start, end in spans:
+            try:
+                start, end = _unpad_bytes(view, start, end, salt)
+            except ValueError as exc:
+                results[index] = F5Result(None, exc)
+                continue
+            results[index] = F5Result(bytearray(view[start:end]), None)
+        view.release()
+        _wipe(decrypted)
+        return results
+
+    def decrypt_blocks(self, blocks: BytesLike) -> bytes:
+        """Decrypts whole AES blocks without removing padding or salt, e.g. to check
+        the first block of ciphertexts against their salts, see `identify_key`."""
+        _check_block_alignment(blocks)
+        return self._decryptor.update(blocks)
+
+    def _encrypt_salted(self, salted_plaintext: bytes) -> bytes:
+        """Pads and encrypts `salted_plaintext` with the cached encryption context."""
+        metrics = _metrics.active
+        if metrics is None:
+            return self._encryptor.update(_pkcs7_pad(salted_plaintext))
+        start = perf_counter()
+        ciphertext = self._encryptor.update(_pkcs7_pad(salted_plaintext))
+        metrics.lap("crypt", start)
+        return ciphertext
+
+    def _decrypt_salted(self, ciphertext: bytes, salt: bytes) -> bytes:
+        """Decrypts `ciphertext` with the cached decryption context, removes the
+        padding and `salt`."""
+        _check_block_alignment(ciphertext)
+        metrics = _metrics.active
+        if metrics is None:
+            return _remove_salt(
+                plaintext=_pkcs7_unpad(self._decryptor.update(ciphertext)), salt=salt
+            )
+        start = perf_counter()
+        decrypted = self._decryptor.update(ciphertext)
+        start = metrics.lap("crypt", start)
+        plaintext = _remove_salt(plaintext=_pkcs7_unpad(decrypted), salt=salt)
+        metrics.lap("unpad", start)
+        return plaintext
+
+    @staticmethod
+    def _update_into(context, data: BytesLike, out: BytesLike, items: int = 1) -> int:
+        """Runs `data` through the cipher `context` into `out`, returns the number of
+        bytes written."""
+        metrics = _metrics.active
+        if metrics is None:
+            return context.update_into(data, out)
+        start = perf_counter()
+        length = context.update_into(data, out)
+        metrics.lap("crypt", start, items)
+        return length
+
+    @property
+    def _decrypt_cache(self) -> Optional[DecryptCache]:
+        """Cache of this cipher or the cache enabled by `enable_decrypt_cache`."""
+        return self.cache if self.cache is not None else _default_cache
+
+    @property
+    def _encryptor(self):
+        """ECB encryption context of the current thread.
+        ECB is stateless and input is always block aligned, hence the context never
+        needs to be finalized and can be reused."""
+        try:
+            return self._local.encryptor
+        except AttributeError:
+            self._local.encryptor = self._cipher.encryptor()
+            return self._local.encryptor
+
+    @property
+    def _decryptor(self):
+        """ECB decryption context of the current thread, see `_encryptor`."""
+        try:
+            return self._local.decryptor
+        except AttributeError:
+            self._local.decryptor = self._cipher.decryptor()
+            return self._local.decryptor
+
+
+def encrypt(
+    plaintext: str,
+    f5mku: Union[str, F5MkuCipher],
+    salt: Optional[str] = None,
+    context: Optional[Union[str, bytes]] = None,
+) -> str:
     """Encrypts `plaintext` with `f5mku` and optional `salt`.
     Examples:
         >>> encrypt("KEY45678", "BHDLd0bbao1VlwpTk1sioQ==")
@@ -30,36 +470,54 @@ def encrypt(plaintext: str, f5mku: str, salt: Optional[str] = None) -> str:
         '$M$ab$mmIL9xEWGe7pbNtvS/QAQA=='
     Args:
         plaintext (str): plaintext string to encrypt.
-        f5mku (str): f5mku base64 key.
+        f5mku (str): f5mku base64 key or F5MkuCipher.
         salt (str): Optional salt to use instead of generating a random salt.
+        context (str): Optional context to derive the salt from, see `derive_salt`.
+            Ignored if `salt` is provided.
     Returns:
         F5 formatted ciphertext as found in F5 config files.
     """
-    _plaintext = _force_bytes(plaintext)
-    _f5mku = _f5mku_decode(f5mku)
-
-    f5plaintext = _salt_plaintext(plaintext=_plaintext, salt=salt)
-    _ciphertext = _encryptor(salted_plaintext=f5plaintext.plaintext, key=_f5mku)
-
-    return _format_ciphertext(ciphertext=_ciphertext, salt=f5plaintext.salt)
+    return _as_cipher(f5mku).encrypt(plaintext, salt=salt, context=context)
+
+
+def derive_salt(
+    context: Union[str, bytes], f5mku: Union[str, F5MkuCipher], length: int = 2
+) -> str:
+    """Derives a deterministic salt of `length` alphanumeric characters from `context`.
+    The salt is a HMAC-SHA256 of `context`, e.g. the object path and attribute of a
+    secret, keyed with a key derived from `f5mku`. Encrypting the same plaintext
+    with the same context gives the same ciphertext, so unchanged secrets of
+    re-rendered configs stay byte-identical. Equal ciphertexts reveal equal
+    plaintexts of the same context, random salts remain the default.
+    Examples:
+        >>> encrypt(
+        ...     "KEY45678",
+        ...     "BHDLd0bbao1VlwpTk1sioQ==",
+        ...     context="ltm profile client-ssl /Common/foo passphrase",
+        ... )
+        '$M$k9$AJd7tBWwtXB4T48PKqyAjw=='
+    Args:
+        context (str): context of the secret.
+        f5mku (str): f5mku base64 key or F5MkuCipher.
+        length (int): Length of the salt.
+    Returns:
+        The salt string.
+    """
+    return _as_cipher(f5mku).derive_salt(context, length=length)
 
 
-def decrypt(ciphertext: str, f5mku: str) -> str:
+def decrypt(ciphertext: str, f5mku: Union[str, F5MkuCipher]) -> str:
     """Decrypts `ciphertext` with `f5mku` key.
     Examples:
         >>> decrypt("$M$iP$rr0su9oHn9J9p1t3nRzydA==", "BHDLd0bbao1VlwpTk1sioQ==")
         'KEY45678'
     Args:
         ciphertext (str): F5 formatted ciphertext string to decrypt.
-        f5mku (str): f5mku base64 key.
+        f5mku (str): f5mku base64 key or F5MkuCipher.
     Returns:
         Plaintext.
     """
-    _f5_ciphertext = _deconstruct_ciphertext(ciphertext)
-    _f5mku = _f5mku_decode(f5mku)
-    _salted_plaintext = _decryptor(ciphertext=_f5_ciphertext.ciphertext, key=_f5mku)
-    _plaintext = _remove_salt(plaintext=_salted_plaintext, salt=_f5_ciphertext.salt)
-    return _force_str(_plaintext)
+    return _as_cipher(f5mku).decrypt(ciphertext)
 
 
 def extract_salt(ciphertext: str) -> str:
@@ -76,40 +534,303 @@ def extract_salt(ciphertext: str) -> str:
     return _force_str(f5ciphertext.salt)
 
 
+def encrypt_bytes(
+    plaintext: BytesLike,
+    f5mku: Union[str, F5MkuCipher],
+    salt: Optional[BytesLike] = None,
+) -> bytes:
+    """Encrypts bytes-like `plaintext` with `f5mku` and optional `salt`.
+    Like `encrypt` without str conversions, the salted and padded plaintext is built
+    in a single buffer which is wiped after encryption.
+    Examples:
+        >>> encrypt_bytes(b"KEY45678", "BHDLd0bbao1VlwpTk1sioQ==", salt=b"ab")
+        b'$M$ab$mmIL9xEWGe7pbNtvS/QAQA=='
+    Args:
+        plaintext (bytes): bytes, bytearray or memoryview to encrypt.
+        f5mku (str): f5mku base64 key or F5MkuCipher.
+        salt (bytes): Optional salt to use instead of generating a random salt.
+    Returns:
+        F5 formatted ciphertext as bytes.
+    """
+    return _as_cipher(f5mku).encrypt_bytes(plaintext, salt=salt)
+
+
+def decrypt_bytes(ciphertext: BytesLike, f5mku: Union[str, F5MkuCipher]) -> bytearray:
+    """Decrypts bytes-like F5 formatted `ciphertext` with `f5mku`.
+    Like `decrypt` without str conversions, the ciphertext is parsed without copies
+    and decrypted into a buffer which is trimmed in place to the plaintext. The
+    decrypt cache is not used, the caller can wipe the returned plaintext.
+    Examples:
+        >>> decrypt_bytes(b"$M$iP$rr0su9oHn9J9p1t3nRzydA==", "BHDLd0bbao1VlwpTk1sioQ==")
+        bytearray(b'KEY45678')
+    Args:
+        ciphertext (bytes): F5 formatted ciphertext as bytes, bytearray or memoryview.
+        f5mku (str): f5mku base64 key or F5MkuCipher.
+    Returns:
+        Plaintext as bytearray.
+    """
+    return _as_cipher(f5mku).decrypt_bytes(ciphertext)
+
+
+def decrypt_many_bytes(
+    ciphertexts: Iterable[BytesLike], f5mku: Union[str, F5MkuCipher]
+) -> List[F5Result]:
+    """Decrypts all bytes-like `ciphertexts` with a single cipher operation.
+    Like `decrypt_many` with `decrypt_bytes` semantics, the shared decryption buffer
+    is wiped once all plaintexts were copied out.
+    Examples:
+        >>> results = decrypt_many_bytes(
+        ...     [b"$M$iP$rr0su9oHn9J9p1t3nRzydA==", b"invalid"], "BHDLd0bbao1VlwpTk1sioQ=="
+        ... )
+        >>> results[0]
+        F5Result(value=bytearray(b'KEY45678'), error=None)
+        >>> results[1].error
+        ValueError("Unrecognized ciphertext: ...")
+    Args:
+        ciphertexts (Iterable[bytes]): F5 formatted ciphertexts as bytes-like objects.
+        f5mku (str): f5mku base64 key or F5MkuCipher.
+    Returns:
+        List of F5Result with the plaintext as bytearray or the error, in input order.
+    """
+    return _as_cipher(f5mku).decrypt_many_bytes(ciphertexts)
+
+
+def encrypt_many(
+    plaintexts: Iterable[str],
+    f5mku: Union[str, F5MkuCipher],
+    salts: Optional[Sequence[Optional[str]]] = None,
+) -> List[F5Result]:
+    """Encrypts all `plaintexts` with `f5mku` and optional `salts`.
+    All salted and padded plaintexts are concatenated and encrypted by a single
+    AES-ECB operation, the result is split back per plaintext.
+    Examples:
+        >>> results = encrypt_many(
+        ...     ["KEY45678", "KEY456789ABC"], "BHDLd0bbao1VlwpTk1sioQ==", salts=["iP", "Mk"]
+        ... )
+        >>> [result.value for result in results]
+        ['$M$iP$rr0su9oHn9J9p1t3nRzydA==', '$M$Mk$GL57Qhk8FnyM0N1ALomxRQ==']
+    Args:
+        plaintexts (Iterable[str]): plaintext strings to encrypt.
+        f5mku (str): f5mku base64 key or F5MkuCipher.
+        salts (Sequence[str]): Optional salts, one per plaintext. `None` entries get a
+            random salt.
+    Returns:
+        List of F5Result, `value` is the F5 formatted ciphertext or `error` the
+        exception of this item.
+    """
+    return _as_cipher(f5mku).encrypt_many(plaintexts, salts=salts)
+
+
+def decrypt_many(
+    ciphertexts: Iterable[str], f5mku: Union[str, F5MkuCipher]
+) -> List[F5Result]:
+    """Decrypts all `ciphertexts` with `f5mku` key.
+    All ciphertexts are concatenated and decrypted by a single AES-ECB operation,
+    padding and salt are checked per ciphertext. Invalid items do not fail the batch.
+    Examples:
+        >>> decrypt_many(["$M$iP$rr0su9oHn9J9p1t3nRzydA==", "$X$iP$"], "BHDLd0bbao1VlwpTk1sioQ==")
+        [F5Result(value='KEY45678', error=None), F5Result(value=None, error=ValueError(...))]
+    Args:
+        ciphertexts (Iterable[str]): F5 formatted ciphertext strings to decrypt.
+        f5mku (str): f5mku base64 key or F5MkuCipher.
+    Returns:
+        List of F5Result, `value` is the plaintext or `error` the exception of this item.
+    """
+    return _as_cipher(f5mku).decrypt_many(ciphertexts)
+
+
+def matches(plaintext: str, ciphertext: str, f5mku: Union[str, F5MkuCipher]) -> bool:
+    """Checks if `ciphertext` is the encrypted `plaintext` without decrypting it.
+    `plaintext` is encrypted with the salt embedded in `ciphertext`, the ciphertexts
+    are compared in constant time.
+    Examples:
+        >>> matches("KEY45678", "$M$iP$rr0su9oHn9J9p1t3nRzydA==", "BHDLd0bbao1VlwpTk1sioQ==")
+        True
+    Args:
+        plaintext (str): expected plaintext.
+        ciphertext (str): F5 formatted ciphertext string.
+        f5mku (str): f5mku base64 key or F5MkuCipher.
+    Returns:
+        True if `ciphertext` is the encrypted `plaintext`.
+    """
+    return _as_cipher(f5mku).matches(plaintext, ciphertext)
+
+
+def compare_many(
+    pairs: Iterable[Tuple[str, str]], f5mku: Union[str, F5MkuCipher]
+) -> List[F5Result]:
+    """Checks all (plaintext, ciphertext) `pairs`, see `matches`.
+    All candidates are encrypted by a single AES-ECB operation. Invalid ciphertexts
+    do not fail the batch.
+    Examples:
+        >>> compare_many(
+        ...     [
+        ...         ("KEY45678", "$M$iP$rr0su9oHn9J9p1t3nRzydA=="),
+        ...         ("other", "$M$iP$rr0su9oHn9J9p1t3nRzydA=="),
+        ...     ],
+        ...     "BHDLd0bbao1VlwpTk1sioQ==",
+        ... )
+        [F5Result(value=True, error=None), F5Result(value=False, error=None)]
+    Args:
+        pairs (Iterable[Tuple[str, str]]): (plaintext, ciphertext) pairs.
+        f5mku (str): f5mku base64 key or F5MkuCipher.
+    Returns:
+        List of F5Result, `value` is True/False or `error` the exception of this item.
+    """
+    return _as_cipher(f5mku).compare_many(pairs)
+
+
+def enable_decrypt_cache(maxsize: int = 4096) -> DecryptCache:
+    """Enables a LRU cache of decrypted secrets for all ciphers without an own cache.
+    The cache is used by `decrypt`, `decrypt_many` and everything built on top of
+    them, like the config rewrite. A previously enabled cache is cleared.
+    Examples:
+        >>> cache = enable_decrypt_cache(maxsize=1000)
+        >>> decrypt("$M$iP$rr0su9oHn9J9p1t3nRzydA==", "BHDLd0bbao1VlwpTk1sioQ==")
+        'KEY45678'
+        >>> cache.info()
+        CacheInfo(hits=0, misses=1, maxsize=1000, currsize=1)
+    Args:
+        maxsize (int): Maximum number of cached secrets.
+    Returns:
+        The enabled DecryptCache.
+    """
+    global _default_cache  # pylint: disable=global-statement
+    disable_decrypt_cache()
+    _default_cache = DecryptCache(maxsize=maxsize)
+    return _default_cache
+
+
+def disable_decrypt_cache() -> None:
+    """Disables and wipes the cache enabled by `enable_decrypt_cache`."""
+    global _default_cache  # pylint: disable=global-statement
+    if _default_cache is not None:
+        _default_cache.clear()
+    _default_cache = None
+
+
+def clear_caches() -> None:
+    """Disables and wipes the decrypt cache, see `disable_decrypt_cache`, and drops
+    the ciphers of recently used keys, which hold the decoded f5mku keys."""
+    disable_decrypt_cache()
+    _cached_cipher.cache_clear()
+
+
+def _as_cipher(f5mku: Union[str, F5MkuCipher]) -> F5MkuCipher:
+    """Returns `f5mku` if it is a F5MkuCipher already, otherwise a cached F5MkuCipher
+    for the key."""
+    if isinstance(f5mku, F5MkuCipher):
+        return f5mku
+    return _cached_cipher(f5mku)
+
+
+@lru_cache(maxsize=8)
+def _cached_cipher(f5mku: str) -> F5MkuCipher:
+    """Creates F5MkuCipher for `f5mku`, recently used keys are cached."""
+    return F5MkuCipher(f5mku)
+
+
+def _aes_ecb_cipher(key: bytes):
+    """Creates AES-ECB Cipher for `key`.
+    cryptography is imported here, so that only code paths which actually encrypt
+    or decrypt pay for importing it."""
+    # pylint: disable=import-outside-toplevel
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    return Cipher(
+        algorithm=algorithms.AES(key), mode=modes.ECB(), backend=default_backend()
+    )
+
+
 def _encryptor(salted_plaintext: bytes, key: bytes) -> bytes:
     """Performs cryptographic operation of encrypting the `salted_plaintext` with given `key`."""
-    encryptor = Cipher(
-        algorithm=algorithms.AES(key), mode=modes.ECB(), backend=default_backend()
-    ).encryptor()
-    padder = padding.PKCS7(algorithms.AES(key).block_size).padder()
-    padded_data = padder.update(salted_plaintext) + padder.finalize()
+    encryptor = _aes_ecb_cipher(key).encryptor()
+    padded_data = _pkcs7_pad(salted_plaintext)
     encrypted_text = encryptor.update(padded_data) + encryptor.finalize()
     return encrypted_text
 
 
 def _decryptor(ciphertext: bytes, key: bytes) -> bytes:
     """Performs cryptographic operation of decrypting the `ciphertext` with given `key`."""
-    decryptor = Cipher(
-        algorithm=algorithms.AES(key), mode=modes.ECB(), backend=default_backend()
-    ).decryptor()
-    unpadder = padding.PKCS7(algorithms.AES(key).block_size).unpadder()
-    decrypted_data = decryptor.update(ciphertext)
-    unpadded = unpadder.update(decrypted_data) + unpadder.finalize()
+    decryptor = _aes_ecb_cipher(key).decryptor()
+    decrypted_data = decryptor.update(ciphertext) + decryptor.finalize()
+    unpadded = _pkcs7_unpad(decrypted_data)
     return unpadded
 
 
+def _check_block_alignment(ciphertext: bytes) -> None:
+    """Raises ValueError unless `ciphertext` is a non-empty multiple of the AES block size."""
+    if not ciphertext or len(ciphertext) % _BLOCK_SIZE:
+        raise ValueError(
+            f"Ciphertext length ({len(ciphertext)}) is not a multiple of the block size."
+        )
+
+
+def _pkcs7_pad(data: bytes) -> bytes:
+    """Adds PKCS7 padding to `data`."""
+    pad_length = _BLOCK_SIZE - len(data) % _BLOCK_SIZE
+    return data + bytes((pad_length,)) * pad_length
+
+
+def _pkcs7_unpad(data: bytes) -> bytes:
+    """Removes and validates PKCS7 padding of `data`."""
+    pad_length = data[-1] if data else 0
+    if (
+        not 0 < pad_length <= _BLOCK_SIZE
+        or len(data) < pad_length
+        or data[-pad_length:] != bytes((pad_length,)) * pad_length
+    ):
+        raise ValueError("Invalid padding bytes.")
+    return data[:-pad_length]
+
+
+def _split_ciphertext_bytes(ciphertext: BytesLike) -> F5Ciphertext:
+    """Returns (salt, decoded ciphertext) of a bytes-like F5 formatted ciphertext,
+    raises ValueError if it fails `validate`."""
+    _f5_ciphertext = _parse_ciphertext_bytes(ciphertext)
+    if isinstance(_f5_ciphertext, Validation):
+        raise ValueError(_VALIDATION_ERRORS[_f5_ciphertext])
+    return _f5_ciphertext
+
+
+def _unpad_bytes(
+    buffer: BytesLike, start: int, end: int, salt: BytesLike
+) -> Tuple[int, int]:
+    """Validates padding and salt of the decrypted data buffer[start:end] without
+    copying it, returns the (start, end) offsets of the plaintext within `buffer`."""
+    pad_length = buffer[end - 1] if end > start else 0
+    if (
+        not 0 < pad_length <= _BLOCK_SIZE
+        or end - start < pad_length
+        or buffer[end - pad_length : end] != _PADDINGS[pad_length]
+    ):
+        raise ValueError("Invalid padding bytes.")
+    end -= pad_length
+    salt_end = start + len(salt)
+    if salt_end > end or buffer[start:salt_end] != salt:
+        raise ValueError(f"Plaintext does not start with salt {bytes(salt)}")
+    return salt_end, end
+
+
 def _f5mku_decode(f5mku: str) -> bytes:
     """Decodes base64 encoded F5MKU key."""
+    metrics = _metrics.active
+    start = perf_counter() if metrics is not None else 0.0
     try:
         _f5mku = b64decode(f5mku)
-        _ = algorithms.AES(_f5mku)  # test if provided f5mku key is a valid AES key
+        _ = _aes_ecb_cipher(_f5mku)  # test if provided f5mku key is a valid AES key
 
+    except ImportError:
+        raise
     except Exception as exc:
         # pylint: disable=line-too-long
         raise ValueError(
             "decoding of f5mku failed. Make sure you are using the base64 formatted key returned by command: f5mku -K"
         ) from exc
 
+    if metrics is not None:
+        metrics.lap("key", start)
     return _f5mku
 
 
@@ -141,8 +862,10 @@ def _salt_plaintext(plaintext: bytes, salt: Optional[str] = None) -> F5Plaintext
 def _deconstruct_ciphertext(ciphertext: str) -> F5Ciphertext:
     """Deconstructs the F5 formatted ciphertext as found in F5 configuration files."""
     # "$M$iP$rr0su9oHn9J9p1t3nRzydA==" -> ['', 'M', 'iP', 'rr0su9oHn9J9p1t3nRzydA==']
+    metrics = _metrics.active
+    start = perf_counter() if metrics is not None else 0.0
     try:
-        (_f5start, _f5type, _salt, _ciphertext) = ciphertext.split("$")
+        _f5start, _f5type, _salt, _ciphertext = ciphertext.split("$")
     except ValueError as exc:
         # pylint: disable=line-too-long
         raise ValueError(
@@ -159,11 +882,27 @@ def _deconstruct_ciphertext(ciphertext: str) -> F5Ciphertext:
         raise ValueError("Unrecognized ciphertext: Empty ciphertext is not supported.")
 
     _salt = _force_bytes(_salt)
+    if metrics is not None:
+        start = metrics.lap("parse", start)
     _ciphertext = b64decode(_ciphertext)
+    if metrics is not None:
+        metrics.lap("decode", start)
 
     return F5Ciphertext(_salt, _ciphertext)
 
 
+def _invalid_result(validation: Validation) -> F5Result:
+    """Returns the F5Result of a ciphertext which failed `validate`."""
+    return F5Result(None, ValueError(_VALIDATION_ERRORS[validation]))
+
+
+def _count_cache_lookup(hit: bool) -> None:
+    """Counts a decrypt cache hit or miss if metrics are enabled."""
+    metrics = _metrics.active
+    if metrics is not None:
+        metrics.increment("decrypt_cache_hits" if hit else "decrypt_cache_misses")
+
+
 def _format_ciphertext(ciphertext: bytes, salt: bytes) -> str:
     """Creates F5 format of `ciphertext` and `salt`."""
     _ciphertext = b64encode(ciphertext)
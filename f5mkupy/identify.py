@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Identification of the f5mku key secrets were encrypted with, without decrypting
+them completely."""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from .f5mku import F5MkuCipher
+from .validation import _BLOCK_SIZE, Validation, _parse_ciphertext
+
+__all__ = [
+    "identify_key",
+    "identify_keys",
+]
+
+
+def identify_key(
+    ciphertexts: Iterable[str],
+    candidate_keys: Union[
+        Dict[str, Union[str, F5MkuCipher]], Iterable[Union[str, F5MkuCipher]]
+    ],
+    sample_size: int = 8,
+) -> Optional[Any]:
+    """Identifies which of `candidate_keys` `ciphertexts` were encrypted with.
+    Only the first AES block of up to `sample_size` ciphertexts is decrypted per key
+    and checked to start with the salt of the ciphertext. The first key matching all
+    samples is returned.
+    Examples:
+        >>> identify_key(
+        ...     ["$M$iP$rr0su9oHn9J9p1t3nRzydA=="],
+        ...     {"old": "BHDLd0bbao1VlwpTk1sioQ==", "new": "ukDKiN3j4YfWPI8FPbZLoA=="},
+        ... )
+        'old'
+    Args:
+        ciphertexts (Iterable[str]): F5 formatted ciphertext strings, invalid items are skipped.
+        candidate_keys (Dict[str, str]): f5mku base64 keys or F5MkuCiphers by name,
+            or an iterable of them.
+        sample_size (int): Maximum number of ciphertexts to check.
+    Returns:
+        Name of the matching key, or the matching key itself if `candidate_keys` is
+        not a dict. None if no key matches or there are no valid ciphertexts.
+    """
+    return identify_keys({None: ciphertexts}, candidate_keys, sample_size)[None]
+
+
+def identify_keys(
+    groups: Dict[Any, Iterable[str]],
+    candidate_keys: Union[
+        Dict[str, Union[str, F5MkuCipher]], Iterable[Union[str, F5MkuCipher]]
+    ],
+    sample_size: int = 8,
+) -> Dict[Any, Optional[Any]]:
+    """Identifies the key of every group of ciphertexts, like the secrets of one config file.
+    Every candidate key decrypts the first blocks of all groups not yet identified in a
+    single AES-ECB operation, see `identify_key`.
+    Args:
+        groups (Dict[Any, Iterable[str]]): ciphertexts by group, e.g. by file name.
+        candidate_keys (Dict[str, str]): f5mku base64 keys or F5MkuCiphers by name,
+            or an iterable of them.
+        sample_size (int): Maximum number of ciphertexts to check per group.
+    Returns:
+        Dict of group to the name of the matching key, see `identify_key`.
+        Invalid candidate keys are skipped, they match no group.
+    """
+    samples = {
+        group: _first_blocks(ciphertexts, sample_size)
+        for group, ciphertexts in groups.items()
+    }
+    identified = dict.fromkeys(groups)
+    pending = [group for group, sample in samples.items() if sample]
+    if isinstance(candidate_keys, dict):
+        candidates = candidate_keys.items()
+    else:
+        candidates = ((key, key) for key in candidate_keys)
+    for name, key in candidates:
+        if not pending:
+            break
+        try:
+            cipher = key if isinstance(key, F5MkuCipher) else F5MkuCipher(key)
+        except ValueError:
+            continue
+        matched_samples = _match_first_blocks(
+            cipher, [samples[group] for group in pending]
+        )
+        for group, matched in zip(pending, matched_samples):
+            if matched:
+                identified[group] = name
+        pending = [
+            group for group, matched in zip(pending, matched_samples) if not matched
+        ]
+    return identified
+
+
+def _first_blocks(ciphertexts: Iterable[str], count: int) -> List[Tuple[bytes, bytes]]:
+    """Returns (salt, first AES block) of the first `count` valid `ciphertexts`."""
+    blocks = []
+    for ciphertext in ciphertexts:
+        if len(blocks) >= count:
+            break
+        _f5_ciphertext = _parse_ciphertext(ciphertext)
+        if isinstance(_f5_ciphertext, Validation):
+            continue
+        blocks.append(
+            (_f5_ciphertext.salt[:_BLOCK_SIZE], _f5_ciphertext.ciphertext[:_BLOCK_SIZE])
+        )
+    return blocks
+
+
+def _match_first_blocks(
+    cipher: F5MkuCipher, samples: List[List[Tuple[bytes, bytes]]]
+) -> List[bool]:
+    """Decrypts the first blocks of all `samples` at once, returns per sample whether
+    every block starts with its salt, see `_first_blocks`."""
+    decrypted = cipher.decrypt_blocks(
+        b"".join(block for sample in samples for _, block in sample)
+    )
+    position = 0
+    matched_samples = []
+    for sample in samples:
+        matched = True
+        for salt, _ in sample:
+            matched &= decrypted[position : position + len(salt)] == salt
+            position += _BLOCK_SIZE
+        matched_samples.append(matched)
+    return matched_samples
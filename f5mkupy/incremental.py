@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""Incremental processing of bigip*.conf files, only changed stanzas are processed.
+
+A local JSON state file keeps per file and top-level stanza a hash of the raw
+stanza, a hash of the stanza with secrets replaced by keyed fingerprints of their
+plaintexts and the fingerprint per secret attribute. Plaintexts are not stored.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+from collections import namedtuple
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from .conf import (
+    Stanza,
+    _atomic_writer,
+    find_config_files,
+    iter_stanzas,
+    read_lines,
+    stanza_key,
+    stanza_secrets,
+)
+from .f5mku import F5MkuCipher, _as_cipher
+
+__all__ = [
+    "IncrementalStats",
+    "StanzaChange",
+    "process_incremental",
+]
+
+_STATE_VERSION = 1
+
+StanzaChange = namedtuple("StanzaChange", "path status header secrets")
+
+
+@dataclass
+class IncrementalStats:
+    """Counters of an incremental run."""
+
+    stanzas: int = 0
+    reused: int = 0
+    processed: int = 0
+    decrypted: int = 0
+
+
+def process_incremental(
+    paths: Iterable[Union[str, os.PathLike]],
+    f5mku: Union[str, F5MkuCipher],
+    state_path: Union[str, os.PathLike],
+    full: bool = False,
+) -> Tuple[List[StanzaChange], IncrementalStats]:
+    """Detects changed tmsh objects of bigip*.conf files since the last run.
+    Only stanzas whose raw content changed since the previous run are scanned and
+    their secrets decrypted, results of unchanged stanzas are reused from the state
+    file `state_path`. Stanzas whose secrets were only re-encrypted with another salt
+    are not reported as changed. A full run processes all stanzas and still reports
+    changes against the previous state, unless it was created with another key or
+    state version.
+    Examples:
+        >>> changes, stats = process_incremental(
+        ...     ["./configs"], "BHDLd0bbao1VlwpTk1sioQ==", "state.json"
+        ... )
+        >>> for change in changes:
+        ...     print(change.status, change.header, change.secrets)
+        changed ltm profile client-ssl /Common/foo ['cert-key-chain foo passphrase']
+    Args:
+        paths (Iterable[str]): bigip*.conf files or directories containing them.
+        f5mku (str): f5mku base64 key or F5MkuCipher to decrypt secrets.
+        state_path (str): path of the JSON state file, written atomically.
+        full (bool): Process all stanzas instead of reusing unchanged ones, and discard
+            an incompatible previous state instead of raising ValueError.
+    Returns:
+        List of StanzaChange with status `added`, `removed` or `changed` and the
+        attributes of added, removed or changed secrets, and IncrementalStats.
+    """
+    cipher = _as_cipher(f5mku)
+    state = _read_state(state_path, cipher, discard_incompatible=full)
+    files = state.get("files", {})
+    changes = []
+    stats = IncrementalStats()
+    for path, _ in find_config_files(paths):
+        path = os.path.abspath(path)
+        files[path], file_changes = _process_file(
+            path, files.get(path, {}), cipher, stats, full
+        )
+        changes.extend(file_changes)
+
+    _write_state(
+        state_path,
+        {"version": _STATE_VERSION, "key": cipher.fingerprint, "files": files},
+    )
+    return changes, stats
+
+
+def _process_file(
+    path: str,
+    previous: Dict[str, Any],
+    cipher: F5MkuCipher,
+    stats: IncrementalStats,
+    full: bool,
+) -> Tuple[Dict[str, Any], List[StanzaChange]]:
+    """Processes the stanzas of file `path` which changed since the `previous` state
+    entries of the file, returns the current state entries and the changes."""
+    fingerprint_key = _fingerprint_key(cipher)
+    current = {}
+    changes = []
+    occurrences: Dict[bytes, int] = {}
+    for stanza in iter_stanzas(read_lines(path)):
+        stats.stanzas += 1
+        key = _entry_key(*stanza_key(stanza, occurrences))
+        raw_hash = _stanza_hash(stanza.lines)
+        entry = previous.pop(key, None)
+        if not full and entry is not None and entry["raw"] == raw_hash:
+            stats.reused += 1
+            current[key] = entry
+            continue
+        stats.processed += 1
+        current[key] = _process_stanza(stanza, raw_hash, cipher, fingerprint_key, stats)
+        change = _compare(path, key, entry, current[key])
+        if change is not None:
+            changes.append(change)
+    for key, entry in previous.items():
+        changes.append(_compare(path, key, entry, None))
+    return current, changes
+
+
+def _entry_key(header: bytes, occurrence: int) -> str:
+    """Returns the state key of the `occurrence`th stanza with `header`."""
+    return f"{header.decode('utf-8', 'replace')}\0{occurrence}"
+
+
+def _process_stanza(
+    stanza: Stanza,
+    raw_hash: str,
+    cipher: F5MkuCipher,
+    fingerprint_key: bytes,
+    stats: IncrementalStats,
+) -> Dict[str, Any]:
+    """Scans and decrypts the secrets of a stanza, returns its state entry."""
+    secrets = list(stanza_secrets(stanza))
+    tokens = [f"$M${secret.salt}${secret.ciphertext}" for secret in secrets]
+    distinct_tokens = list(dict.fromkeys(tokens))
+    stats.decrypted += len(distinct_tokens)
+    fingerprints = {}
+    for token, result in zip(distinct_tokens, cipher.decrypt_many(distinct_tokens)):
+        if result.error is None:
+            fingerprints[token] = hmac.new(
+                fingerprint_key, result.value.encode("utf-8"), hashlib.sha256
+            ).hexdigest()
+        else:
+            # secrets which can't be decrypted are compared by ciphertext
+            fingerprints[token] = token
+    return {
+        "raw": raw_hash,
+        "normalized": _stanza_hash(
+            _normalize_stanza(stanza, secrets, tokens, fingerprints)
+        ),
+        "secrets": [
+            [secret.attribute, fingerprints[token]]
+            for secret, token in zip(secrets, tokens)
+        ],
+    }
+
+
+def _normalize_stanza(
+    stanza: Stanza,
+    secrets: List[Any],
+    tokens: List[str],
+    fingerprints: Dict[str, str],
+) -> List[bytes]:
+    """Returns the lines of `stanza` with the `tokens` of its `secrets` replaced by
+    their fingerprints."""
+    if not secrets:
+        return stanza.lines
+    buffer = b"".join(stanza.lines)
+    parts = []
+    position = 0
+    for secret, token in zip(secrets, tokens):
+        parts.append(buffer[position : secret.offset - stanza.offset])
+        parts.append(fingerprints[token].encode("ascii"))
+        position = secret.offset - stanza.offset + len(token)
+    parts.append(buffer[position:])
+    return [b"".join(parts)]
+
+
+def _compare(
+    path: str,
+    key: str,
+    previous: Optional[Dict[str, Any]],
+    current: Optional[Dict[str, Any]],
+) -> Optional[StanzaChange]:
+    """Returns the StanzaChange between two state entries of a stanza, None if unchanged."""
+    header = key.rpartition("\0")[0]
+    if previous is None:
+        return StanzaChange(path, "added", header, [a for a, _ in current["secrets"]])
+    if current is None:
+        return StanzaChange(
+            path, "removed", header, [a for a, _ in previous["secrets"]]
+        )
+    if previous["normalized"] == current["normalized"]:
+        return None
+    previous_secrets = _secrets_by_attribute(previous)
+    current_secrets = _secrets_by_attribute(current)
+    changed = [
+        attribute
+        for attribute in dict.fromkeys([*current_secrets, *previous_secrets])
+        if current_secrets.get(attribute) != previous_secrets.get(attribute)
+    ]
+    return StanzaChange(path, "changed", header, changed)
+
+
+def _secrets_by_attribute(entry: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Returns the secret fingerprints of a state entry by attribute."""
+    secrets = {}
+    for attribute, fingerprint in entry["secrets"]:
+        secrets.setdefault(attribute, []).append(fingerprint)
+    return secrets
+
+
+def _stanza_hash(lines: List[bytes]) -> str:
+    """Returns the hex encoded SHA-256 of stanza `lines`."""
+    digest = hashlib.sha256()
+    for line in lines:
+        digest.update(line)
+    return digest.hexdigest()
+
+
+def _fingerprint_key(cipher: F5MkuCipher) -> bytes:
+    """Derives the key of secret fingerprints from the f5mku key, fingerprints are
+    stable across runs but can't be brute forced without the f5mku key."""
+    # pylint: disable-next=protected-access
+    return hmac.new(cipher._key, b"f5mkupy incremental state", hashlib.sha256).digest()
+
+
+def _read_state(
+    path: Union[str, os.PathLike],
+    cipher: F5MkuCipher,
+    discard_incompatible: bool = False,
+) -> Dict[str, Any]:
+    """Reads the state file `path`, an empty state if it doesn't exist.
+    A state of another version or key raises ValueError, or is discarded as well if
+    `discard_incompatible` is set."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as state_file:
+        state = json.load(state_file)
+    if state.get("version") != _STATE_VERSION:
+        error = f"Unsupported state version in {path}, use a full rebuild."
+    elif state.get("key") != cipher.fingerprint:
+        error = f"State {path} was created with another f5mku key, use a full rebuild."
+    else:
+        return state
+    if discard_incompatible:
+        return {}
+    raise ValueError(error)
+
+
+def _write_state(path: Union[str, os.PathLike], state: Dict[str, Any]) -> None:
+    """Writes the state file `path` atomically."""
+    with _atomic_writer(path) as state_file:
+        state_file.write(json.dumps(state).encode("utf-8"))
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""Persistent inventory of the secrets in bigip*.conf files and UCS archives, stored in SQLite."""
+
+import hashlib
+import os
+import sqlite3
+from collections import namedtuple
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple, Union
+
+from .archive import is_archive, iter_config_members
+from .conf import find_config_files, iter_stanzas, read_lines, stanza_secrets
+
+__all__ = [
+    "IndexStats",
+    "SecretIndex",
+    "SecretRecord",
+]
+
+_SCHEMA_VERSION = 1
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS secrets (
+    file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+    line INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    object TEXT NOT NULL,
+    attribute TEXT NOT NULL,
+    salt TEXT NOT NULL,
+    ciphertext TEXT NOT NULL,
+    member TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS secrets_file_id ON secrets (file_id);
+CREATE INDEX IF NOT EXISTS secrets_object ON secrets (object);
+CREATE INDEX IF NOT EXISTS secrets_ciphertext ON secrets (ciphertext);
+"""
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class SecretRecord(
+    namedtuple(
+        "SecretRecord",
+        "path line offset object attribute salt ciphertext member",
+        defaults=("",),
+    )
+):
+    """Location of a secret in an indexed bigip*.conf file.
+    `object` is the tmsh object, e.g. "ltm profile client-ssl /Common/foo", `attribute`
+    the attribute path within the object, e.g. "cert-key-chain foo passphrase".
+    For UCS archives `path` is the archive and `member` the bigip*.conf file within
+    it, e.g. "config/bigip.conf", `line` and `offset` are relative to the member."""
+
+    __slots__ = ()
+
+    @property
+    def token(self) -> str:
+        """The F5 formatted ciphertext."""
+        return f"$M${self.salt}${self.ciphertext}"
+
+
+@dataclass
+class IndexStats:
+    """Counters of an index update."""
+
+    indexed: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    secrets: int = 0
+
+
+class SecretIndex:
+    """Inventory of the secrets in bigip*.conf files stored in SQLite file `path`.
+    Files are only scanned again if their size and mtime changed and their content
+    hash differs from the indexed one.
+    Examples:
+        >>> with SecretIndex("inventory.sqlite") as index:
+        ...     index.update(["./configs"])
+        ...     record = index.secrets(object="ltm profile client-ssl *")[0]
+        IndexStats(indexed=1, unchanged=0, removed=0, secrets=5)
+        >>> record.line, record.object, record.attribute
+        (42, 'ltm profile client-ssl /Common/foo', 'cert-key-chain foo passphrase')
+    Args:
+        path (str): path of the SQLite file, created if it doesn't exist.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = os.fspath(path)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, _SCHEMA_VERSION):
+            self._connection.close()
+            raise ValueError(
+                f"Unsupported index schema version {version} in {self.path}."
+            )
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+            self._connection.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def __enter__(self) -> "SecretIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.path!r}>"
+
+    def close(self) -> None:
+        """Closes the SQLite connection."""
+        self._connection.close()
+
+    def update(self, paths: Iterable[Union[str, os.PathLike]]) -> IndexStats:
+        """Indexes new and changed bigip*.conf files of `paths`, see `conf.find_config_files`.
+        UCS and tar archives in `paths` are indexed with their bigip*.conf members.
+        Files are indexed by absolute path, indexed files which don't exist anymore
+        are removed from the index."""
+        stats = IndexStats()
+        for path, _ in find_config_files(paths):
+            if self._update_file(os.path.abspath(path), is_archive(path)):
+                stats.indexed += 1
+            else:
+                stats.unchanged += 1
+        for file_id, path in self._connection.execute(
+            "SELECT id, path FROM files"
+        ).fetchall():
+            if not os.path.exists(path):
+                with self._connection:
+                    self._connection.execute(
+                        "DELETE FROM files WHERE id = ?", (file_id,)
+                    )
+                stats.removed += 1
+        stats.secrets = self._connection.execute(
+            "SELECT COUNT(*) FROM secrets"
+        ).fetchone()[0]
+        return stats
+
+    def secrets(
+        self,
+        path: Optional[str] = None,
+        object: Optional[str] = None,  # pylint: disable=redefined-builtin
+        attribute: Optional[str] = None,
+        token: Optional[str] = None,
+        member: Optional[str] = None,
+    ) -> List[SecretRecord]:
+        """Returns the indexed secrets, optionally filtered.
+        `path`, `object`, `attribute` and `member` are glob patterns (SQLite GLOB, case
+        sensitive), `token` is a F5 formatted ciphertext to look up."""
+        conditions = []
+        parameters = []
+        for column, pattern in (
+            ("files.path", path),
+            ("secrets.object", object),
+            ("secrets.attribute", attribute),
+            ("secrets.member", member),
+        ):
+            if pattern is not None:
+                conditions.append(f"{column} GLOB ?")
+                parameters.append(pattern)
+        if token is not None:
+            try:
+                _, _, salt, ciphertext = token.split("$")
+            except ValueError as exc:
+                raise ValueError(f"Unrecognized ciphertext: {token}") from exc
+            conditions.append("secrets.salt = ? AND secrets.ciphertext = ?")
+            parameters.extend([salt, ciphertext])
+        query = (
+            "SELECT files.path, line, offset, object, attribute, salt, ciphertext, member"
+            " FROM secrets JOIN files ON files.id = secrets.file_id"
+        )
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY files.path, member, offset"
+        return [
+            SecretRecord(*row) for row in self._connection.execute(query, parameters)
+        ]
+
+    def files(self) -> List[Tuple[str, int, int, str]]:
+        """Returns (path, size, mtime_ns, sha256) of all indexed files."""
+        return self._connection.execute(
+            "SELECT path, size, mtime_ns, sha256 FROM files ORDER BY path"
+        ).fetchall()
+
+    def _update_file(self, path: str, archive: bool = False) -> bool:
+        """Indexes file `path` if it changed, returns whether it was indexed."""
+        stat_result = os.stat(path)
+        row = self._connection.execute(
+            "SELECT id, size, mtime_ns, sha256 FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row is not None and row[1:3] == (
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+        ):
+            return False
+
+        sha256 = _file_sha256(path)
+        with self._connection:
+            if row is not None and row[3] == sha256:
+                self._connection.execute(
+                    "UPDATE files SET size = ?, mtime_ns = ? WHERE id = ?",
+                    (stat_result.st_size, stat_result.st_mtime_ns, row[0]),
+                )
+                return False
+            if row is not None:
+                self._connection.execute("DELETE FROM files WHERE id = ?", (row[0],))
+            file_id = self._connection.execute(
+                "INSERT INTO files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (path, stat_result.st_size, stat_result.st_mtime_ns, sha256),
+            ).lastrowid
+            members = iter_config_members(path) if archive else [("", read_lines(path))]
+            self._connection.executemany(
+                """
+                INSERT INTO secrets
+                    (file_id, line, offset, object, attribute, salt, ciphertext, member)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    (file_id, *location, member)
+                    for member, lines in members
+                    for stanza in iter_stanzas(lines)
+                    for location in stanza_secrets(stanza)
+                ),
+            )
+        return True
+
+
+def _file_sha256(path: str) -> str:
+    """Returns the hex encoded SHA-256 of file `path`."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as config_file:
+        for block in iter(lambda: config_file.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Optional instrumentation of f5mkupy: operation counters and latency histograms.
+
+Instrumented code checks the module global `active` and only takes timings if
+metrics are enabled, disabled metrics cost a global lookup and a None check.
+Stages are `key` (decoding of the f5mku key), `parse` (splitting of F5 formatted
+ciphertexts), `decode` and `encode` (base64), `pad` (salting and padding),
+`crypt` (AES), `unpad` (padding and salt checks), `scan` (searching configs for
+ciphertexts) and `write` (file I/O).
+Metrics are collected per process, worker processes report to their own instance.
+"""
+
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+__all__ = [
+    "Histogram",
+    "Metrics",
+    "enable_metrics",
+    "disable_metrics",
+    "get_metrics",
+]
+
+# upper bounds of the latency buckets in seconds, the last bucket is unbounded
+_BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+
+# Metrics instance the instrumented code reports to, None if disabled,
+# rebound by enable_metrics and disable_metrics, hence not a constant
+active: Optional["Metrics"] = None  # pylint: disable=invalid-name
+
+
+@dataclass
+class Histogram:
+    """Latency histogram of a stage.
+    `count` is the number of observations, `items` the number of items processed
+    by them (e.g. ciphertexts of a batch), `total` and `max` are in seconds and
+    `buckets` counts the observations per bucket of `Histogram.bounds`."""
+
+    bounds = _BUCKETS
+
+    count: int = 0
+    items: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(_BUCKETS) + 1))
+
+    def observe(self, seconds: float, items: int = 1) -> None:
+        """Records an observation of `seconds` processing `items`."""
+        self.count += 1
+        self.items += items
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect_left(self.bounds, seconds)] += 1
+
+
+class Metrics:
+    """Counters and latency histograms per stage with callback hooks.
+    Hooks are called with (kind, name, value) for every event, kind is "latency"
+    (value in seconds) or "counter" (value is the increment), e.g. to feed a
+    Prometheus exporter.
+    Examples:
+        >>> metrics = enable_metrics()
+        >>> decrypt("$M$iP$rr0su9oHn9J9p1t3nRzydA==", "BHDLd0bbao1VlwpTk1sioQ==")
+        'KEY45678'
+        >>> metrics.latencies["crypt"].count
+        1
+        >>> metrics.add_hook(lambda kind, name, value: print(kind, name, value))
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        self.latencies: Dict[str, Histogram] = {}
+        self.hooks: List[Callable[[str, str, float], None]] = []
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} stages={sorted(self.latencies)}>"
+
+    def add_hook(self, callback: Callable[[str, str, float], None]) -> None:
+        """Registers `callback` to be called with (kind, name, value) for every event."""
+        self.hooks.append(callback)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Increments counter `name` by `value`."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for hook in self.hooks:
+            hook("counter", name, value)
+
+    def observe(self, stage: str, seconds: float, items: int = 1) -> None:
+        """Records the latency of `stage` in seconds for processing `items`."""
+        with self._lock:
+            histogram = self.latencies.get(stage)
+            if histogram is None:
+                histogram = self.latencies[stage] = Histogram()
+            histogram.observe(seconds, items)
+        for hook in self.hooks:
+            hook("latency", stage, seconds)
+
+    def lap(self, stage: str, start: float, items: int = 1) -> float:
+        """Records the time since `start` (`time.perf_counter`) for `stage` and
+        returns the current time, so consecutive stages can be chained."""
+        now = perf_counter()
+        self.observe(stage, now - start, items)
+        return now
+
+    def hit_rate(self, name: str) -> Optional[float]:
+        """Returns the hit rate of counters `<name>_hits` and `<name>_misses`."""
+        hits = self.counters.get(f"{name}_hits", 0)
+        total = hits + self.counters.get(f"{name}_misses", 0)
+        return hits / total if total else None
+
+    def reset(self) -> None:
+        """Removes all counters and histograms, hooks are kept."""
+        with self._lock:
+            self.counters.clear()
+            self.latencies.clear()
+
+    def summary(self) -> List[str]:
+        """Returns a human readable summary, one line per stage and counter."""
+        lines = []
+        for stage, histogram in sorted(self.latencies.items()):
+            mean = histogram.total / histogram.count if histogram.count else 0.0
+            lines.append(
+                f"{stage}: calls: {histogram.count}, items: {histogram.items}, "
+                f"total: {histogram.total * 1e3:.3f}ms, mean: {mean * 1e6:.1f}us, "
+                f"max: {histogram.max * 1e6:.1f}us"
+            )
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name}: {value}")
+        for name in sorted(
+            {name[: -len("_hits")] for name in self.counters if name.endswith("_hits")}
+        ):
+            lines.append(f"{name} hit rate: {self.hit_rate(name):.1%}")
+        return lines
+
+    def snapshot(self) -> Tuple[Dict[str, int], Dict[str, Histogram]]:
+        """Returns copies of the counters and histograms."""
+        with self._lock:
+            return dict(self.counters), {
+                stage: Histogram(h.count, h.items, h.total, h.max, list(h.buckets))
+                for stage, h in self.latencies.items()
+            }
+
+
+def enable_metrics(metrics: Optional[Metrics] = None) -> Metrics:
+    """Enables instrumentation reporting to `metrics` or a new Metrics instance.
+    Returns:
+        The active Metrics instance.
+    """
+    global active  # pylint: disable=global-statement
+    active = Metrics() if metrics is None else metrics
+    return active
+
+
+def disable_metrics() -> None:
+    """Disables instrumentation."""
+    global active  # pylint: disable=global-statement
+    active = None
+
+
+def get_metrics() -> Optional[Metrics]:
+    """Returns the active Metrics instance, None if disabled."""
+    return active
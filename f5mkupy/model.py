@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""Lazy object model of bigip*.conf files.
+
+Opening a config only indexes the headers of its top-level stanzas with their byte
+offsets. A stanza is read and parsed into a tree when it is accessed, secrets are
+decrypted when their value is read.
+"""
+
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .conf import iter_stanzas, read_lines
+from .f5mku import F5MkuCipher, _as_cipher
+from .scan import scan
+
+__all__ = [
+    "LazySecret",
+    "TmshBlock",
+    "TmshConfig",
+    "TmshObject",
+]
+
+# quoted strings, braces, line breaks and words, backslash escapes are part of words
+_TOKEN_PATTERN = re.compile(r'"(?:\\.|[^"\\])*"|[{}\n]|(?:\\.|[^\s{}"\\])+')
+
+TmshValue = Union[None, str, "LazySecret", list, "TmshBlock"]
+
+
+class LazySecret:
+    """F5 formatted ciphertext of a config attribute, decrypted on first access of
+    `value`. The plaintext is cached, it is never part of str() or repr()."""
+
+    __slots__ = ("token", "_cipher", "_value")
+
+    def __init__(self, token: str, cipher: Optional[F5MkuCipher]):
+        self.token = token
+        self._cipher = cipher
+        self._value: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.token}>"
+
+    def __str__(self) -> str:
+        return self.token
+
+    @property
+    def decrypted(self) -> bool:
+        """Whether the plaintext was decrypted already."""
+        return self._value is not None
+
+    @property
+    def value(self) -> str:
+        """The plaintext, decrypted on first access."""
+        if self._value is None:
+            if self._cipher is None:
+                raise ValueError(f"No f5mku key to decrypt {self.token}.")
+            self._value = self._cipher.decrypt(self.token)
+        return self._value
+
+
+class TmshBlock:
+    """Attributes of a tmsh object or nested block in config order.
+    Values are None for flags, str, LazySecret, list for inline lists like
+    `vlans { /Common/internal }` or TmshBlock for nested blocks. Keys of nested
+    blocks are all words in front of the opening brace, e.g. "when HTTP_REQUEST".
+    Examples:
+        >>> block["cert-key-chain"]["default"]["passphrase"].value
+        'secret'
+    """
+
+    __slots__ = ("entries",)
+
+    def __init__(self, entries: Optional[List[Tuple[str, TmshValue]]] = None):
+        self.entries = [] if entries is None else entries
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.entries!r})"
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key, _ in self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        return any(entry_key == key for entry_key, _ in self.entries)
+
+    def __getitem__(self, key: str) -> TmshValue:
+        for entry_key, value in self.entries:
+            if entry_key == key:
+                return value
+        raise KeyError(key)
+
+    def get(self, key: str, default: TmshValue = None) -> TmshValue:
+        """Returns the value of the first attribute `key`, `default` if it doesn't exist."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self) -> List[Tuple[str, TmshValue]]:
+        """Returns all (key, value) pairs, keys can repeat."""
+        return list(self.entries)
+
+    def secrets(self) -> Dict[str, LazySecret]:
+        """Returns the secrets of this block and nested blocks by attribute path,
+        e.g. "cert-key-chain default passphrase"."""
+        secrets = {}
+        for key, value in self.entries:
+            if isinstance(value, LazySecret):
+                secrets[key] = value
+            elif isinstance(value, TmshBlock):
+                for attribute, secret in value.secrets().items():
+                    secrets[f"{key} {attribute}"] = secret
+        return secrets
+
+
+# the location of the stanza plus the parsed body, kept lean by __slots__
+class TmshObject:  # pylint: disable=too-many-instance-attributes
+    """Top-level tmsh object of a config, e.g. "ltm profile client-ssl /Common/foo".
+    `type` is the header without the last word, e.g. "ltm profile client-ssl", `name`
+    the last word, e.g. "/Common/foo". The stanza is read and parsed on first access of
+    `body`, attributes can be accessed on the object directly."""
+
+    __slots__ = ("header", "type", "name", "line", "offset", "size", "_config", "_body")
+
+    def __init__(
+        self,
+        config: "TmshConfig",
+        header: str,
+        line: int,
+        offset: int,
+        size: int,
+    ):
+        self.header = header
+        self.type, _, self.name = header.rpartition(" ")
+        self.line = line
+        self.offset = offset
+        self.size = size
+        self._config = config
+        self._body: Optional[TmshBlock] = None
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.header}>"
+
+    def __getitem__(self, key: str) -> TmshValue:
+        return self.body[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.body
+
+    def get(self, key: str, default: TmshValue = None) -> TmshValue:
+        """Returns the value of attribute `key`, see `TmshBlock.get`."""
+        return self.body.get(key, default)
+
+    @property
+    def parsed(self) -> bool:
+        """Whether the stanza was parsed already."""
+        return self._body is not None
+
+    @property
+    def raw(self) -> bytes:
+        """The stanza as found in the config file."""
+        # pylint: disable-next=protected-access
+        return self._config._read(self.offset, self.size)
+
+    @property
+    def body(self) -> TmshBlock:
+        """Attributes of the object, parsed on first access."""
+        if self._body is None:
+            # pylint: disable-next=protected-access
+            self._body = _parse_stanza(self.raw, self._config._cipher)
+        return self._body
+
+    def secrets(self) -> Dict[str, LazySecret]:
+        """Returns the secrets of the object by attribute path, see `TmshBlock.secrets`."""
+        return self.body.secrets()
+
+
+class TmshConfig:
+    """Lazy object model of the bigip*.conf file `path`.
+    Only the stanza headers are indexed when the config is opened, stanzas are parsed
+    when accessed and secrets decrypted with `f5mku` when read. Objects are looked up
+    by header, by name (full path) or by type.
+    Examples:
+        >>> config = TmshConfig("bigip.conf", "BHDLd0bbao1VlwpTk1sioQ==")
+        >>> profile = config.find("/Common/clientssl_foo")[0]
+        >>> profile["cert-key-chain"]["default"]["passphrase"].value
+        'secret'
+        >>> config["sys file ssl-key rsa.key"].secrets()
+        {'passphrase': <LazySecret $M$ot$tjQRL4+Md7egq3uxcYIN8g==>}
+    Args:
+        path (str): path of the bigip*.conf file.
+        f5mku (str): Optional f5mku base64 key or F5MkuCipher to decrypt secrets.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, os.PathLike],
+        f5mku: Optional[Union[str, F5MkuCipher]] = None,
+    ):
+        self.path = os.fspath(path)
+        self._cipher = _as_cipher(f5mku) if f5mku is not None else None
+        self._objects: List[TmshObject] = []
+        self._by_header: Dict[str, TmshObject] = {}
+        self._by_name: Dict[str, List[TmshObject]] = {}
+        self._by_type: Dict[str, List[TmshObject]] = {}
+        for stanza in iter_stanzas(read_lines(self.path)):
+            if not stanza.header or stanza.header.startswith(b"#"):
+                continue
+            tmsh_object = TmshObject(
+                self,
+                stanza.header.decode("utf-8", "replace"),
+                stanza.line,
+                stanza.offset,
+                sum(map(len, stanza.lines)),
+            )
+            self._objects.append(tmsh_object)
+            self._by_header.setdefault(tmsh_object.header, tmsh_object)
+            self._by_name.setdefault(tmsh_object.name, []).append(tmsh_object)
+            self._by_type.setdefault(tmsh_object.type, []).append(tmsh_object)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.path!r}>"
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def __iter__(self) -> Iterator[TmshObject]:
+        return iter(self._objects)
+
+    def __contains__(self, header: str) -> bool:
+        return header in self._by_header
+
+    def __getitem__(self, header: str) -> TmshObject:
+        return self._by_header[header]
+
+    def find(self, name: str, type: Optional[str] = None) -> List[TmshObject]:
+        # pylint: disable=redefined-builtin
+        """Returns the objects named `name`, e.g. "/Common/foo", optionally of `type` only."""
+        return [
+            tmsh_object
+            for tmsh_object in self._by_name.get(name, [])
+            if type is None or tmsh_object.type == type
+        ]
+
+    def objects(self, type: str) -> List[TmshObject]:
+        # pylint: disable=redefined-builtin
+        """Returns the objects of `type`, e.g. "ltm profile client-ssl"."""
+        return list(self._by_type.get(type, []))
+
+    def types(self) -> List[str]:
+        """Returns the object types in config order."""
+        return list(self._by_type)
+
+    def _read(self, offset: int, size: int) -> bytes:
+        """Reads `size` bytes at `offset` of the config file."""
+        with open(self.path, "rb") as config_file:
+            config_file.seek(offset)
+            return config_file.read(size)
+
+
+def _parse_stanza(raw: bytes, cipher: Optional[F5MkuCipher]) -> TmshBlock:
+    """Parses the attributes of a stanza into a TmshBlock."""
+    tokens = _TOKEN_PATTERN.findall(raw.decode("utf-8", "replace"))
+    try:
+        position = tokens.index("{") + 1
+    except ValueError:
+        return TmshBlock()
+    block, _ = _parse_block(tokens, position, cipher)
+    return block
+
+
+def _parse_block(
+    tokens: List[str], position: int, cipher: Optional[F5MkuCipher]
+) -> Tuple[TmshBlock, int]:
+    """Parses statements up to the closing brace, returns the block and the position
+    after the closing brace. A brace followed by a line break opens a nested block,
+    other braces open inline lists."""
+    block = TmshBlock()
+    words: List[Union[str, list]] = []
+    while position < len(tokens):
+        token = tokens[position]
+        position += 1
+        if token == "{" and position < len(tokens) and tokens[position] == "\n":
+            nested, position = _parse_block(tokens, position + 1, cipher)
+            block.entries.append((" ".join(map(str, words)), nested))
+            words = []
+        elif token == "{":
+            inline, position = _parse_list(tokens, position)
+            words.append(inline)
+        elif token in ("\n", "}"):
+            if words:
+                block.entries.append(_statement(words, cipher))
+                words = []
+            if token == "}":
+                break
+        else:
+            words.append(token)
+    return block, position
+
+
+def _parse_list(tokens: List[str], position: int) -> Tuple[list, int]:
+    """Parses an inline list up to the closing brace, line breaks are ignored."""
+    items: list = []
+    while position < len(tokens):
+        token = tokens[position]
+        position += 1
+        if token == "}":
+            break
+        if token == "{":
+            nested, position = _parse_list(tokens, position)
+            items.append(nested)
+        elif token != "\n":
+            items.append(token)
+    return items, position
+
+
+def _statement(
+    words: List[Union[str, list]], cipher: Optional[F5MkuCipher]
+) -> Tuple[str, TmshValue]:
+    """Returns (key, value) of the words of a statement."""
+    key, *values = words
+    if not values:
+        return str(key), None
+    if len(values) > 1:
+        if all(isinstance(value, str) for value in values):
+            return str(key), " ".join(values)
+        return str(key), values
+    value = values[0]
+    if isinstance(value, str) and _is_secret(value):
+        return str(key), LazySecret(value, cipher)
+    return str(key), value
+
+
+def _is_secret(word: str) -> bool:
+    """Checks if `word` is a F5 formatted ciphertext."""
+    encoded = word.encode("utf-8")
+    return any(span.start == 0 and span.end == len(encoded) for span in scan(encoded))
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Parallel execution of large batches of secrets on a thread or process pool.
+
+Batches are split into chunks which are processed by `F5MkuCipher` batch methods
+on the workers. Threads share the cipher of the pool, every thread creates its
+AES context once. Process workers receive the key once when they start instead
+of with every chunk. The chunk size adapts to the measured cost per item, so that
+every chunk runs for about `target_seconds`: long enough to amortize scheduling
+and IPC, short enough to keep all workers busy until the end of a batch.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .f5mku import F5MkuCipher, F5Result, _as_cipher
+
+__all__ = [
+    "F5MkuPool",
+]
+
+_INITIAL_CHUNK_SIZE = 256
+_MIN_CHUNK_SIZE = 16
+_MAX_CHUNK_SIZE = 65536
+_TARGET_SECONDS = 0.02
+# weight of the latest measurement in the moving average of the cost per item
+_SMOOTHING = 0.5
+
+# cipher of a process worker, set once by _init_worker when the worker starts
+_worker_cipher: Optional[F5MkuCipher] = None  # pylint: disable=invalid-name
+
+
+# the settings of the pool plus the state of the adaptive chunk size
+class F5MkuPool:  # pylint: disable=too-many-instance-attributes
+    """Runs `decrypt_many`, `encrypt_many` and `compare_many` of large batches in
+    chunks on a thread or process pool, results are returned in order.
+    Threads are enough for large chunks as `cryptography` releases the GIL while
+    encrypting, processes also parallelize parsing, base64 and padding.
+    Examples:
+        >>> with F5MkuPool("BHDLd0bbao1VlwpTk1sioQ==", workers=4) as pool:
+        ...     results = pool.decrypt_many(ciphertexts)
+        >>> pool.chunk_size
+        2048
+    Args:
+        f5mku (str): f5mku base64 key or F5MkuCipher.
+        workers (int): Number of workers, defaults to the number of CPUs. Chunks
+            are processed in the current thread if set to 1.
+        processes (bool): Use a process pool instead of a thread pool.
+        chunk_size (int): Optional fixed number of items per chunk, adapts to the
+            measured cost per item if not provided.
+        target_seconds (float): Processing time per chunk the adaptive chunk size aims for.
+    """
+
+    def __init__(
+        self,
+        f5mku: Union[str, F5MkuCipher],
+        workers: Optional[int] = None,
+        processes: bool = False,
+        chunk_size: Optional[int] = None,
+        target_seconds: float = _TARGET_SECONDS,
+    ):
+        if workers is not None and workers < 1:
+            raise ValueError(f"workers must be a positive integer, got: {workers}")
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError(
+                f"chunk_size must be a positive integer, got: {chunk_size}"
+            )
+        self.cipher = _as_cipher(f5mku)
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.adaptive = chunk_size is None
+        self.chunk_size = _INITIAL_CHUNK_SIZE if chunk_size is None else chunk_size
+        self.target_seconds = target_seconds
+        self.item_seconds: Optional[float] = None
+        self._executor: Optional[Executor] = None
+
+    def __repr__(self) -> str:
+        kind = "processes" if self.processes else "threads"
+        return f"<{type(self).__name__} {kind}={self.workers} chunk_size={self.chunk_size}>"
+
+    def __enter__(self) -> "F5MkuPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shuts the workers down, a new pool is started on next use."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def decrypt_many(self, ciphertexts: Iterable[str]) -> List[F5Result]:
+        """Decrypts all `ciphertexts`, see `F5MkuCipher.decrypt_many`."""
+        return self._map("decrypt_many", list(ciphertexts))
+
+    def encrypt_many(
+        self,
+        plaintexts: Iterable[str],
+        salts: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[F5Result]:
+        """Encrypts all `plaintexts`, see `F5MkuCipher.encrypt_many`."""
+        plaintexts = list(plaintexts)
+        if salts is None:
+            return self._map("encrypt_many", plaintexts)
+        salts = list(salts)
+        if len(salts) != len(plaintexts):
+            raise ValueError(
+                f"Number of salts ({len(salts)}) does not match "
+                f"number of plaintexts ({len(plaintexts)})."
+            )
+        return self._map("encrypt_many", plaintexts, salts)
+
+    def compare_many(self, pairs: Iterable[Tuple[str, str]]) -> List[F5Result]:
+        """Checks all (plaintext, ciphertext) `pairs`, see `F5MkuCipher.compare_many`."""
+        return self._map("compare_many", list(pairs))
+
+    def _map(self, method: str, *sequences: List[Any]) -> List[F5Result]:
+        """Calls `method` of the cipher with chunks of `sequences` on the workers,
+        with at most two pending chunks per worker."""
+        total = len(sequences[0])
+        if self.workers == 1 or total <= _MIN_CHUNK_SIZE:
+            return getattr(self.cipher, method)(*sequences)
+
+        executor = self._get_executor()
+        results: List[F5Result] = []
+        pending: deque = deque()
+        start = 0
+        while start < total or pending:
+            while start < total and len(pending) < 2 * self.workers:
+                end = start + self._next_chunk_size(total - start)
+                chunk = [sequence[start:end] for sequence in sequences]
+                if self.processes:
+                    future = executor.submit(_run_worker_chunk, method, *chunk)
+                else:
+                    future = executor.submit(
+                        _run_chunk, getattr(self.cipher, method), *chunk
+                    )
+                pending.append((future, end - start))
+                start = end
+            future, items = pending.popleft()
+            chunk_results, seconds = future.result()
+            self._measure(items, seconds)
+            results.extend(chunk_results)
+        return results
+
+    def _next_chunk_size(self, remaining: int) -> int:
+        """Returns the size of the next chunk, chunks shrink towards the end of a
+        batch so that every worker gets a share of the remaining items."""
+        per_worker = -(-remaining // self.workers)
+        return min(remaining, max(_MIN_CHUNK_SIZE, min(self.chunk_size, per_worker)))
+
+    def _measure(self, items: int, seconds: float) -> None:
+        """Updates the cost per item and the adaptive chunk size with a chunk of
+        `items` processed in `seconds`."""
+        if not self.adaptive or items < _MIN_CHUNK_SIZE:
+            return
+        item_seconds = seconds / items
+        if self.item_seconds is None:
+            self.item_seconds = item_seconds
+        else:
+            self.item_seconds += _SMOOTHING * (item_seconds - self.item_seconds)
+        if self.item_seconds > 0:
+            self.chunk_size = max(
+                _MIN_CHUNK_SIZE,
+                min(_MAX_CHUNK_SIZE, int(self.target_seconds / self.item_seconds)),
+            )
+
+    def _get_executor(self) -> Executor:
+        """Returns the executor, started on first use."""
+        if self._executor is None:
+            if self.processes:
+                # pylint: disable-next=import-outside-toplevel
+                from concurrent.futures import (  # imports multiprocessing
+                    ProcessPoolExecutor,
+                )
+
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.cipher,),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="f5mkupy"
+                )
+        return self._executor
+
+
+def _run_chunk(function, *arguments) -> Tuple[List[F5Result], float]:
+    """Calls `function` with `arguments`, returns the results and the duration in seconds."""
+    start = perf_counter()
+    results = function(*arguments)
+    return results, perf_counter() - start
+
+
+def _init_worker(cipher: F5MkuCipher) -> None:
+    """Stores the cipher of a process worker, the key is transferred and decoded once."""
+    global _worker_cipher  # pylint: disable=global-statement
+    _worker_cipher = cipher
+
+
+def _run_worker_chunk(method: str, *arguments) -> Tuple[List[F5Result], float]:
+    """Calls `method` of the cipher of the process worker, see `_run_chunk`."""
+    return _run_chunk(getattr(_worker_cipher, method), *arguments)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Keyless redaction of secrets in bigip*.conf files.
+
+Every F5 formatted ciphertext is replaced by a placeholder carrying a fingerprint
+of the ciphertext, e.g. `[REDACTED:3f2a9c81d0be]`. Equal ciphertexts get equal
+placeholders, so redacted configs can still be compared. No f5mku key is needed,
+nothing is decrypted: configs are read in large blocks ending on a line break,
+searched for `$M$` tokens and written with the placeholders spliced in.
+Redaction fails closed, unlike `scan.scan` malformed or truncated ciphertexts are
+redacted as well.
+"""
+
+import hashlib
+import os
+import re
+import sys
+from time import perf_counter
+from typing import BinaryIO, Optional, Union
+
+from . import metrics as _metrics
+from .conf import _atomic_writer
+
+__all__ = [
+    "placeholder",
+    "redact_stream",
+    "redact_file",
+]
+
+_READ_SIZE = 1024 * 1024
+_FINGERPRINT_LENGTH = 12
+# everything from $M$ up to the next whitespace or quote, whether valid or not
+_TOKEN_PATTERN = re.compile(rb'\$M\$[^\s"]*')
+
+
+def placeholder(token: bytes) -> bytes:
+    """Returns the placeholder of the F5 formatted ciphertext `token`, the
+    fingerprint is the start of the hex encoded SHA-256 of the whole token.
+    Examples:
+        >>> placeholder(b"$M$iP$rr0su9oHn9J9p1t3nRzydA==")
+        b'[REDACTED:b36bd7179433]'
+    """
+    fingerprint = hashlib.sha256(token).hexdigest()[:_FINGERPRINT_LENGTH]
+    return b"[REDACTED:" + fingerprint.encode("ascii") + b"]"
+
+
+def redact_stream(source_file: BinaryIO, target_file: BinaryIO) -> int:
+    """Copies `source_file` to `target_file` with all secrets replaced by placeholders.
+    Every `$M$` token up to the next whitespace or quote is replaced, also if it is
+    not a valid ciphertext. Both are binary file objects, e.g. a member of a UCS
+    archive or STDOUT.
+    Returns:
+        Number of redacted secrets.
+    """
+    metrics = _metrics.active
+    redacted = 0
+    # reads of the current line, joined once a line break is read
+    pending = []
+    while True:
+        data = source_file.read(_READ_SIZE)
+        if not data:
+            block, pending = b"".join(pending), []
+        else:
+            # ciphertexts never contain line breaks, blocks end on the last one
+            split = data.rfind(b"\n") + 1
+            if not split:
+                pending.append(data)
+                continue
+            pending.append(data[:split])
+            block, pending = b"".join(pending), [data[split:]]
+        if not block:
+            break
+
+        start = perf_counter() if metrics is not None else 0.0
+        parts = []
+        position = 0
+        for re_match in _TOKEN_PATTERN.finditer(block):
+            parts.append(block[position : re_match.start()])
+            parts.append(placeholder(re_match.group()))
+            position = re_match.end()
+        if metrics is not None:
+            start = metrics.lap("scan", start)
+        if parts:
+            redacted += len(parts) // 2
+            parts.append(block[position:])
+            target_file.write(b"".join(parts))
+        else:
+            target_file.write(block)
+        if metrics is not None:
+            metrics.lap("write", start)
+    return redacted
+
+
+def redact_file(
+    source: Union[str, os.PathLike],
+    target: Optional[Union[str, os.PathLike]] = None,
+) -> int:
+    """Redacts all secrets of the bigip*.conf file `source`, see `redact_stream`.
+    Examples:
+        >>> redact_file("bigip.conf", "bigip_redacted.conf")
+        5
+    Args:
+        source (str): path of the source bigip*.conf file.
+        target (str): Optional path of the target file, written atomically.
+            Writes to STDOUT if not provided, `target` may be equal to `source`.
+    Returns:
+        Number of redacted secrets.
+    """
+    with open(source, "rb") as source_file:
+        if target is None:
+            redacted = redact_stream(source_file, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+            return redacted
+        with _atomic_writer(target) as target_file:
+            return redact_stream(source_file, target_file)
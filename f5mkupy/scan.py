@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Scanning of buffers and files for F5 formatted ciphertexts."""
+
+import mmap
+import os
+import re
+from collections import namedtuple
+from typing import Iterator, Optional, Union
+
+__all__ = [
+    "F5Span",
+    "scan",
+    "scan_file",
+]
+
+# $M$<salt>$<base64 ciphertext> as found in bigip*.conf files
+_CIPHERTEXT_PATTERN = re.compile(rb"\$M\$([a-zA-Z0-9]+)\$([a-zA-Z0-9+/]+={0,2})")
+
+_BLOCK_SIZE = 16
+
+
+class F5Span(namedtuple("F5Span", "start end salt ciphertext")):
+    """Location of a F5 formatted ciphertext within a buffer.
+    `start` and `end` are byte offsets of the whole token, `salt` and `ciphertext`
+    are the salt and base64 encoded ciphertext as bytes."""
+
+    __slots__ = ()
+
+    @property
+    def token(self) -> bytes:
+        """The F5 formatted ciphertext, equal to buffer[start:end]."""
+        return b"$M$" + self.salt + b"$" + self.ciphertext
+
+
+def scan(
+    buffer: Union[bytes, bytearray, memoryview, mmap.mmap],
+    start: int = 0,
+    end: Optional[int] = None,
+) -> Iterator[F5Span]:
+    """Yields a F5Span for every F5 formatted ciphertext found in `buffer`.
+    Ciphertexts are found anywhere in the buffer, not only at the end of a line.
+    Tokens with a base64 length that can't decode to complete AES blocks are skipped.
+    Only the matched salt and ciphertext are copied, `buffer` can be a memory mapped file.
+    Examples:
+        >>> list(scan(b"passphrase $M$ot$tjQRL4+Md7egq3uxcYIN8g== $M$xx$YWJj\\n"))
+        [F5Span(start=11, end=41, salt=b'ot', ciphertext=b'tjQRL4+Md7egq3uxcYIN8g==')]
+    Args:
+        buffer (bytes): bytes-like object or mmap to scan.
+        start (int): Optional offset to start scanning at.
+        end (int): Optional offset to stop scanning at.
+    Returns:
+        Iterator of F5Span.
+    """
+    if end is None:
+        end = len(buffer)
+    for re_match in _CIPHERTEXT_PATTERN.finditer(buffer, start, end):
+        ciphertext = re_match.group(2)
+        if _is_block_aligned(ciphertext):
+            yield F5Span(
+                re_match.start(), re_match.end(), re_match.group(1), ciphertext
+            )
+
+
+def scan_file(path: Union[str, os.PathLike]) -> Iterator[F5Span]:
+    """Yields a F5Span for every F5 formatted ciphertext in file `path`, see `scan`.
+    The file is memory mapped and not read into memory."""
+    with open(path, "rb") as config_file:
+        if os.fstat(config_file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(config_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from scan(buffer)
+
+
+def _is_block_aligned(ciphertext: bytes) -> bool:
+    """Checks that base64 encoded `ciphertext` decodes to a non-empty multiple of the
+    AES block size."""
+    length = len(ciphertext)
+    if length % 4:
+        return False
+    decoded_length = length // 4 * 3 - (length - len(ciphertext.rstrip(b"=")))
+    return decoded_length > 0 and decoded_length % _BLOCK_SIZE == 0
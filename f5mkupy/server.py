@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long
+"""Local encrypt/decrypt service holding f5mku keys in memory.
+
+Requests and responses are line-delimited JSON objects, one per line:
+
+    {"id": 1, "op": "decrypt", "ciphertext": "$M$iP$rr0su9oHn9J9p1t3nRzydA=="}
+    {"id": 1, "result": "KEY45678"}
+
+    {"id": 2, "op": "encrypt", "key": "old", "plaintext": "KEY45678", "salt": "iP"}
+    {"id": 2, "result": "$M$iP$rr0su9oHn9J9p1t3nRzydA=="}
+
+    {"id": 3, "op": "compare", "plaintext": "KEY45678", "ciphertext": "$M$iP$rr0su9oHn9J9p1t3nRzydA=="}
+    {"id": 3, "result": true}
+
+`key` selects one of the loaded keys by name, the first loaded key is used if omitted.
+Failed requests are answered with {"id": ..., "error": "..."}, an unexpected
+error of a batch only fails the requests of that operation and key. Requests can be
+pipelined, all complete requests received at once are processed as a batch and
+answered in order.
+"""
+
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import stat
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from .f5mku import F5MkuCipher, F5Result
+
+__all__ = [
+    "F5MkuClient",
+    "make_server",
+    "parse_keys",
+    "process_requests",
+]
+
+_RECV_SIZE = 64 * 1024
+_MAX_LINE_LENGTH = 1024 * 1024
+_DEFAULT_KEY_NAME = "default"
+
+
+def parse_keys(keys: Iterable[str]) -> Dict[str, str]:
+    """Parses `NAME:KEY` strings to a dict of name to key, `KEY` alone is named `default`.
+    Examples:
+        >>> parse_keys(["BHDLd0bbao1VlwpTk1sioQ==", "new:ukDKiN3j4YfWPI8FPbZLoA=="])
+        {'default': 'BHDLd0bbao1VlwpTk1sioQ==', 'new': 'ukDKiN3j4YfWPI8FPbZLoA=='}
+    """
+    parsed = {}
+    for key in keys:
+        name, _, f5mku = key.rpartition(":")
+        parsed[name or _DEFAULT_KEY_NAME] = f5mku
+    return parsed
+
+
+def process_requests(
+    requests: List[bytes], ciphers: Dict[str, F5MkuCipher]
+) -> List[Dict[str, Any]]:
+    """Processes a batch of JSON encoded `requests` and returns the responses in order.
+    Requests are grouped per operation and key and processed by `decrypt_many`,
+    `encrypt_many` and `compare_many`.
+    Args:
+        requests (List[bytes]): JSON encoded requests.
+        ciphers (Dict[str, F5MkuCipher]): ciphers by key name, the first is the default.
+    Returns:
+        List of response dicts.
+    """
+    default_key = next(iter(ciphers))
+    responses: List[Dict[str, Any]] = [{"id": None} for _ in requests]
+    decrypts = {}
+    encrypts = {}
+    compares = {}
+    for index, raw_request in enumerate(requests):
+        try:
+            request = json.loads(raw_request)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object.")
+            responses[index]["id"] = request.get("id")
+            key_name = request.get("key", default_key)
+            if not isinstance(key_name, str) or key_name not in ciphers:
+                raise ValueError(f"Unknown key: {key_name}")
+            operation = request.get("op")
+            if operation == "decrypt":
+                decrypts.setdefault(key_name, []).append(
+                    (index, _get_str(request, "ciphertext"))
+                )
+            elif operation == "encrypt":
+                salt = request.get("salt")
+                if salt is not None and not isinstance(salt, str):
+                    raise ValueError("Field salt must be a string.")
+                encrypts.setdefault(key_name, []).append(
+                    (index, (_get_str(request, "plaintext"), salt))
+                )
+            elif operation == "compare":
+                compares.setdefault(key_name, []).append(
+                    (
+                        index,
+                        (
+                            _get_str(request, "plaintext"),
+                            _get_str(request, "ciphertext"),
+                        ),
+                    )
+                )
+            else:
+                raise ValueError(f"Unknown op: {operation}")
+        except ValueError as exc:
+            responses[index]["error"] = str(exc)
+
+    for key_name, items in decrypts.items():
+        _process_batch(
+            responses,
+            items,
+            ciphers[key_name].decrypt_many,
+            [value for _, value in items],
+        )
+    for key_name, items in encrypts.items():
+        _process_batch(
+            responses,
+            items,
+            ciphers[key_name].encrypt_many,
+            [plaintext for _, (plaintext, _) in items],
+            salts=[salt for _, (_, salt) in items],
+        )
+    for key_name, items in compares.items():
+        _process_batch(
+            responses,
+            items,
+            ciphers[key_name].compare_many,
+            [pair for _, pair in items],
+        )
+    return responses
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """Reads pipelined requests and answers every batch of complete lines at once."""
+
+    def handle(self):
+        buffer = b""
+        while True:
+            data = self.request.recv(_RECV_SIZE)
+            if not data:
+                return
+            lines = (buffer + data).split(b"\n")
+            buffer = lines.pop()
+            if len(buffer) > _MAX_LINE_LENGTH:
+                self._send([{"id": None, "error": "Request line too long."}])
+                return
+            requests = [line for line in lines if line.strip()]
+            if requests:
+                self._send(process_requests(requests, self.server.ciphers))
+
+    def _send(self, responses: List[Dict[str, Any]]) -> None:
+        self.request.sendall(
+            b"".join(json.dumps(response).encode() + b"\n" for response in responses)
+        )
+
+
+class _CipherServer(socketserver.ThreadingMixIn):
+    """Server holding the ciphers used by `_RequestHandler`."""
+
+    daemon_threads = True
+
+    def __init__(self, server_address, ciphers: Dict[str, F5MkuCipher]):
+        self.ciphers = ciphers
+        super().__init__(server_address, _RequestHandler)
+
+
+class _UnixServer(_CipherServer, socketserver.UnixStreamServer):
+    _bound = False
+
+    def server_bind(self):
+        if _is_stale_socket(self.server_address):
+            os.unlink(self.server_address)
+        # only the owner may connect to the socket
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+        self._bound = True
+
+    def server_close(self):
+        super().server_close()
+        # the path belongs to another server if binding failed
+        if self._bound and os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class _TCPServer(_CipherServer, socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+def make_server(
+    keys: Dict[str, str],
+    path: Optional[str] = None,
+    host: str = "127.0.0.1",
+    port: Optional[int] = None,
+) -> socketserver.BaseServer:
+    """Creates the server with all `keys` loaded, call `serve_forever` to start it.
+    Examples:
+        >>> server = make_server({"default": "BHDLd0bbao1VlwpTk1sioQ=="}, path="/tmp/f5mkupy.sock")
+        >>> server.serve_forever()
+    Args:
+        keys (Dict[str, str]): f5mku base64 keys by name, the first key is the default key.
+        path (str): Unix domain socket path to listen on, an existing socket is only
+            replaced if no server is listening on it anymore.
+        host (str): Loopback address to listen on if `port` is used, defaults to localhost.
+            Requests are not authenticated, other addresses are rejected.
+        port (int): TCP port to listen on, if `path` is not provided.
+    Returns:
+        socketserver server instance.
+    """
+    if not keys:
+        raise ValueError("At least one f5mku key is required.")
+    if (path is None) == (port is None):
+        raise ValueError("Either path or port must be provided.")
+    if path is None and not _is_loopback(host):
+        raise ValueError(
+            f"Refusing to listen on non-loopback address {host}, use a unix domain socket instead."
+        )
+    ciphers = {name: F5MkuCipher(f5mku) for name, f5mku in keys.items()}
+    if path is not None:
+        return _UnixServer(path, ciphers)
+    return _TCPServer((host, port), ciphers)
+
+
+class F5MkuClient:
+    """Client of the f5mkupy service, see `make_server`.
+    Examples:
+        >>> with F5MkuClient(path="/tmp/f5mkupy.sock") as client:
+        ...     client.decrypt("$M$iP$rr0su9oHn9J9p1t3nRzydA==")
+        'KEY45678'
+    Args:
+        path (str): Unix domain socket path of the server.
+        host (str): Address of the server if `port` is used.
+        port (int): TCP port of the server, if `path` is not provided.
+        timeout (float): Optional socket timeout in seconds.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        if path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address: Union[str, Tuple[str, int]] = path
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = (host, port)
+        self._socket.settimeout(timeout)
+        self._socket.connect(address)
+        self._reader = self._socket.makefile("rb")
+
+    def __enter__(self) -> "F5MkuClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the connection."""
+        self._reader.close()
+        self._socket.close()
+
+    def request_many(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Sends all `requests` pipelined and returns the responses in order."""
+        self._socket.sendall(
+            b"".join(json.dumps(request).encode() + b"\n" for request in requests)
+        )
+        responses = []
+        for _ in requests:
+            line = self._reader.readline()
+            if not line:
+                raise ConnectionError("Connection closed by server.")
+            responses.append(json.loads(line))
+        return responses
+
+    def decrypt(self, ciphertext: str, key: Optional[str] = None) -> str:
+        """Decrypts `ciphertext` with the server key `key`."""
+        return self._request({"op": "decrypt", "ciphertext": ciphertext}, key)
+
+    def encrypt(
+        self, plaintext: str, salt: Optional[str] = None, key: Optional[str] = None
+    ) -> str:
+        """Encrypts `plaintext` with the server key `key` and optional `salt`."""
+        return self._request(
+            {"op": "encrypt", "plaintext": plaintext, "salt": salt}, key
+        )
+
+    def compare(
+        self, plaintext: str, ciphertext: str, key: Optional[str] = None
+    ) -> bool:
+        """Returns whether `ciphertext` is the encrypted `plaintext`."""
+        return self._request(
+            {"op": "compare", "plaintext": plaintext, "ciphertext": ciphertext}, key
+        )
+
+    def _request(self, request: Dict[str, Any], key: Optional[str]) -> Any:
+        """Sends a single request and returns its result, raises ValueError on errors."""
+        if key is not None:
+            request["key"] = key
+        response = self.request_many([request])[0]
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response["result"]
+
+
+def _is_loopback(host: str) -> bool:
+    """Returns whether all addresses `host` resolves to are loopback addresses."""
+    try:
+        addresses = socket.getaddrinfo(host, None, socket.AF_INET, socket.SOCK_STREAM)
+    except socket.gaierror:
+        return False
+    return all(ipaddress.ip_address(address[4][0]).is_loopback for address in addresses)
+
+
+def _is_stale_socket(path: str) -> bool:
+    """Returns whether `path` is a unix domain socket no server is listening on."""
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return False
+    except FileNotFoundError:
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            return True
+    return False
+
+
+def _get_str(request: Dict[str, Any], field: str) -> str:
+    """Returns string `field` of `request`, raises ValueError if missing or not a string."""
+    value = request.get(field)
+    if not isinstance(value, str):
+        raise ValueError(f"Field {field} must be a string.")
+    return value
+
+
+def _process_batch(
+    responses: List[Dict[str, Any]],
+    items: list,
+    function: Callable[..., List[F5Result]],
+    *arguments: Any,
+    **keywords: Any,
+) -> None:
+    """Sets the responses of `items` from the results of `function`, an unexpected
+    exception fails the requests of this batch only, instead of the connection."""
+    try:
+        results = function(*arguments, **keywords)
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        for index, _ in items:
+            responses[index]["error"] = f"Internal error: {exc!r}"
+        return
+    _set_results(responses, items, results)
+
+
+def _set_results(responses: List[Dict[str, Any]], items: list, results: list) -> None:
+    """Sets `result` or `error` of the responses of `items` from F5Result `results`."""
+    for (index, _), result in zip(items, results):
+        if result.error is None:
+            responses[index]["result"] = result.value
+        else:
+            responses[index]["error"] = str(result.error)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Validation and parsing of F5 formatted ciphertexts, without decrypting them."""
+
+from binascii import a2b_base64
+from collections import namedtuple
+from enum import Enum
+from time import perf_counter
+from typing import Iterable, List, Tuple, Union
+
+from . import metrics as _metrics
+
+F5Ciphertext = namedtuple("F5Ciphertext", "salt ciphertext")
+
+_BLOCK_SIZE = 16  # AES block size in bytes
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+__all__ = [
+    "Validation",
+    "validate",
+    "validate_many",
+]
+
+
+class Validation(str, Enum):
+    """Result codes of `validate`, values are short strings suitable for JSON."""
+
+    OK = "ok"
+    BAD_FORMAT = "bad_format"  # not 4 elements separated by '$'
+    BAD_PREFIX = "bad_prefix"  # doesn't start with '$M$'
+    BAD_SALT = "bad_salt"  # empty salt
+    BAD_BASE64 = "bad_base64"  # not strict, padded base64
+    NOT_BLOCK_ALIGNED = "not_block_aligned"  # empty or partial AES block
+
+    def __str__(self) -> str:
+        return self.value
+
+
+# members are looked up on the hot path of the batch APIs
+_VALID = Validation.OK
+_NOT_ALIGNED = Validation.NOT_BLOCK_ALIGNED
+
+_VALIDATION_ERRORS = {
+    Validation.BAD_FORMAT: (
+        "Unrecognized ciphertext: "
+        "Ciphertext is to have 4 elements, separated by '$' char."
+    ),
+    Validation.BAD_PREFIX: (
+        "Unrecognized ciphertext: Ciphertext is expected to start with '$M'."
+    ),
+    Validation.BAD_SALT: "Unrecognized ciphertext: Empty salt is not supported.",
+    Validation.BAD_BASE64: "Unrecognized ciphertext: Ciphertext is not valid base64.",
+    Validation.NOT_BLOCK_ALIGNED: "Ciphertext length is not a multiple of the block size.",
+}
+
+
+def validate(ciphertext: str) -> Validation:
+    """Checks the format of `ciphertext` without decrypting it and without raising.
+    The base64 ciphertext is checked strictly and has to decode to complete AES
+    blocks, it is not decoded. Fast enough to triage large amounts of untrusted data.
+    Examples:
+        >>> validate("$M$iP$rr0su9oHn9J9p1t3nRzydA==")
+        <Validation.OK: 'ok'>
+        >>> validate("$M$iP$rr0su9oHn9J9p1t3nRzy")
+        <Validation.NOT_BLOCK_ALIGNED: 'not_block_aligned'>
+    Args:
+        ciphertext (str): F5 formatted ciphertext string.
+    Returns:
+        Validation code, `Validation.OK` if the ciphertext can be decrypted.
+    """
+    return _check_ciphertext(ciphertext)[0]
+
+
+def validate_many(ciphertexts: Iterable[str]) -> List[Validation]:
+    """Checks the format of all `ciphertexts`, see `validate`.
+    Examples:
+        >>> [str(validation) for validation in validate_many(
+        ...     ["$M$iP$rr0su9oHn9J9p1t3nRzydA==", "$X$iP$", "$M$iP$not base64"]
+        ... )]
+        ['ok', 'bad_prefix', 'bad_base64']
+    Args:
+        ciphertexts (Iterable[str]): F5 formatted ciphertext strings.
+    Returns:
+        List of Validation codes, one per ciphertext.
+    """
+    return [_check_ciphertext(ciphertext)[0] for ciphertext in ciphertexts]
+
+
+def _check_ciphertext(ciphertext: str) -> Tuple[Validation, str, str]:
+    """Returns (Validation, salt, base64 ciphertext) of `ciphertext`, salt and
+    ciphertext are empty unless valid."""
+    parts = ciphertext.split("$") if isinstance(ciphertext, str) else ()
+    if len(parts) != 4:
+        return Validation.BAD_FORMAT, "", ""
+    _f5start, _f5type, _salt, _ciphertext = parts
+    if _f5start or _f5type != "M":
+        return Validation.BAD_PREFIX, "", ""
+    if not _salt:
+        return Validation.BAD_SALT, "", ""
+    # strict, padded base64 as produced by F5: string methods are faster than a regex
+    unpadded = _ciphertext.rstrip("=")
+    padding = len(_ciphertext) - len(unpadded)
+    if (
+        len(_ciphertext) % 4
+        or padding > 2
+        or not unpadded.isascii()
+        or not unpadded.replace("+", "a").replace("/", "a").isalnum()
+    ):
+        return Validation.BAD_BASE64 if _ciphertext else _NOT_ALIGNED, "", ""
+    # length of the decoded ciphertext, checked without decoding it
+    length = len(_ciphertext) // 4 * 3 - padding
+    if length % _BLOCK_SIZE:
+        return _NOT_ALIGNED, "", ""
+    return _VALID, _salt, _ciphertext
+
+
+def _parse_ciphertext(ciphertext: str) -> Union[F5Ciphertext, Validation]:
+    """Like `_deconstruct_ciphertext` for batches, invalid ciphertexts are detected by
+    `validate` and the Validation code is returned instead of raising ValueError."""
+    metrics = _metrics.active
+    start = perf_counter() if metrics is not None else 0.0
+    validation, _salt, _ciphertext = _check_ciphertext(ciphertext)
+    if metrics is not None:
+        start = metrics.lap("parse", start)
+    if validation is not _VALID:
+        return validation
+    # can't fail, the ciphertext is valid base64
+    _f5_ciphertext = F5Ciphertext(_salt.encode("utf-8"), a2b_base64(_ciphertext))
+    if metrics is not None:
+        metrics.lap("decode", start)
+    return _f5_ciphertext
+
+
+def _parse_ciphertext_bytes(ciphertext: BytesLike) -> Union[F5Ciphertext, Validation]:
+    """Like `_parse_ciphertext` for a bytes-like ciphertext, checked by the same rules.
+    The ciphertext is decoded as latin-1 for the checks, which maps every byte to
+    one character, so bytes and str ciphertexts get the same Validation."""
+    metrics = _metrics.active
+    start = perf_counter() if metrics is not None else 0.0
+    text = memoryview(ciphertext).cast("B").tobytes().decode("latin-1")
+    validation, _salt, _ciphertext = _check_ciphertext(text)
+    if metrics is not None:
+        start = metrics.lap("parse", start)
+    if validation is not _VALID:
+        return validation
+    _f5_ciphertext = F5Ciphertext(_salt.encode("latin-1"), a2b_base64(_ciphertext))
+    if metrics is not None:
+        metrics.lap("decode", start)
+    return _f5_ciphertext
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from f5mkupy.aio import AsyncF5MkuCipher
+from f5mkupy.conf import RewriteStats, rewrite_file, rewrite_lines
+from f5mkupy.f5mku import F5MkuCipher, decrypt
+
+from .testdata import (
+    EXAMPLE_DATASET,
+    F5MKU_K,
+    F5MKU_K_NEW,
+    PARTIAL_BIGIP_CONF,
+    PARTIAL_BIGIP_CONF_SECRETS,
+)
+
+
+def _plaintext_conf():
+    conf = PARTIAL_BIGIP_CONF
+    for ciphertext, plaintext in PARTIAL_BIGIP_CONF_SECRETS.items():
+        conf = conf.replace(ciphertext, plaintext)
+    return conf.encode()
+
+
+async def _collect(async_iterator):
+    return [item async for item in async_iterator]
+
+
+class Test_AsyncF5MkuCipher:
+    def test_single_operations(self):
+        async def main():
+            cipher = AsyncF5MkuCipher(F5MKU_K)
+            ciphertext = await cipher.encrypt("KEY45678", salt="iP")
+            return (
+                ciphertext,
+                await cipher.decrypt(ciphertext),
+                await cipher.matches("KEY45678", ciphertext),
+                await cipher.matches("KEY45679", ciphertext),
+            )
+
+        assert asyncio.run(main()) == (
+            "$M$iP$rr0su9oHn9J9p1t3nRzydA==",
+            "KEY45678",
+            True,
+            False,
+        )
+
+    def test_encrypt_context(self):
+        context = "sys file ssl-key rsa.key passphrase"
+        ciphertext = asyncio.run(
+            AsyncF5MkuCipher(F5MKU_K).encrypt("RSASecretKey", context=context)
+        )
+        assert ciphertext == F5MkuCipher(F5MKU_K).encrypt(
+            "RSASecretKey", context=context
+        )
+
+    def test_decrypt_error(self):
+        with pytest.raises(ValueError):
+            asyncio.run(AsyncF5MkuCipher(F5MKU_K).decrypt("$M$iP$"))
+
+    def test_max_concurrency(self):
+        with pytest.raises(ValueError):
+            AsyncF5MkuCipher(F5MKU_K, max_concurrency=0)
+
+    def test_batches_in_order(self):
+        plaintexts = [f"secret_{index}" for index in range(25)]
+
+        async def main():
+            cipher = AsyncF5MkuCipher(F5MKU_K, batch_size=4, max_concurrency=2)
+            encrypted = await cipher.encrypt_many(plaintexts)
+            ciphertexts = [result.value for result in encrypted]
+            decrypted = await cipher.decrypt_many(ciphertexts + ["$X$iP$"])
+            compared = await cipher.compare_many(zip(plaintexts, reversed(ciphertexts)))
+            return ciphertexts, decrypted, compared
+
+        ciphertexts, decrypted, compared = asyncio.run(main())
+        assert [
+            decrypt(ciphertext, F5MKU_K) for ciphertext in ciphertexts
+        ] == plaintexts
+        assert [result.value for result in decrypted[:-1]] == plaintexts
+        assert isinstance(decrypted[-1].error, ValueError)
+        assert [result.value for result in compared] == [
+            index == 12 for index in range(25)
+        ]
+
+    def test_encrypt_many_salts(self):
+        async def main():
+            cipher = AsyncF5MkuCipher(F5MKU_K, batch_size=1)
+            return await cipher.encrypt_many(
+                [item["plaintext"] for item in EXAMPLE_DATASET],
+                salts=[item["salt"] for item in EXAMPLE_DATASET],
+            )
+
+        assert [result.value for result in asyncio.run(main())] == [
+            item["ciphertext_raw"] for item in EXAMPLE_DATASET
+        ]
+
+    def test_encrypt_many_salts_mismatch(self):
+        with pytest.raises(ValueError):
+            asyncio.run(
+                AsyncF5MkuCipher(F5MKU_K).encrypt_many(["a", "b"], salts=["xx"])
+            )
+
+    def test_max_concurrency_limits_executor(self):
+        running = []
+        peak = []
+
+        def slow_decrypt_many(ciphertexts):
+            running.append(None)
+            peak.append(len(running))
+            try:
+                return cipher.cipher.decrypt_many(ciphertexts)
+            finally:
+                running.pop()
+
+        async def main():
+            return await cipher._map_batches(  # pylint: disable=protected-access
+                slow_decrypt_many,
+                [([ciphertext],) for ciphertext in PARTIAL_BIGIP_CONF_SECRETS],
+            )
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            cipher = AsyncF5MkuCipher(F5MKU_K, executor=executor, max_concurrency=2)
+            results = asyncio.run(main())
+        assert [result.value for result in results] == list(
+            PARTIAL_BIGIP_CONF_SECRETS.values()
+        )
+        assert max(peak) <= 2
+
+    def test_process_executor(self, tmp_path):
+        source = tmp_path / "bigip.conf"
+        source.write_text(PARTIAL_BIGIP_CONF)
+        target = tmp_path / "target.conf"
+
+        async def main(executor):
+            cipher = AsyncF5MkuCipher(
+                F5MkuCipher(F5MKU_K), executor=executor, batch_size=2
+            )
+            decrypted = await cipher.decrypt_many(PARTIAL_BIGIP_CONF_SECRETS)
+            stats = await cipher.rewrite_file(source, target, chunk_size=100)
+            return decrypted, stats
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            decrypted, stats = asyncio.run(main(executor))
+        assert [result.value for result in decrypted] == list(
+            PARTIAL_BIGIP_CONF_SECRETS.values()
+        )
+        assert stats == RewriteStats(found=5, converted=5, failed=0)
+        assert target.read_bytes() == _plaintext_conf()
+
+
+class Test_rewrite_lines:
+    def test_stream_from_server(self):
+        """Rewrite a config while it is downloaded from a local stand-in server."""
+
+        async def serve_config(_reader, writer):
+            for line in PARTIAL_BIGIP_CONF.encode().splitlines(keepends=True):
+                writer.write(line)
+                await writer.drain()
+            writer.close()
+
+        async def main():
+            server = await asyncio.start_server(serve_config, "127.0.0.1", 0)
+            host, port = server.sockets[0].getsockname()[:2]
+            async with server:
+                reader, writer = await asyncio.open_connection(host, port)
+                cipher = AsyncF5MkuCipher(F5MKU_K, batch_size=3)
+                stats = RewriteStats()
+                lines = await _collect(
+                    cipher.rewrite_lines(reader, target_f5mku=F5MKU_K_NEW, stats=stats)
+                )
+                writer.close()
+            return lines, stats
+
+        lines, stats = asyncio.run(main())
+        assert stats == RewriteStats(found=5, converted=5, failed=0)
+        assert len(lines) == len(PARTIAL_BIGIP_CONF.splitlines())
+        rewritten = b"".join(lines).decode()
+        for ciphertext, plaintext in PARTIAL_BIGIP_CONF_SECRETS.items():
+            assert ciphertext not in rewritten
+            assert plaintext not in rewritten
+        assert (
+            decrypt(rewritten.splitlines()[-5].split()[-1], F5MKU_K_NEW)
+            == "RSASecretKey"
+        )
+
+    def test_event_loop_not_blocked(self):
+        lines = PARTIAL_BIGIP_CONF.encode().splitlines(keepends=True) * 200
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        async def main():
+            task = asyncio.ensure_future(ticker())
+            cipher = AsyncF5MkuCipher(F5MKU_K, batch_size=64)
+            rewritten = await _collect(cipher.rewrite_lines(lines))
+            task.cancel()
+            return rewritten
+
+        assert b"".join(asyncio.run(main())) == _plaintext_conf() * 200
+        assert len(ticks) > 10
+
+    def test_salt_context(self, tmp_path):
+        lines = PARTIAL_BIGIP_CONF.encode().splitlines(keepends=True)
+        expected = list(rewrite_lines(lines, F5MKU_K, F5MKU_K_NEW, salt_context="a "))
+        source = tmp_path / "bigip.conf"
+        source.write_text(PARTIAL_BIGIP_CONF)
+        rewrite_file(source, F5MKU_K, F5MKU_K_NEW, tmp_path / "sync.conf", "a ")
+
+        async def main(executor):
+            # batches and chunks end within objects
+            cipher = AsyncF5MkuCipher(F5MKU_K, executor=executor, batch_size=2)
+            rewritten = await _collect(
+                cipher.rewrite_lines(lines, target_f5mku=F5MKU_K_NEW, salt_context="a ")
+            )
+            await cipher.rewrite_file(
+                source,
+                tmp_path / "async.conf",
+                target_f5mku=F5MKU_K_NEW,
+                chunk_size=100,
+                salt_context="a ",
+            )
+            return rewritten
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            assert asyncio.run(main(executor)) == expected
+        assert (tmp_path / "async.conf").read_bytes() == b"".join(expected)
+        assert (tmp_path / "sync.conf").read_bytes() == b"".join(expected)
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import io
+import tarfile
+import tempfile
+
+import pytest
+
+from f5mkupy.archive import (
+    is_archive,
+    is_config_member,
+    iter_config_members,
+    redact_archive,
+    rewrite_archive,
+    scan_archive,
+)
+from f5mkupy.conf import RewriteStats
+from f5mkupy.f5mku import decrypt
+from f5mkupy.redact import placeholder
+
+from .testdata import (
+    F5MKU_K,
+    F5MKU_K_NEW,
+    PARTIAL_BIGIP_CONF,
+    PARTIAL_BIGIP_CONF_SECRETS,
+)
+
+UCS_MEMBERS = {
+    "config/bigip.conf": PARTIAL_BIGIP_CONF.encode(),
+    "config/bigip_base.conf": b"net vlan /Common/internal {\n    tag 4094\n}\n",
+    "config/partitions/tenant/bigip.conf": PARTIAL_BIGIP_CONF.encode(),
+    "config/bigip_user.conf.bak": PARTIAL_BIGIP_CONF.encode(),
+    "var/tmp/filestore_temp/files_d/Common_d/certificate_d/cert": b"-----BEGIN CERTIFICATE-----\n",
+}
+
+
+def write_archive(path, members, mode="w:gz"):
+    with tarfile.open(path, mode) as archive:
+        directory = tarfile.TarInfo("config")
+        directory.type = tarfile.DIRTYPE
+        archive.addfile(directory)
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mode = 0o640
+            archive.addfile(info, io.BytesIO(content))
+
+
+def read_archive(path):
+    with tarfile.open(path, "r:*") as archive:
+        return {
+            member.name: archive.extractfile(member).read() if member.isfile() else None
+            for member in archive
+        }
+
+
+@pytest.fixture(name="ucs")
+def fixture_ucs(tmp_path):
+    path = tmp_path / "backup.ucs"
+    write_archive(path, UCS_MEMBERS)
+    return path
+
+
+class Test_is_archive:
+    def test_suffix(self, tmp_path):
+        assert is_archive(tmp_path / "backup.ucs")
+        assert is_archive(tmp_path / "backup.tar.gz")
+        assert not is_archive(tmp_path / "bigip.conf")
+
+    def test_content(self, tmp_path):
+        path = tmp_path / "backup"
+        write_archive(path, UCS_MEMBERS, mode="w")
+        assert is_archive(path)
+        (tmp_path / "bigip.conf").write_text(PARTIAL_BIGIP_CONF)
+        assert not is_archive(tmp_path / "bigip.conf")
+
+    def test_config_member(self):
+        assert is_config_member("config/bigip.conf")
+        assert is_config_member("./config/bigip_base.conf")
+        assert is_config_member("config/partitions/tenant/bigip.conf")
+        assert not is_config_member("config/bigip.conf.bak")
+        assert not is_config_member("var/config/bigip.conf")
+        assert not is_config_member("config/partitions/tenant/sub/bigip.conf")
+
+
+class Test_iter_config_members:
+    def test_function(self, ucs):
+        assert {
+            name: config_file.read() for name, config_file in iter_config_members(ucs)
+        } == {
+            name: content
+            for name, content in UCS_MEMBERS.items()
+            if name.endswith(".conf")
+        }
+
+    def test_scan_archive(self, ucs):
+        spans = list(scan_archive(ucs))
+        assert [name for name, _ in spans] == ["config/bigip.conf"] * 5 + [
+            "config/partitions/tenant/bigip.conf"
+        ] * 5
+        conf = PARTIAL_BIGIP_CONF.encode()
+        for _, span in spans:
+            assert conf[span.start : span.end] == span.token
+        assert [span.token.decode() for _, span in spans[:5]] == list(
+            PARTIAL_BIGIP_CONF_SECRETS
+        )
+
+
+class Test_rewrite_archive:
+    def test_reencrypt(self, ucs, tmp_path):
+        target = tmp_path / "migrated.ucs"
+        assert rewrite_archive(ucs, target, F5MKU_K, F5MKU_K_NEW) == {
+            "config/bigip.conf": RewriteStats(found=5, converted=5, failed=0),
+            "config/bigip_base.conf": RewriteStats(),
+            "config/partitions/tenant/bigip.conf": RewriteStats(
+                found=5, converted=5, failed=0
+            ),
+        }
+        members = read_archive(target)
+        assert list(members) == ["config", *UCS_MEMBERS]
+        for name in ("config/bigip_base.conf", "config/bigip_user.conf.bak"):
+            assert members[name] == UCS_MEMBERS[name]
+        for name, span in scan_archive(target):
+            assert name.endswith("bigip.conf")
+            assert (
+                decrypt(span.token.decode(), F5MKU_K_NEW)
+                in PARTIAL_BIGIP_CONF_SECRETS.values()
+            )
+        with tarfile.open(target, "r:gz") as archive:
+            assert archive.getmember("config/bigip.conf").mode == 0o640
+
+    def test_salt_context(self, ucs, tmp_path):
+        targets = [tmp_path / "first.ucs", tmp_path / "second.ucs"]
+        for target in targets:
+            rewrite_archive(ucs, target, F5MKU_K, F5MKU_K_NEW, salt_context="")
+        first, second = read_archive(targets[0]), read_archive(targets[1])
+        assert first == second
+        assert (
+            first["config/bigip.conf"] != first["config/partitions/tenant/bigip.conf"]
+        )
+
+    def test_decrypt_in_place_uncompressed(self, tmp_path):
+        path = tmp_path / "backup.tar"
+        write_archive(path, UCS_MEMBERS, mode="w")
+        rewrite_archive(path, path, F5MKU_K)
+        conf = read_archive(path)["config/bigip.conf"].decode()
+        for plaintext in PARTIAL_BIGIP_CONF_SECRETS.values():
+            assert plaintext in conf
+
+    def test_keeps_original_on_error(self, ucs):
+        original = ucs.read_bytes()
+        with pytest.raises(ValueError):
+            rewrite_archive(ucs, ucs, "not a key")
+        assert ucs.read_bytes() == original
+
+    def test_large_plaintext_not_spooled(self, ucs, tmp_path, mocker):
+        mocker.patch("f5mkupy.archive._SPOOL_SIZE", 64)
+        temporary_file = mocker.spy(tempfile, "TemporaryFile")
+        original = ucs.read_bytes()
+        with pytest.raises(ValueError, match="config/bigip.conf exceeds 64 bytes"):
+            rewrite_archive(ucs, ucs, F5MKU_K)
+        assert ucs.read_bytes() == original
+        assert temporary_file.call_count == 0
+
+        # re-encrypted members are spooled
+        rewrite_archive(ucs, tmp_path / "migrated.ucs", F5MKU_K, F5MKU_K_NEW)
+        assert temporary_file.call_count == 2
+
+    def test_large_plaintext_spool_dir(self, ucs, tmp_path, mocker):
+        mocker.patch("f5mkupy.archive._SPOOL_SIZE", 64)
+        temporary_file = mocker.spy(tempfile, "TemporaryFile")
+        rewrite_archive(ucs, ucs, F5MKU_K, spool_dir=tmp_path)
+        assert {call.kwargs["dir"] for call in temporary_file.call_args_list} == {
+            tmp_path
+        }
+        conf = read_archive(ucs)["config/bigip.conf"].decode()
+        for plaintext in PARTIAL_BIGIP_CONF_SECRETS.values():
+            assert plaintext in conf
+
+
+class Test_redact_archive:
+    def test_function(self, ucs, tmp_path):
+        target = tmp_path / "redacted.ucs"
+        assert redact_archive(ucs, target) == {
+            "config/bigip.conf": 5,
+            "config/bigip_base.conf": 0,
+            "config/partitions/tenant/bigip.conf": 5,
+        }
+        members = read_archive(target)
+        assert list(members) == ["config", *UCS_MEMBERS]
+        assert not list(scan_archive(target))
+        conf = members["config/bigip.conf"].decode()
+        for ciphertext in PARTIAL_BIGIP_CONF_SECRETS:
+            assert placeholder(ciphertext.encode()).decode() in conf
+        assert (
+            members["config/bigip_user.conf.bak"]
+            == UCS_MEMBERS["config/bigip_user.conf.bak"]
+        )
+
+    def test_in_place_uncompressed(self, tmp_path):
+        path = tmp_path / "backup.tar"
+        write_archive(path, UCS_MEMBERS, mode="w")
+        assert sum(redact_archive(path, path).values()) == 10
+        members = read_archive(path)
+        assert b"$M$" not in members["config/partitions/tenant/bigip.conf"]
+        assert (
+            members["config/bigip_user.conf.bak"]
+            == UCS_MEMBERS["config/bigip_user.conf.bak"]
+        )
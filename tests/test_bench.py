@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import json
+import sys
+
+import pytest
+
+from f5mkupy.bench import (
+    BENCH_F5MKU,
+    _percentiles,
+    generate_config,
+    run_benchmarks,
+    write_config,
+)
+from f5mkupy.cli import cli
+from f5mkupy.f5mku import decrypt_many
+from f5mkupy.scan import scan
+
+
+class Test_generate_config:
+    def test_deterministic(self):
+        assert list(generate_config(objects=50, seed=1)) == list(
+            generate_config(objects=50, seed=1)
+        )
+        assert list(generate_config(objects=50, seed=1)) != list(
+            generate_config(objects=50, seed=2)
+        )
+
+    def test_secrets_decrypt(self):
+        config = b"".join(generate_config(objects=200, secret_density=0.5))
+        tokens = [span.token.decode() for span in scan(config)]
+        assert 50 < len(tokens) < 150
+        results = decrypt_many(tokens, BENCH_F5MKU)
+        assert all(result.error is None for result in results)
+
+    def test_secret_density_and_repeats(self):
+        config = b"".join(
+            generate_config(objects=100, secret_density=1.0, repeat_ratio=0.9)
+        )
+        tokens = [span.token for span in scan(config)]
+        assert len(tokens) == 100
+        assert len(set(tokens)) < 50
+        assert not list(scan(b"".join(generate_config(objects=100, secret_density=0))))
+
+    def test_balanced_braces(self):
+        config = b"".join(generate_config(objects=100))
+        assert config.count(b"{") == config.count(b"}")
+
+    def test_write_config(self, tmp_path):
+        path = tmp_path / "bigip.conf"
+        size = write_config(str(path), objects=10)
+        assert size == path.stat().st_size > 0
+
+
+class Test_run_benchmarks:
+    def test_function(self):
+        results = run_benchmarks(objects=[20], operations=50, repeat=1)
+        assert results["meta"]["f5mkupy"]
+        names = [result["name"] for result in results["results"]]
+        assert names == [
+            "encrypt",
+            "decrypt",
+            "encrypt_many",
+            "decrypt_many",
+            "compare_many",
+            "thread_pool_decrypt_many",
+            "process_pool_decrypt_many",
+            "scan",
+            "rewrite_file",
+            "rotate_key",
+            "redact_file",
+        ]
+        for result in results["results"]:
+            assert result["seconds"] > 0
+        assert set(results["results"][0]["latency_us"]) == {"p50", "p90", "p99"}
+        assert results["results"][5]["speedup"] > 0
+        json.dumps(results)
+
+    def test_percentiles(self):
+        assert _percentiles(list(range(1000, 101000, 1000))) == {
+            "p50": 51.0,
+            "p90": 91.0,
+            "p99": 100.0,
+        }
+        assert _percentiles([]) == {"p50": None, "p90": None, "p99": None}
+
+    def test_invalid_operations(self):
+        with pytest.raises(ValueError, match="positive integers"):
+            run_benchmarks(objects=[], operations=0)
+
+
+class Test_cli_bench:
+    def test_output(self, monkeypatch, tmp_path):
+        output = tmp_path / "bench.json"
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "/path/to/program_name",
+                "bench",
+                "--objects",
+                "10",
+                "--operations",
+                "10",
+                "--repeat",
+                "1",
+                "--workers",
+                "2",
+                "-o",
+                str(output),
+            ],
+        )
+        cli()
+        assert len(json.loads(output.read_text())["results"]) == 11
+
+    @pytest.mark.parametrize("value", ["0", "-1", "many"])
+    def test_invalid_operations(self, monkeypatch, capfd, value):
+        monkeypatch.setattr(
+            sys, "argv", ["/path/to/program_name", "bench", "--operations", value]
+        )
+        with pytest.raises(SystemExit) as e_info:
+            cli()
+        assert e_info.value.code == 2
+        _, cli_err = capfd.readouterr()
+        assert f"must be a positive integer, got: {value}" in cli_err
+
+    def test_generate(self, monkeypatch, tmp_path, capfd):
+        path = tmp_path / "bigip.conf"
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "/path/to/program_name",
+                "bench",
+                "--generate",
+                str(path),
+                "--objects",
+                "30",
+            ],
+        )
+        cli()
+        _, cli_err = capfd.readouterr()
+        assert cli_err.startswith(str(path))
+        assert path.stat().st_size > 0
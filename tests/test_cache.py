@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import pytest
+
+from f5mkupy.cache import CacheInfo, DecryptCache
+from f5mkupy.conf import rewrite_lines
+from f5mkupy.f5mku import (
+    F5MkuCipher,
+    _cached_cipher,
+    clear_caches,
+    decrypt,
+    decrypt_many,
+    disable_decrypt_cache,
+    enable_decrypt_cache,
+)
+
+from .testdata import EXAMPLE_DATASET, F5MKU_K, F5MKU_K_NEW
+
+
+@pytest.fixture(name="default_cache")
+def fixture_default_cache():
+    cache = enable_decrypt_cache(maxsize=16)
+    yield cache
+    disable_decrypt_cache()
+
+
+class Test_DecryptCache:
+    def test_get_put(self):
+        cache = DecryptCache(maxsize=2)
+        assert cache.get("fp", "ciphertext") is None
+        cache.put("fp", "ciphertext", b"plaintext")
+        assert cache.get("fp", "ciphertext") == b"plaintext"
+        assert cache.get("other_fp", "ciphertext") is None
+        assert cache.info() == CacheInfo(hits=1, misses=2, maxsize=2, currsize=1)
+
+    def test_lru_eviction(self):
+        cache = DecryptCache(maxsize=2)
+        cache.put("fp", "a", b"A")
+        cache.put("fp", "b", b"B")
+        assert cache.get("fp", "a") == b"A"
+        cache.put("fp", "c", b"C")
+        assert cache.get("fp", "b") is None
+        assert cache.get("fp", "a") == b"A"
+        assert cache.get("fp", "c") == b"C"
+        assert len(cache) == 2
+
+    def test_clear_wipes_plaintexts(self):
+        cache = DecryptCache()
+        cache.put("fp", "a", b"secret")
+        stored = cache._entries[("fp", "a")]  # pylint: disable=protected-access
+        cache.get("fp", "a")
+        cache.clear()
+        assert stored == bytearray(len(b"secret"))
+        assert cache.info() == CacheInfo(hits=0, misses=0, maxsize=4096, currsize=0)
+
+    def test_eviction_wipes_plaintexts(self):
+        cache = DecryptCache(maxsize=1)
+        cache.put("fp", "a", b"secret")
+        stored = cache._entries[("fp", "a")]  # pylint: disable=protected-access
+        cache.put("fp", "b", b"other")
+        assert stored == bytearray(len(b"secret"))
+
+    def test_invalid_maxsize(self):
+        with pytest.raises(ValueError):
+            DecryptCache(maxsize=0)
+
+    def test_repr(self):
+        assert "CacheInfo" in repr(DecryptCache())
+
+
+class Test_F5MkuCipher_cache:
+    def test_decrypt(self):
+        cache = DecryptCache()
+        cipher = F5MkuCipher(F5MKU_K, cache=cache)
+        for _ in range(3):
+            for example in EXAMPLE_DATASET:
+                assert cipher.decrypt(example.get("ciphertext_raw")) == example.get(
+                    "plaintext"
+                )
+        assert cache.info() == CacheInfo(
+            hits=2 * len(EXAMPLE_DATASET),
+            misses=len(EXAMPLE_DATASET),
+            maxsize=4096,
+            currsize=len(EXAMPLE_DATASET),
+        )
+
+    def test_decrypt_many(self):
+        cache = DecryptCache()
+        cipher = F5MkuCipher(F5MKU_K, cache=cache)
+        ciphertexts = [example.get("ciphertext_raw") for example in EXAMPLE_DATASET]
+        ciphertexts.append("$M$xx$rr0su9oHn9J9p1t3nRzydA==")
+        first = cipher.decrypt_many(ciphertexts)
+        second = cipher.decrypt_many(ciphertexts)
+        assert [result.value for result in first] == [result.value for result in second]
+        assert second[-1].error is not None
+        assert cache.hits == len(EXAMPLE_DATASET)
+        assert len(cache) == len(EXAMPLE_DATASET)
+
+    def test_keys_do_not_share_entries(self):
+        cache = DecryptCache()
+        example = EXAMPLE_DATASET[0]
+        assert F5MkuCipher(F5MKU_K, cache=cache).decrypt(
+            example.get("ciphertext_raw")
+        ) == example.get("plaintext")
+        with pytest.raises(ValueError):
+            F5MkuCipher(F5MKU_K_NEW, cache=cache).decrypt(example.get("ciphertext_raw"))
+
+
+class Test_default_cache:
+    def test_module_functions(self, default_cache):
+        example = EXAMPLE_DATASET[0]
+        decrypt(example.get("ciphertext_raw"), F5MKU_K)
+        decrypt_many([example.get("ciphertext_raw")], F5MKU_K)
+        assert default_cache.info() == CacheInfo(
+            hits=1, misses=1, maxsize=16, currsize=1
+        )
+
+    def test_rewrite_lines(self, default_cache):
+        line = f"passphrase {EXAMPLE_DATASET[0].get('ciphertext_raw')}\n".encode()
+        lines = list(rewrite_lines([line] * 10, F5MKU_K, batch_size=2))
+        assert (
+            lines
+            == [f"passphrase {EXAMPLE_DATASET[0].get('plaintext')}\n".encode()] * 10
+        )
+        assert default_cache.hits == 4
+        assert default_cache.misses == 1
+
+    def test_disable_wipes(self, default_cache):
+        decrypt(EXAMPLE_DATASET[0].get("ciphertext_raw"), F5MKU_K)
+        disable_decrypt_cache()
+        assert len(default_cache) == 0
+        decrypt(EXAMPLE_DATASET[0].get("ciphertext_raw"), F5MKU_K)
+        assert len(default_cache) == 0
+
+    def test_clear_caches(self, default_cache):
+        decrypt(EXAMPLE_DATASET[0].get("ciphertext_raw"), F5MKU_K)
+        assert _cached_cipher.cache_info().currsize > 0
+        clear_caches()
+        assert len(default_cache) == 0
+        assert _cached_cipher.cache_info().currsize == 0
+        decrypt(EXAMPLE_DATASET[0].get("ciphertext_raw"), F5MKU_K)
+        assert len(default_cache) == 0
@@ -3,13 +3,25 @@
 
 # pylint: disable=line-too-long,missing-function-docstring
 
+import io
+import json
+import re
 import sys
+import tarfile
 
 import pytest  # pylint: disable=unused-import
 
 from f5mkupy.cli import cli
+from f5mkupy.conf import rewrite_lines
+from f5mkupy.f5mku import F5MkuCipher, decrypt
 
-from .testdata import EXAMPLE_DATASET, F5MKU_K
+from .testdata import (
+    EXAMPLE_DATASET,
+    F5MKU_K,
+    F5MKU_K_NEW,
+    PARTIAL_BIGIP_CONF,
+    PARTIAL_BIGIP_CONF_SECRETS,
+)
 
 
 def test_cli_encrypt(monkeypatch, capfd):
@@ -64,3 +76,661 @@ def test_cli_extract_salt(monkeypatch, capfd):
         cli()
         cli_output, _ = capfd.readouterr()
         assert cli_output.rstrip() == example.get("salt")
+
+
+def test_cli_requires_function(monkeypatch, capfd):
+    monkeypatch.setattr(sys, "argv", ["/path/to/program_name"])
+    with pytest.raises(SystemExit) as exc_info:
+        cli()
+    _, cli_error = capfd.readouterr()
+    assert exc_info.value.code == 2
+    assert "required: function" in cli_error
+
+
+def test_cli_rewrite(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "bigip.conf"
+    source.write_text(PARTIAL_BIGIP_CONF)
+    target = tmp_path / "target.conf"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "rewrite",
+            "-k",
+            F5MKU_K,
+            "-t",
+            F5MKU_K_NEW,
+            "-o",
+            str(target),
+            str(source),
+        ],
+    )
+    cli()
+    _, cli_err = capfd.readouterr()
+    assert cli_err.rstrip() == "found: 5, converted: 5, failed: 0"
+    rewritten = target.read_text()
+    for ciphertext, plaintext in PARTIAL_BIGIP_CONF_SECRETS.items():
+        assert ciphertext not in rewritten
+        assert plaintext not in rewritten
+    ciphertexts = re.findall(r"\$M\$\S+", rewritten)
+    assert [decrypt(ciphertext, F5MKU_K_NEW) for ciphertext in ciphertexts] == list(
+        PARTIAL_BIGIP_CONF_SECRETS.values()
+    )
+
+
+def test_cli_rewrite_stdout(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "bigip.conf"
+    source.write_text(PARTIAL_BIGIP_CONF)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["/path/to/program_name", "rewrite", "-k", F5MKU_K, str(source)],
+    )
+    cli()
+    cli_output, _ = capfd.readouterr()
+    for plaintext in PARTIAL_BIGIP_CONF_SECRETS.values():
+        assert plaintext in cli_output
+
+
+def test_cli_rewrite_directory(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "config"
+    source.mkdir()
+    (source / "bigip.conf").write_text(PARTIAL_BIGIP_CONF)
+    (source / "bigip_base.conf").write_text(PARTIAL_BIGIP_CONF)
+    output_dir = tmp_path / "output"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "rewrite",
+            "-k",
+            F5MKU_K,
+            "-j",
+            "1",
+            "-d",
+            str(output_dir),
+            str(source),
+        ],
+    )
+    cli()
+    _, cli_err = capfd.readouterr()
+    assert cli_err.splitlines() == [
+        f"{source / 'bigip.conf'}: found: 5, converted: 5, failed: 0",
+        f"{source / 'bigip_base.conf'}: found: 5, converted: 5, failed: 0",
+    ]
+    assert "RSASecretKey" in (output_dir / "bigip_base.conf").read_text()
+
+
+def test_cli_rewrite_directory_requires_output(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["/path/to/program_name", "rewrite", "-k", F5MKU_K, str(tmp_path)],
+    )
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert "--output-dir or --in-place is required" in str(e_info.value)
+
+
+def test_cli_rewrite_archive(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "backup.ucs"
+    with tarfile.open(source, "w:gz") as archive:
+        info = tarfile.TarInfo("config/bigip.conf")
+        info.size = len(PARTIAL_BIGIP_CONF)
+        archive.addfile(info, io.BytesIO(PARTIAL_BIGIP_CONF.encode()))
+    target = tmp_path / "migrated.ucs"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "rewrite",
+            "-k",
+            F5MKU_K,
+            "-t",
+            F5MKU_K_NEW,
+            "-o",
+            str(target),
+            str(source),
+        ],
+    )
+    cli()
+    _, cli_err = capfd.readouterr()
+    assert cli_err.rstrip() == "config/bigip.conf: found: 5, converted: 5, failed: 0"
+    with tarfile.open(target, "r:gz") as archive:
+        conf = archive.extractfile("config/bigip.conf").read().decode()
+    for ciphertext, plaintext in PARTIAL_BIGIP_CONF_SECRETS.items():
+        assert ciphertext not in conf
+        assert plaintext not in conf
+
+    monkeypatch.setattr(
+        sys, "argv", ["/path/to/program_name", "rewrite", "-k", F5MKU_K, str(source)]
+    )
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert "--output or --in-place is required for archives" in str(e_info.value)
+
+
+def test_cli_rotate_key(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "bigip.conf"
+    source.write_text(PARTIAL_BIGIP_CONF)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "rotate-key",
+            "-k",
+            F5MKU_K,
+            "-t",
+            F5MKU_K_NEW,
+            "--dry-run",
+            str(source),
+        ],
+    )
+    cli()
+    _, cli_err = capfd.readouterr()
+    assert (
+        cli_err.rstrip()
+        == "dry run: found: 5, converted: 5, failed: 0, size: 812, target size: 812, secret bytes: 170"
+    )
+    assert source.read_text() == PARTIAL_BIGIP_CONF
+
+    monkeypatch.setattr(sys, "argv", sys.argv[:-2] + [str(source)])
+    cli()
+    rotated = source.read_text()
+    for ciphertext in PARTIAL_BIGIP_CONF_SECRETS:
+        salt = ciphertext.split("$")[2]
+        assert f"$M${salt}$" in rotated
+        assert ciphertext not in rotated
+    ciphertexts = re.findall(r"\$M\$\S+", rotated)
+    assert [decrypt(ciphertext, F5MKU_K_NEW) for ciphertext in ciphertexts] == list(
+        PARTIAL_BIGIP_CONF_SECRETS.values()
+    )
+
+
+def test_cli_identify_key(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "bigip.conf"
+    source.write_text(PARTIAL_BIGIP_CONF)
+    other = tmp_path / "bigip_base.conf"
+    other.write_text("ltm node n {\n}\n")
+    key_file = tmp_path / "keys"
+    key_file.write_text(f"new:{F5MKU_K_NEW}\ntypo:{F5MKU_K[1:]}\n{F5MKU_K}\n")
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "identify-key",
+            "--key-file",
+            str(key_file),
+            str(source),
+            str(other),
+        ],
+    )
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert e_info.value.code == 1
+    cli_output, cli_err = capfd.readouterr()
+    assert cli_output.splitlines() == [
+        f"{source}: {F5MkuCipher(F5MKU_K).fingerprint}",
+        f"{other}: unknown",
+    ]
+    assert cli_err.rstrip() == "skipped invalid key typo"
+    assert F5MKU_K not in cli_output
+
+
+def test_cli_index(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "bigip.conf"
+    source.write_text(PARTIAL_BIGIP_CONF)
+    db = tmp_path / "index.sqlite"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "index",
+            "--db",
+            str(db),
+            "--object",
+            "sys snmp",
+            str(source),
+        ],
+    )
+    cli()
+    cli_output, cli_err = capfd.readouterr()
+    assert cli_err.rstrip() == "indexed: 1, unchanged: 0, removed: 0, secrets: 5"
+    records = [json.loads(line) for line in cli_output.splitlines()]
+    assert [record["attribute"] for record in records] == [
+        "users snmp_user auth-password",
+        "users snmp_user privacy-password",
+    ]
+    assert records[0]["token"] == "$M$94$JoV46NWhBTc2/C8iEiq+bQ=="
+
+    monkeypatch.setattr(
+        sys, "argv", ["/path/to/program_name", "index", "--db", str(db), "--list"]
+    )
+    cli()
+    cli_output, cli_err = capfd.readouterr()
+    assert cli_err == ""
+    assert len(cli_output.splitlines()) == 5
+
+
+def test_cli_incremental(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "bigip.conf"
+    source.write_text(PARTIAL_BIGIP_CONF)
+    state = tmp_path / "state.json"
+    argv = [
+        "/path/to/program_name",
+        "incremental",
+        "-k",
+        F5MKU_K,
+        "--state",
+        str(state),
+        str(source),
+    ]
+    monkeypatch.setattr(sys, "argv", argv)
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert e_info.value.code == 1
+    capfd.readouterr()
+
+    source.write_text(PARTIAL_BIGIP_CONF.replace("    mode 33184\n", ""))
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert e_info.value.code == 1
+    cli_output, cli_err = capfd.readouterr()
+    assert cli_output.splitlines() == [f"{source}: changed: sys file ssl-key rsa.key"]
+    assert cli_err.rstrip() == "stanzas: 4, reused: 3, processed: 1, decrypted: 1"
+
+    monkeypatch.setattr(sys, "argv", argv + ["--full"])
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert e_info.value.code == 0
+    cli_output, cli_err = capfd.readouterr()
+    assert cli_output == ""
+    assert cli_err.rstrip() == "stanzas: 4, reused: 0, processed: 4, decrypted: 5"
+
+
+def test_cli_diff(monkeypatch, capfd, tmp_path):
+    source_a = tmp_path / "a.conf"
+    source_a.write_text(PARTIAL_BIGIP_CONF)
+    source_b = tmp_path / "b.conf"
+    source_b.write_text(
+        PARTIAL_BIGIP_CONF.replace("    mode 33184\n", "    mode 33188\n")
+    )
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "diff",
+            "-k",
+            F5MKU_K,
+            "-U",
+            "0",
+            str(source_a),
+            str(source_b),
+        ],
+    )
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert e_info.value.code == 1
+    cli_output, cli_err = capfd.readouterr()
+    assert cli_output.splitlines()[2:] == [
+        "changed: sys file ssl-key rsa.key",
+        "@@ -4 +4 @@",
+        "-    mode 33184",
+        "+    mode 33188",
+    ]
+    assert cli_err.rstrip() == "added: 0, removed: 0, changed: 1"
+
+
+def test_cli_decrypt_batch_stdin(monkeypatch, capfd):
+    monkeypatch.setattr(
+        sys,
+        "stdin",
+        io.StringIO(
+            "".join(f"{example.get('ciphertext_raw')}\n" for example in EXAMPLE_DATASET)
+        ),
+    )
+    monkeypatch.setattr(
+        sys, "argv", ["/path/to/program_name", "decrypt", "-k", F5MKU_K, "-"]
+    )
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert e_info.value.code == 0
+    cli_output, _ = capfd.readouterr()
+    assert cli_output.splitlines() == [
+        example.get("plaintext") for example in EXAMPLE_DATASET
+    ]
+
+
+def test_cli_decrypt_batch_errors(monkeypatch, capfd):
+    monkeypatch.setattr(
+        sys,
+        "stdin",
+        io.StringIO(f"invalid\n{EXAMPLE_DATASET[0].get('ciphertext_raw')}\n"),
+    )
+    monkeypatch.setattr(
+        sys, "argv", ["/path/to/program_name", "decrypt", "-k", F5MKU_K, "--batch"]
+    )
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert e_info.value.code == 1
+    cli_output, cli_err = capfd.readouterr()
+    assert cli_output.splitlines() == ["", EXAMPLE_DATASET[0].get("plaintext")]
+    assert cli_err.startswith("line 1: Unrecognized ciphertext")
+
+
+def test_cli_decrypt_batch_empty_lines(monkeypatch, capfd):
+    ciphertext = EXAMPLE_DATASET[0].get("ciphertext_raw")
+    monkeypatch.setattr(sys, "stdin", io.StringIO(f"{ciphertext}\n\n{ciphertext}\n\n"))
+    monkeypatch.setattr(
+        sys, "argv", ["/path/to/program_name", "decrypt", "-k", F5MKU_K, "-"]
+    )
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert e_info.value.code == 0
+    cli_output, cli_err = capfd.readouterr()
+    plaintext = EXAMPLE_DATASET[0].get("plaintext")
+    assert cli_output.split("\n") == [plaintext, "", plaintext, "", ""]
+    assert not cli_err
+
+
+def test_cli_decrypt_batch_invalid_utf8(monkeypatch, capfd):
+    ciphertext = EXAMPLE_DATASET[0].get("ciphertext_raw").encode()
+    monkeypatch.setattr(
+        sys,
+        "stdin",
+        io.TextIOWrapper(
+            io.BytesIO(b"\xff$M$iP$\xfe\n" + ciphertext + b"\n"), encoding="utf-8"
+        ),
+    )
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["/path/to/program_name", "decrypt", "-k", F5MKU_K, "--format", "ndjson", "-"],
+    )
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert e_info.value.code == 1
+    cli_output, _ = capfd.readouterr()
+    assert [json.loads(line) for line in cli_output.splitlines()] == [
+        {"line": 1, "error": "Line is not valid UTF-8."},
+        {"line": 2, "result": EXAMPLE_DATASET[0].get("plaintext")},
+    ]
+
+
+def test_cli_encrypt_batch_file_ndjson(monkeypatch, capfd, tmp_path):
+    batch_file = tmp_path / "plaintexts.txt"
+    batch_file.write_text(
+        "".join(f"{example.get('plaintext')}\n" for example in EXAMPLE_DATASET)
+    )
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "encrypt",
+            "-k",
+            F5MKU_K,
+            "--format",
+            "ndjson",
+            "--batch",
+            str(batch_file),
+        ],
+    )
+    with pytest.raises(SystemExit):
+        cli()
+    cli_output, _ = capfd.readouterr()
+    records = [json.loads(line) for line in cli_output.splitlines()]
+    assert [record["line"] for record in records] == [1, 2, 3, 4]
+    assert [decrypt(record["result"], F5MKU_K) for record in records] == [
+        example.get("plaintext") for example in EXAMPLE_DATASET
+    ]
+
+
+def test_cli_extract_salt_batch_ndjson_errors(monkeypatch, capfd):
+    monkeypatch.setattr(
+        sys, "stdin", io.StringIO(f"{EXAMPLE_DATASET[0].get('ciphertext_raw')}\n$X$\n")
+    )
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["/path/to/program_name", "extract_salt", "--format", "ndjson", "-b"],
+    )
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert e_info.value.code == 1
+    cli_output, _ = capfd.readouterr()
+    records = [json.loads(line) for line in cli_output.splitlines()]
+    assert records[0] == {"line": 1, "result": EXAMPLE_DATASET[0].get("salt")}
+    assert records[1]["line"] == 2
+    assert "Unrecognized ciphertext" in records[1]["error"]
+
+
+def test_cli_serve(monkeypatch, mocker, tmp_path):
+    key_file = tmp_path / "keys"
+    key_file.write_text(f"new:{F5MKU_K_NEW}\n\n")
+    make_server = mocker.patch("f5mkupy.server.make_server")
+    make_server.return_value.serve_forever.side_effect = KeyboardInterrupt
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "serve",
+            "-k",
+            F5MKU_K,
+            "--key-file",
+            str(key_file),
+            "--socket",
+            str(tmp_path / "f5mkupy.sock"),
+        ],
+    )
+    cli()
+    make_server.assert_called_once_with(
+        {"default": F5MKU_K, "new": F5MKU_K_NEW},
+        path=str(tmp_path / "f5mkupy.sock"),
+        host="127.0.0.1",
+        port=None,
+    )
+    assert make_server.return_value.server_close.called is True
+
+
+def test_cli_serve_requires_key(monkeypatch):
+    monkeypatch.setattr(
+        sys, "argv", ["/path/to/program_name", "serve", "--port", "8080"]
+    )
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert "at least one key is required" in str(e_info.value)
+
+
+def test_cli_serve_rejects_non_loopback_host(monkeypatch):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "serve",
+            "-k",
+            F5MKU_K,
+            "--port",
+            "8080",
+            "--host",
+            "0.0.0.0",
+        ],
+    )
+    with pytest.raises(SystemExit) as e_info:
+        cli()
+    assert "non-loopback address 0.0.0.0" in str(e_info.value)
+
+
+def test_cli_stats(monkeypatch, capfd):
+    example = EXAMPLE_DATASET[0]
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "--stats",
+            "decrypt",
+            "-k",
+            F5MKU_K,
+            example["ciphertext_raw"],
+        ],
+    )
+    cli()
+    cli_output, cli_err = capfd.readouterr()
+    assert cli_output.rstrip() == example["plaintext"]
+    stages = [line.split(":")[0] for line in cli_err.splitlines()]
+    assert {"crypt", "decode", "parse", "unpad"} <= set(stages)
+    from f5mkupy.metrics import get_metrics  # pylint: disable=import-outside-toplevel
+
+    assert get_metrics() is None
+
+
+def test_cli_rewrite_salt_context(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "bigip.conf"
+    source.write_text(PARTIAL_BIGIP_CONF)
+    outputs = []
+    for target in [tmp_path / "first.conf", tmp_path / "second.conf"]:
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "/path/to/program_name",
+                "rewrite",
+                "-k",
+                F5MKU_K,
+                "-t",
+                F5MKU_K_NEW,
+                "--salt-context",
+                "-o",
+                str(target),
+                str(source),
+            ],
+        )
+        cli()
+        outputs.append(target.read_text())
+    assert outputs[0] == outputs[1]
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "encrypt",
+            "-k",
+            F5MKU_K_NEW,
+            "--salt-context",
+            "sys file ssl-key rsa.key passphrase",
+            "RSASecretKey",
+        ],
+    )
+    cli()
+    cli_output, _ = capfd.readouterr()
+    assert cli_output.rstrip() in outputs[0]
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "rewrite",
+            "-k",
+            F5MKU_K,
+            "--salt-prefix",
+            "x",
+            str(source),
+        ],
+    )
+    with pytest.raises(SystemExit, match="requires --target-f5mku"):
+        cli()
+
+
+def test_cli_rewrite_salt_prefix(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "bigip.conf"
+    source.write_text(PARTIAL_BIGIP_CONF)
+    target = tmp_path / "target.conf"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "/path/to/program_name",
+            "rewrite",
+            "-k",
+            F5MKU_K,
+            "-t",
+            F5MKU_K_NEW,
+            "--salt-prefix",
+            "bigip1",
+            "-o",
+            str(target),
+            str(source),
+        ],
+    )
+    cli()
+    _, cli_err = capfd.readouterr()
+    assert cli_err.rstrip() == "found: 5, converted: 5, failed: 0"
+    assert target.read_text() == "".join(
+        line.decode()
+        for line in rewrite_lines(
+            PARTIAL_BIGIP_CONF.encode().splitlines(keepends=True),
+            F5MKU_K,
+            F5MKU_K_NEW,
+            salt_context="bigip1 ",
+        )
+    )
+
+
+def test_cli_redact(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "bigip.conf"
+    source.write_text(PARTIAL_BIGIP_CONF)
+    monkeypatch.setattr(sys, "argv", ["/path/to/program_name", "redact", str(source)])
+    cli()
+    cli_output, cli_err = capfd.readouterr()
+    assert cli_err.rstrip() == "redacted: 5"
+    assert cli_output.count("[REDACTED:") == 5
+    for ciphertext in PARTIAL_BIGIP_CONF_SECRETS:
+        assert ciphertext not in cli_output
+
+
+def test_cli_redact_archive(monkeypatch, capfd, tmp_path):
+    source = tmp_path / "backup.ucs"
+    with tarfile.open(source, "w:gz") as archive:
+        info = tarfile.TarInfo("config/bigip.conf")
+        info.size = len(PARTIAL_BIGIP_CONF)
+        archive.addfile(info, io.BytesIO(PARTIAL_BIGIP_CONF.encode()))
+    target = tmp_path / "redacted.ucs"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["/path/to/program_name", "redact", "-o", str(target), str(source)],
+    )
+    cli()
+    _, cli_err = capfd.readouterr()
+    assert cli_err.rstrip() == "config/bigip.conf: redacted: 5"
+    with tarfile.open(target, "r:gz") as archive:
+        redacted = archive.extractfile("config/bigip.conf").read().decode()
+    assert redacted.count("[REDACTED:") == 5
+
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["/path/to/program_name", "redact", "-m", "config/bigip.conf", str(source)],
+    )
+    cli()
+    cli_output, cli_err = capfd.readouterr()
+    assert cli_output == redacted
+    assert cli_err.rstrip() == "config/bigip.conf: redacted: 5"
+
+    for argv, error in [
+        (["redact", str(source)], "--output or --member is required for archives"),
+        (["redact", "-m", "config/missing.conf", str(source)], "no bigip*.conf member"),
+    ]:
+        monkeypatch.setattr(sys, "argv", ["/path/to/program_name", *argv])
+        with pytest.raises(SystemExit, match=re.escape(error)):
+            cli()
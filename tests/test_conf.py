@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import os
+import stat
+
+import pytest
+
+from f5mkupy.conf import (
+    RewriteStats,
+    RotateStats,
+    _line_aligned_chunks,
+    find_ciphertexts,
+    find_config_files,
+    identify_config_keys,
+    iter_stanzas,
+    read_lines,
+    rewrite_file,
+    rewrite_files,
+    rewrite_lines,
+    rotate_key,
+    write_lines,
+)
+from f5mkupy.f5mku import F5MkuCipher, decrypt
+
+from .testdata import (
+    F5MKU_K,
+    F5MKU_K_NEW,
+    PARTIAL_BIGIP_CONF,
+    PARTIAL_BIGIP_CONF_SECRETS,
+)
+
+
+@pytest.fixture(name="bigip_conf")
+def fixture_bigip_conf(tmp_path):
+    path = tmp_path / "bigip.conf"
+    path.write_bytes(PARTIAL_BIGIP_CONF.encode())
+    return path
+
+
+def _plaintext_conf():
+    conf = PARTIAL_BIGIP_CONF
+    for ciphertext, plaintext in PARTIAL_BIGIP_CONF_SECRETS.items():
+        conf = conf.replace(ciphertext, plaintext)
+    return conf.encode()
+
+
+class Test_find_ciphertexts:
+    def test_function(self):
+        assert find_ciphertexts(b"    passphrase $M$ot$tjQRL4+Md7egq3uxcYIN8g==\n") == [
+            b"$M$ot$tjQRL4+Md7egq3uxcYIN8g=="
+        ]
+
+    def test_multiple(self):
+        assert find_ciphertexts(
+            b"a $M$ot$tjQRL4+Md7egq3uxcYIN8g== b $M$94$JoV46NWhBTc2/C8iEiq+bQ== }"
+        ) == [b"$M$ot$tjQRL4+Md7egq3uxcYIN8g==", b"$M$94$JoV46NWhBTc2/C8iEiq+bQ=="]
+
+    def test_no_match(self):
+        assert find_ciphertexts(b"    mode 33184\n") == []
+
+
+class Test_iter_stanzas:
+    def test_headers(self):
+        stanzas = list(
+            iter_stanzas(PARTIAL_BIGIP_CONF.encode().splitlines(keepends=True))
+        )
+        assert [(s.header, s.line, len(s.lines)) for s in stanzas] == [
+            (b"ltm profile http http_encrypted_cookie", 1, 4),
+            (b"ltm persistence cookie encrypted_cookie_persistence", 5, 4),
+            (b"sys snmp", 9, 11),
+            (b"sys file ssl-key rsa.key", 20, 9),
+        ]
+        assert (
+            b"".join(line for s in stanzas for line in s.lines)
+            == PARTIAL_BIGIP_CONF.encode()
+        )
+
+    def test_offsets(self):
+        conf = PARTIAL_BIGIP_CONF.encode()
+        for stanza in iter_stanzas(conf.splitlines(keepends=True)):
+            assert conf[stanza.offset :].startswith(stanza.lines[0])
+
+    def test_unindented_irule_and_quoted_braces(self):
+        lines = [
+            b"#TMSH-VERSION: 15.1.0\n",
+            b"\n",
+            b"ltm rule /Common/rule {\n",
+            b"when HTTP_REQUEST {\n",
+            b'    log local0. "}"\n',
+            b"    set brace \\{\n",
+            b"}\n",
+            b"}\n",
+            b"ltm node /Common/node { }\n",
+        ]
+        stanzas = list(iter_stanzas(lines))
+        assert [(s.header, s.line, s.lines) for s in stanzas] == [
+            (b"#TMSH-VERSION: 15.1.0", 1, lines[0:2]),
+            (b"ltm rule /Common/rule", 3, lines[2:8]),
+            (b"ltm node /Common/node { }", 9, lines[8:]),
+        ]
+
+
+class Test_rewrite_lines:
+    def test_decrypt(self):
+        stats = RewriteStats()
+        lines = rewrite_lines(
+            PARTIAL_BIGIP_CONF.encode().splitlines(keepends=True), F5MKU_K, stats=stats
+        )
+        assert b"".join(lines) == _plaintext_conf()
+        assert stats == RewriteStats(found=5, converted=5, failed=0)
+
+    def test_reencrypt(self):
+        stats = RewriteStats()
+        lines = list(
+            rewrite_lines(
+                PARTIAL_BIGIP_CONF.encode().splitlines(keepends=True),
+                F5MKU_K,
+                target_f5mku=F5MKU_K_NEW,
+                stats=stats,
+                batch_size=3,
+            )
+        )
+        assert len(lines) == len(PARTIAL_BIGIP_CONF.splitlines())
+        ciphertexts = [
+            ciphertext.decode()
+            for line in lines
+            for ciphertext in find_ciphertexts(line)
+        ]
+        assert [decrypt(ciphertext, F5MKU_K_NEW) for ciphertext in ciphertexts] == list(
+            PARTIAL_BIGIP_CONF_SECRETS.values()
+        )
+        assert stats == RewriteStats(found=5, converted=5, failed=0)
+
+    def test_salt_context(self):
+        token = "$M$ot$tjQRL4+Md7egq3uxcYIN8g=="
+        conf = (
+            f"sys file ssl-key a.key {{\n    passphrase {token}\n}}\n"
+            f"sys file ssl-key b.key {{\n    passphrase {token}\n}}\n"
+            f"ltm profile client-ssl /Common/c {{\n    cert-key-chain {{\n        default {{\n"
+            f"            passphrase {token}\n        }}\n    }}\n}}\n"
+        ).encode()
+        cipher = F5MkuCipher(F5MKU_K_NEW)
+        expected = [
+            cipher.encrypt("RSASecretKey", context=context)
+            for context in [
+                "sys file ssl-key a.key passphrase",
+                "sys file ssl-key b.key passphrase",
+                "ltm profile client-ssl /Common/c cert-key-chain default passphrase",
+            ]
+        ]
+        assert len(set(expected)) == 3
+        for batch_size in (1, 4, 100):
+            lines = rewrite_lines(
+                conf.splitlines(keepends=True),
+                F5MKU_K,
+                target_f5mku=cipher,
+                batch_size=batch_size,
+                salt_context="",
+            )
+            assert [
+                ciphertext.decode()
+                for line in lines
+                for ciphertext in find_ciphertexts(line)
+            ] == expected
+
+    def test_failed_secrets_are_kept(self):
+        stats = RewriteStats()
+        lines = [b"    passphrase $M$ot$tjQRL4+Md7egq3uxcYIN8g==\n"]
+        assert list(rewrite_lines(lines, F5MKU_K_NEW, stats=stats)) == lines
+        assert stats == RewriteStats(found=1, converted=0, failed=1)
+
+    def test_is_lazy(self):
+        def _lines():
+            yield b"passphrase $M$ot$tjQRL4+Md7egq3uxcYIN8g==\n"
+            raise RuntimeError("consumed too far")
+
+        lines = rewrite_lines(_lines(), F5MKU_K, batch_size=1)
+        assert next(lines) == b"passphrase RSASecretKey\n"
+
+
+class Test_write_lines:
+    def test_function(self, tmp_path):
+        path = tmp_path / "out.conf"
+        write_lines([b"a\n", b"b\n"], path)
+        assert path.read_bytes() == b"a\nb\n"
+        assert os.listdir(tmp_path) == ["out.conf"]
+
+    def test_keeps_original_on_error(self, tmp_path):
+        path = tmp_path / "out.conf"
+        path.write_bytes(b"original\n")
+
+        def _lines():
+            yield b"partial\n"
+            raise RuntimeError("failure while writing")
+
+        with pytest.raises(RuntimeError):
+            write_lines(_lines(), path)
+        assert path.read_bytes() == b"original\n"
+        assert os.listdir(tmp_path) == ["out.conf"]
+
+    def test_keeps_file_mode(self, tmp_path):
+        path = tmp_path / "out.conf"
+        path.write_bytes(b"original\n")
+        os.chmod(path, 0o640)
+        write_lines([b"new\n"], path)
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+class Test_rewrite_file:
+    def test_target(self, bigip_conf, tmp_path):
+        target = tmp_path / "target.conf"
+        stats = rewrite_file(bigip_conf, F5MKU_K, target=target)
+        assert target.read_bytes() == _plaintext_conf()
+        assert stats.converted == 5
+
+    def test_in_place(self, bigip_conf):
+        rewrite_file(bigip_conf, F5MKU_K, target_f5mku=F5MKU_K_NEW, target=bigip_conf)
+        rewrite_file(bigip_conf, F5MKU_K_NEW, target=bigip_conf)
+        assert bigip_conf.read_bytes() == _plaintext_conf()
+
+    def test_stdout(self, bigip_conf, capfdbinary):
+        rewrite_file(bigip_conf, F5MKU_K)
+        out, _ = capfdbinary.readouterr()
+        assert out == _plaintext_conf()
+
+    def test_salt_context(self, bigip_conf, tmp_path):
+        targets = [tmp_path / "first.conf", tmp_path / "second.conf"]
+        for target in targets:
+            rewrite_file(
+                bigip_conf, F5MKU_K, F5MKU_K_NEW, target=target, salt_context=""
+            )
+        assert targets[0].read_bytes() == targets[1].read_bytes()
+        rewrite_file(targets[0], F5MKU_K_NEW, target=targets[0])
+        assert targets[0].read_bytes() == _plaintext_conf()
+        cipher = F5MkuCipher(F5MKU_K_NEW)
+        assert (
+            cipher.encrypt(
+                "auth_secret", context="sys snmp users snmp_user auth-password"
+            )
+            in targets[1].read_text()
+        )
+        rewrite_file(
+            bigip_conf, F5MKU_K, F5MKU_K_NEW, target=targets[0], salt_context="host1 "
+        )
+        assert targets[0].read_bytes() != targets[1].read_bytes()
+
+    def test_read_lines(self, bigip_conf):
+        assert b"".join(read_lines(bigip_conf)) == PARTIAL_BIGIP_CONF.encode()
+
+
+@pytest.fixture(name="config_dir")
+def fixture_config_dir(tmp_path):
+    config_dir = tmp_path / "config"
+    (config_dir / "partitions" / "tenant").mkdir(parents=True)
+    for path in [
+        config_dir / "bigip.conf",
+        config_dir / "bigip_base.conf",
+        config_dir / "partitions" / "tenant" / "bigip.conf",
+    ]:
+        path.write_bytes(PARTIAL_BIGIP_CONF.encode())
+    (config_dir / "other.conf").write_bytes(PARTIAL_BIGIP_CONF.encode())
+    return config_dir
+
+
+class Test_find_config_files:
+    def test_function(self, config_dir, bigip_conf):
+        assert find_config_files([config_dir, str(bigip_conf)]) == [
+            (str(config_dir / "bigip.conf"), "bigip.conf"),
+            (str(config_dir / "bigip_base.conf"), "bigip_base.conf"),
+            (
+                str(config_dir / "partitions" / "tenant" / "bigip.conf"),
+                os.path.join("partitions", "tenant", "bigip.conf"),
+            ),
+            (str(bigip_conf), "bigip.conf"),
+        ]
+
+    def test_glob_characters_in_directory(self, tmp_path):
+        config_dir = tmp_path / "config[1]"
+        config_dir.mkdir()
+        (config_dir / "bigip.conf").write_bytes(PARTIAL_BIGIP_CONF.encode())
+        assert find_config_files([config_dir]) == [
+            (str(config_dir / "bigip.conf"), "bigip.conf")
+        ]
+
+
+class Test_line_aligned_chunks:
+    def test_function(self, bigip_conf):
+        chunks = _line_aligned_chunks(bigip_conf, chunk_size=100)
+        content = bigip_conf.read_bytes()
+        assert len(chunks) > 1
+        assert chunks[0][0] == 0
+        assert chunks[-1][1] == len(content)
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            assert end == start
+            assert content[end - 1 : end] == b"\n"
+
+    def test_empty_file(self, tmp_path):
+        path = tmp_path / "empty.conf"
+        path.write_bytes(b"")
+        assert _line_aligned_chunks(path) == [(0, 0)]
+
+
+class Test_rewrite_files:
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_output_dir(self, config_dir, tmp_path, workers):
+        output_dir = tmp_path / "output"
+        summary = rewrite_files(
+            [config_dir],
+            F5MKU_K,
+            output_dir=output_dir,
+            workers=workers,
+            chunk_size=64,
+        )
+        assert len(summary) == 3
+        for stats in summary.values():
+            assert stats == RewriteStats(found=5, converted=5, failed=0)
+        for relative_path in [
+            "bigip.conf",
+            "bigip_base.conf",
+            os.path.join("partitions", "tenant", "bigip.conf"),
+        ]:
+            assert (output_dir / relative_path).read_bytes() == _plaintext_conf()
+        assert not (output_dir / "other.conf").exists()
+
+    def test_in_place_reencrypt(self, config_dir):
+        summary = rewrite_files(
+            [config_dir],
+            F5MkuCipher(F5MKU_K),
+            target_f5mku=F5MkuCipher(F5MKU_K_NEW),
+            workers=2,
+            chunk_size=128,
+        )
+        assert len(summary) == 3
+        rewrite_files([config_dir], F5MKU_K_NEW, workers=1)
+        assert (config_dir / "bigip_base.conf").read_bytes() == _plaintext_conf()
+        assert (config_dir / "other.conf").read_bytes() == PARTIAL_BIGIP_CONF.encode()
+
+    def test_salt_context(self, config_dir, tmp_path):
+        rewrite_files(
+            [config_dir],
+            F5MKU_K,
+            target_f5mku=F5MKU_K_NEW,
+            output_dir=tmp_path / "output",
+            workers=2,
+            chunk_size=64,
+            salt_context="",
+        )
+        expected = tmp_path / "expected.conf"
+        rewrite_file(
+            config_dir / "bigip.conf",
+            F5MKU_K,
+            F5MKU_K_NEW,
+            target=expected,
+            salt_context="",
+        )
+        assert (
+            tmp_path / "output" / "bigip.conf"
+        ).read_bytes() == expected.read_bytes()
+
+
+class Test_rotate_key:
+    def test_keep_salt(self, bigip_conf, tmp_path):
+        target = tmp_path / "target.conf"
+        stats = rotate_key(bigip_conf, F5MKU_K, F5MKU_K_NEW, target=target)
+        assert stats == RotateStats(
+            found=5,
+            converted=5,
+            failed=0,
+            source_size=len(PARTIAL_BIGIP_CONF),
+            target_size=len(PARTIAL_BIGIP_CONF),
+            secret_bytes=sum(len(token) for token in PARTIAL_BIGIP_CONF_SECRETS),
+        )
+        rotated = target.read_text()
+        assert target.stat().st_size == stats.target_size
+        expected = PARTIAL_BIGIP_CONF
+        cipher = F5MkuCipher(F5MKU_K_NEW)
+        for token, plaintext in PARTIAL_BIGIP_CONF_SECRETS.items():
+            salt = token.split("$")[2]
+            expected = expected.replace(token, cipher.encrypt(plaintext, salt=salt))
+        assert rotated == expected
+        assert bigip_conf.read_text() == PARTIAL_BIGIP_CONF
+
+    def test_new_salt_in_place(self, bigip_conf):
+        bigip_conf.chmod(0o640)
+        stats = rotate_key(bigip_conf, F5MKU_K, F5MKU_K_NEW, keep_salt=False)
+        assert stats.converted == 5
+        assert stat.S_IMODE(bigip_conf.stat().st_mode) == 0o640
+        rewrite_file(bigip_conf, F5MKU_K_NEW, target=bigip_conf)
+        assert bigip_conf.read_bytes() == _plaintext_conf()
+
+    def test_dry_run(self, bigip_conf, tmp_path):
+        target = tmp_path / "target.conf"
+        stats = rotate_key(
+            bigip_conf, F5MKU_K, F5MKU_K_NEW, target=target, dry_run=True
+        )
+        assert (stats.found, stats.converted, stats.failed) == (5, 5, 0)
+        assert not target.exists()
+        assert bigip_conf.read_text() == PARTIAL_BIGIP_CONF
+
+    def test_failed_kept(self, bigip_conf, tmp_path):
+        target = tmp_path / "target.conf"
+        stats = rotate_key(bigip_conf, F5MKU_K_NEW, F5MKU_K, target=target)
+        assert (stats.found, stats.converted, stats.failed) == (5, 0, 5)
+        assert target.read_text() == PARTIAL_BIGIP_CONF
+
+    @pytest.mark.parametrize("copy_file_range", [True, False])
+    def test_large_file(self, tmp_path, monkeypatch, copy_file_range):
+        if not copy_file_range:
+            monkeypatch.delattr(os, "copy_file_range", raising=False)
+        monkeypatch.setattr("f5mkupy.conf._COPY_SIZE", 1000)
+        source = tmp_path / "bigip.conf"
+        source.write_text(PARTIAL_BIGIP_CONF * 100)
+        target = tmp_path / "target.conf"
+        stats = rotate_key(source, F5MKU_K, F5MKU_K_NEW, target=target, batch_size=7)
+        assert stats.converted == 500
+        rewrite_file(target, F5MKU_K_NEW, target=target)
+        assert target.read_bytes() == _plaintext_conf() * 100
+
+    def test_empty_file(self, tmp_path):
+        source = tmp_path / "bigip.conf"
+        source.write_bytes(b"")
+        assert rotate_key(source, F5MKU_K, F5MKU_K_NEW) == RotateStats()
+        assert source.read_bytes() == b""
+
+
+class Test_identify_config_keys:
+    def test_function(self, bigip_conf, tmp_path):
+        config_dir = tmp_path / "config"
+        config_dir.mkdir()
+        rotate_key(bigip_conf, F5MKU_K, F5MKU_K_NEW, target=config_dir / "bigip.conf")
+        (config_dir / "bigip_base.conf").write_text("ltm node n {\n}\n")
+        assert identify_config_keys(
+            [bigip_conf, config_dir],
+            {"old": F5MKU_K, "new": F5MKU_K_NEW},
+            sample_size=2,
+        ) == {
+            str(bigip_conf): "old",
+            str(config_dir / "bigip.conf"): "new",
+            str(config_dir / "bigip_base.conf"): None,
+        }
+
+    def test_candidate_list(self, bigip_conf):
+        assert identify_config_keys([bigip_conf], [F5MKU_K_NEW, F5MKU_K]) == {
+            str(bigip_conf): F5MKU_K
+        }
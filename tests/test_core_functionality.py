@@ -1,8 +1,31 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
-from f5mkupy.f5mku import decrypt, encrypt, extract_salt
+import re
+import threading
+from base64 import b64decode
 
-from .testdata import EXAMPLE_DATASET, F5MKU_K
+import pytest
+
+from f5mkupy.f5mku import (
+    F5MkuCipher,
+    Validation,
+    compare_many,
+    decrypt,
+    decrypt_bytes,
+    decrypt_many,
+    decrypt_many_bytes,
+    derive_salt,
+    encrypt,
+    encrypt_bytes,
+    encrypt_many,
+    extract_salt,
+    matches,
+    validate,
+    validate_many,
+)
+from f5mkupy.metrics import disable_metrics, enable_metrics
+
+from .testdata import EXAMPLE_DATASET, F5MKU_K, F5MKU_K_NEW
 
 
 class Test_Extract_Salt:
@@ -41,6 +64,32 @@ class Test_Encrypt:
         )
         assert isinstance(_ciphertext, str)
 
+    def test_context(self):
+        context = "ltm profile client-ssl /Common/foo passphrase"
+        _ciphertext = encrypt(plaintext="KEY45678", f5mku=F5MKU_K, context=context)
+        assert _ciphertext == "$M$k9$AJd7tBWwtXB4T48PKqyAjw=="
+        assert _ciphertext == F5MkuCipher(F5MKU_K).encrypt("KEY45678", context=context)
+        assert decrypt(ciphertext=_ciphertext, f5mku=F5MKU_K) == "KEY45678"
+        assert encrypt("KEY45678", F5MKU_K, salt="ab", context=context).startswith(
+            "$M$ab$"
+        )
+
+
+class Test_Derive_Salt:
+    def test_function(self):
+        salt = derive_salt("sys snmp users snmp_user auth-password", F5MKU_K)
+        assert salt == derive_salt(b"sys snmp users snmp_user auth-password", F5MKU_K)
+        assert len(salt) == 2 and salt.isalnum() and salt.isascii()
+        assert len(derive_salt("context", F5MKU_K, length=8)) == 8
+
+    def test_keyed(self):
+        contexts = [
+            f"ltm profile client-ssl /Common/p{index} passphrase" for index in range(32)
+        ]
+        salts = [derive_salt(context, F5MKU_K) for context in contexts]
+        assert len(set(salts)) > 16
+        assert salts != [derive_salt(context, F5MKU_K_NEW) for context in contexts]
+
 
 class Test_Decrypt:
     def test_function(self):
@@ -55,3 +104,373 @@ class Test_Decrypt:
         example = EXAMPLE_DATASET[1]
         _plaintext = decrypt(ciphertext=example.get("ciphertext_raw"), f5mku=F5MKU_K)
         assert isinstance(_plaintext, str)
+
+
+class Test_F5MkuCipher:
+    def test_encrypt(self):
+        cipher = F5MkuCipher(F5MKU_K)
+        for example in EXAMPLE_DATASET:
+            _ciphertext = cipher.encrypt(
+                plaintext=example.get("plaintext"), salt=example.get("salt")
+            )
+            assert _ciphertext == example.get("ciphertext_raw")
+
+    def test_decrypt(self):
+        cipher = F5MkuCipher(F5MKU_K)
+        for example in EXAMPLE_DATASET:
+            assert cipher.decrypt(example.get("ciphertext_raw")) == example.get(
+                "plaintext"
+            )
+
+    def test_roundtrip_random_salt(self):
+        cipher = F5MkuCipher(F5MKU_K)
+        for example in EXAMPLE_DATASET:
+            _ciphertext = cipher.encrypt(example.get("plaintext"))
+            assert cipher.decrypt(_ciphertext) == example.get("plaintext")
+
+    def test_extract_salt(self):
+        assert F5MkuCipher(F5MKU_K).extract_salt("$M$salt$Y2lwaGVydGV4dA==") == "salt"
+
+    def test_module_functions_accept_cipher(self):
+        cipher = F5MkuCipher(F5MKU_K)
+        example = EXAMPLE_DATASET[0]
+        assert decrypt(example.get("ciphertext_raw"), cipher) == example.get(
+            "plaintext"
+        )
+        assert encrypt(
+            example.get("plaintext"), cipher, salt=example.get("salt")
+        ) == example.get("ciphertext_raw")
+
+    def test_invalid_key(self):
+        with pytest.raises(ValueError):
+            F5MkuCipher("invalid_key")
+
+    def test_unaligned_ciphertext_does_not_corrupt_context(self):
+        cipher = F5MkuCipher(F5MKU_K)
+        with pytest.raises(ValueError) as e_info:
+            cipher.decrypt("$M$iP$Y2lwaGVydGV4dA==")
+        assert "not a multiple of the block size" in str(e_info.value)
+        example = EXAMPLE_DATASET[3]
+        assert cipher.decrypt(example.get("ciphertext_raw")) == example.get("plaintext")
+
+    def test_wrong_key(self):
+        cipher = F5MkuCipher("ukDKiN3j4YfWPI8FPbZLoA==")
+        with pytest.raises(ValueError):
+            for example in EXAMPLE_DATASET:
+                cipher.decrypt(example.get("ciphertext_raw"))
+
+    def test_threads(self):
+        cipher = F5MkuCipher(F5MKU_K)
+        results = []
+
+        def worker():
+            for example in EXAMPLE_DATASET * 50:
+                results.append(
+                    cipher.decrypt(example.get("ciphertext_raw"))
+                    == example.get("plaintext")
+                )
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 4 * 50 * len(EXAMPLE_DATASET)
+        assert all(results)
+
+    def test_repr_hides_key(self):
+        assert F5MKU_K not in repr(F5MkuCipher(F5MKU_K))
+
+    def test_decrypt_blocks(self):
+        cipher = F5MkuCipher(F5MKU_K)
+        _, _, salt, ciphertext = EXAMPLE_DATASET[0].get("ciphertext_raw").split("$")
+        block = b64decode(ciphertext)[:16]
+        assert cipher.decrypt_blocks(block).startswith(salt.encode())
+        with pytest.raises(ValueError):
+            cipher.decrypt_blocks(block[:15])
+
+
+class Test_Encrypt_Many:
+    def test_function_predefined_salt(self):
+        results = encrypt_many(
+            [example.get("plaintext") for example in EXAMPLE_DATASET],
+            F5MKU_K,
+            salts=[example.get("salt") for example in EXAMPLE_DATASET],
+        )
+        assert [result.value for result in results] == [
+            example.get("ciphertext_raw") for example in EXAMPLE_DATASET
+        ]
+        assert all(result.error is None for result in results)
+
+    def test_function_random_salt(self):
+        plaintexts = [example.get("plaintext") for example in EXAMPLE_DATASET]
+        results = encrypt_many(plaintexts, F5MKU_K)
+        assert [decrypt(result.value, F5MKU_K) for result in results] == plaintexts
+
+    def test_mixed_salts(self):
+        example = EXAMPLE_DATASET[0]
+        results = encrypt_many(
+            [example.get("plaintext")] * 2, F5MKU_K, salts=[None, example.get("salt")]
+        )
+        assert results[1].value == example.get("ciphertext_raw")
+        assert decrypt(results[0].value, F5MKU_K) == example.get("plaintext")
+
+    def test_salts_length_mismatch(self):
+        with pytest.raises(ValueError):
+            encrypt_many(["a", "b"], F5MKU_K, salts=["ab"])
+
+    def test_empty(self):
+        assert encrypt_many([], F5MKU_K) == []
+
+
+class Test_Decrypt_Many:
+    def test_function(self):
+        results = decrypt_many(
+            (example.get("ciphertext_raw") for example in EXAMPLE_DATASET), F5MKU_K
+        )
+        assert [result.value for result in results] == [
+            example.get("plaintext") for example in EXAMPLE_DATASET
+        ]
+        assert all(result.error is None for result in results)
+
+    def test_per_item_errors(self):
+        ciphertexts = [
+            EXAMPLE_DATASET[0].get("ciphertext_raw"),
+            "$X$salt$Y2lwaGVydGV4dA==",
+            "$M$iP$Y2lwaGVydGV4dA==",
+            "$M$xx$rr0su9oHn9J9p1t3nRzydA==",
+            EXAMPLE_DATASET[3].get("ciphertext_raw"),
+        ]
+        results = decrypt_many(ciphertexts, F5MKU_K)
+        assert results[0].value == EXAMPLE_DATASET[0].get("plaintext")
+        assert results[4].value == EXAMPLE_DATASET[3].get("plaintext")
+        for result in results[1:4]:
+            assert result.value is None
+            assert isinstance(result.error, ValueError)
+        assert "does not start with salt" in str(results[3].error)
+
+    def test_skips_invalid_before_decryption(self):
+        ciphertext = EXAMPLE_DATASET[0].get("ciphertext_raw")
+        active = enable_metrics()
+        try:
+            results = decrypt_many(
+                [ciphertext, ciphertext[:-2] + "!=", "$M$iP$Y2lw", None], F5MKU_K
+            )
+        finally:
+            disable_metrics()
+        assert results[0].value == EXAMPLE_DATASET[0].get("plaintext")
+        assert [str(result.error) for result in results[1:]] == [
+            "Unrecognized ciphertext: Ciphertext is not valid base64.",
+            "Ciphertext length is not a multiple of the block size.",
+            "Unrecognized ciphertext: Ciphertext is to have 4 elements, separated by '$' char.",
+        ]
+        assert active.latencies["crypt"].items == 1
+        assert "decode" in active.latencies
+
+    def test_wrong_key(self):
+        results = decrypt_many(
+            [example.get("ciphertext_raw") for example in EXAMPLE_DATASET],
+            "ukDKiN3j4YfWPI8FPbZLoA==",
+        )
+        assert all(isinstance(result.error, ValueError) for result in results)
+
+    def test_empty(self):
+        assert decrypt_many([], F5MKU_K) == []
+
+
+class Test_Validate:
+    def test_ok(self):
+        for example in EXAMPLE_DATASET:
+            assert validate(example.get("ciphertext_raw")) is Validation.OK
+
+    @pytest.mark.parametrize(
+        "ciphertext,expected",
+        [
+            ("$M$iP$rr0su9oHn9J9p1t3nRzydA==$", Validation.BAD_FORMAT),
+            ("plaintext", Validation.BAD_FORMAT),
+            (b"$M$iP$rr0su9oHn9J9p1t3nRzydA==", Validation.BAD_FORMAT),
+            ("$X$iP$rr0su9oHn9J9p1t3nRzydA==", Validation.BAD_PREFIX),
+            ("M$M$iP$rr0su9oHn9J9p1t3nRzydA==", Validation.BAD_PREFIX),
+            ("x$M$rr0su9oHn9J9p1t3nRzydA==", Validation.BAD_FORMAT),
+            ("x$M$iP$rr0su9oHn9J9p1t3nRzydA==", Validation.BAD_PREFIX),
+            ("$M$$rr0su9oHn9J9p1t3nRzydA==", Validation.BAD_SALT),
+            ("$M$iP$rr0su9oHn9J9p1t3nRzydA=", Validation.BAD_BASE64),
+            ("$M$iP$rr0su9oHn9J9p1t3nRzydA", Validation.BAD_BASE64),
+            ("$M$iP$rr0su9oHn9J9p1t3nRzyd===", Validation.BAD_BASE64),
+            ("$M$iP$rr0su9oHn9J9p1t3nRz=dA==", Validation.BAD_BASE64),
+            ("$M$iP$rr0su9oHn9J9p1t3 nRzydA=", Validation.BAD_BASE64),
+            ("$M$iP$rr0su9oHn9J9p1t3nRzydÄ==", Validation.BAD_BASE64),
+            ("$M$iP$", Validation.NOT_BLOCK_ALIGNED),
+            ("$M$iP$Y2lwaGVydGV4dA", Validation.BAD_BASE64),
+            ("$M$iP$Y2lwaGVydGV4dGNpcGhlcnRleHQ=", Validation.NOT_BLOCK_ALIGNED),
+            (
+                "$M$iP$Y2lwaGVydGV4dGNpcGhlcnRleHRjaXBoZXJ0ZXh0Y2lwaGVydGV4dA==",
+                Validation.NOT_BLOCK_ALIGNED,
+            ),
+        ],
+    )
+    def test_codes(self, ciphertext, expected):
+        assert validate(ciphertext) is expected
+
+    def test_validate_many(self):
+        assert validate_many(
+            ["$M$iP$rr0su9oHn9J9p1t3nRzydA==", "$X$iP$", "$M$iP$not base64"]
+        ) == ["ok", "bad_prefix", "bad_base64"]
+        assert str(Validation.BAD_SALT) == "bad_salt"
+
+    def test_valid_ciphertexts_decode(self):
+        cipher = F5MkuCipher(F5MKU_K)
+        for length in range(40):
+            ciphertext = cipher.encrypt("x" * length)
+            assert validate(ciphertext) is Validation.OK
+            assert decrypt(ciphertext, cipher) == "x" * length
+
+
+class Test_Bytes_API:
+    @pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+    def test_encrypt_bytes(self, buffer_type):
+        for example in EXAMPLE_DATASET:
+            ciphertext = encrypt_bytes(
+                buffer_type(example["plaintext"].encode()),
+                F5MKU_K,
+                salt=buffer_type(example["salt"].encode()),
+            )
+            assert ciphertext == example["ciphertext_raw"].encode()
+
+    def test_encrypt_bytes_random_salt(self):
+        ciphertext = encrypt_bytes(b"secret", F5MKU_K)
+        assert decrypt(ciphertext.decode(), F5MKU_K) == "secret"
+
+    @pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+    def test_decrypt_bytes(self, buffer_type):
+        for example in EXAMPLE_DATASET:
+            plaintext = decrypt_bytes(
+                buffer_type(example["ciphertext_raw"].encode()), F5MKU_K
+            )
+            assert isinstance(plaintext, bytearray)
+            assert plaintext == example["plaintext"].encode()
+
+    def test_decrypt_bytes_errors(self):
+        with pytest.raises(ValueError):
+            decrypt_bytes(b"iP$rr0su9oHn9J9p1t3nRzydA==", F5MKU_K)
+        with pytest.raises(ValueError):
+            decrypt_bytes(b"$M$iP$YWJj", F5MKU_K)
+        with pytest.raises(ValueError):
+            decrypt_bytes(EXAMPLE_DATASET[0]["ciphertext_raw"].encode(), F5MKU_K_NEW)
+
+    def test_decrypt_into(self):
+        cipher = F5MkuCipher(F5MKU_K)
+        for example in EXAMPLE_DATASET:
+            expected = example["plaintext"].encode()
+            # large enough to decrypt in place, too small for the ciphertext
+            for buffer in (bytearray(b"x" * 128), bytearray(len(expected))):
+                length = cipher.decrypt_into(
+                    memoryview(example["ciphertext_raw"].encode()), buffer
+                )
+                assert buffer[:length] == expected
+                # no decrypted bytes are left behind the plaintext
+                assert set(buffer[length:]) <= {0, ord("x")}
+
+    def test_decrypt_into_too_small(self):
+        example = EXAMPLE_DATASET[0]
+        buffer = bytearray(len(example["plaintext"]) - 1)
+        with pytest.raises(ValueError):
+            F5MkuCipher(F5MKU_K).decrypt_into(
+                example["ciphertext_raw"].encode(), buffer
+            )
+        assert buffer == bytes(len(buffer))
+
+    def test_decrypt_many_bytes(self):
+        ciphertexts = [
+            example["ciphertext_raw"].encode() for example in EXAMPLE_DATASET
+        ]
+        ciphertexts.insert(1, b"$M$ab$YWJj")
+        results = decrypt_many_bytes(ciphertexts, F5MKU_K)
+        assert isinstance(results[1].error, ValueError)
+        assert [result.value for result in results[:1] + results[2:]] == [
+            example["plaintext"].encode() for example in EXAMPLE_DATASET
+        ]
+        assert decrypt_many_bytes([], F5MKU_K) == []
+
+    def test_bytes_and_str_agree(self):
+        malformed = [
+            "$M$iP$rr0su9oHn9J9p1t3nRzydA",  # missing padding
+            "$M$iP$rr0su9oHn9J9p1t3nRzy dA==",  # not base64
+            "$M$iP$YWJj",  # partial block
+            "$X$iP$rr0su9oHn9J9p1t3nRzydA==",
+            "$M$$rr0su9oHn9J9p1t3nRzydA==",
+            "$M$iP$rr0su9oHn9J9p1t3nRzydA==$",
+        ]
+        str_results = decrypt_many(malformed, F5MKU_K)
+        bytes_results = decrypt_many_bytes(
+            [ciphertext.encode() for ciphertext in malformed], F5MKU_K
+        )
+        assert validate_many(malformed) == [
+            Validation.BAD_BASE64,
+            Validation.BAD_BASE64,
+            Validation.NOT_BLOCK_ALIGNED,
+            Validation.BAD_PREFIX,
+            Validation.BAD_SALT,
+            Validation.BAD_FORMAT,
+        ]
+        assert [str(result.error) for result in bytes_results] == [
+            str(result.error) for result in str_results
+        ]
+        for ciphertext, result in zip(malformed, str_results):
+            with pytest.raises(ValueError, match=re.escape(str(result.error))):
+                decrypt_bytes(ciphertext.encode(), F5MKU_K)
+
+
+class Test_Matches:
+    def test_function(self):
+        for example in EXAMPLE_DATASET:
+            assert matches(
+                example.get("plaintext"), example.get("ciphertext_raw"), F5MKU_K
+            )
+
+    def test_mismatch(self):
+        example = EXAMPLE_DATASET[0]
+        assert not matches("KEY45679", example.get("ciphertext_raw"), F5MKU_K)
+        assert not matches(
+            example.get("plaintext") + "x", example.get("ciphertext_raw"), F5MKU_K
+        )
+        assert not matches(
+            example.get("plaintext"),
+            example.get("ciphertext_raw"),
+            "ukDKiN3j4YfWPI8FPbZLoA==",
+        )
+
+    def test_invalid_ciphertext(self):
+        with pytest.raises(ValueError):
+            matches("KEY45678", "$M$iP$Y2lwaGVydGV4dA==", F5MKU_K)
+        with pytest.raises(ValueError):
+            matches("KEY45678", "not a ciphertext", F5MKU_K)
+
+
+class Test_Compare_Many:
+    def test_function(self):
+        pairs = [
+            (example.get("plaintext"), example.get("ciphertext_raw"))
+            for example in EXAMPLE_DATASET
+        ]
+        pairs.append(("wrong", EXAMPLE_DATASET[0].get("ciphertext_raw")))
+        pairs.append(("any", "$X$invalid"))
+        results = compare_many(pairs, F5MkuCipher(F5MKU_K))
+        assert [result.value for result in results] == [True] * len(EXAMPLE_DATASET) + [
+            False,
+            None,
+        ]
+        assert isinstance(results[-1].error, ValueError)
+
+    def test_unencodable_plaintext(self):
+        ciphertext = EXAMPLE_DATASET[0].get("ciphertext_raw")
+        plaintext = EXAMPLE_DATASET[0].get("plaintext")
+        results = compare_many(
+            [(plaintext, ciphertext), ("\ud800", ciphertext), (plaintext, ciphertext)],
+            F5MKU_K,
+        )
+        assert [result.value for result in results] == [True, None, True]
+        assert isinstance(results[1].error, UnicodeEncodeError)
+
+    def test_empty(self):
+        assert compare_many([], F5MKU_K) == []
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import pytest
+
+from f5mkupy.conf import rewrite_file
+from f5mkupy.diff import StanzaDiff, diff_files
+from f5mkupy.f5mku import F5MkuCipher
+
+from .testdata import (
+    F5MKU_K,
+    F5MKU_K_NEW,
+    PARTIAL_BIGIP_CONF,
+    PARTIAL_BIGIP_CONF_SECRETS,
+)
+
+
+@pytest.fixture(name="conf_a")
+def fixture_conf_a(tmp_path):
+    path = tmp_path / "a.conf"
+    path.write_text(PARTIAL_BIGIP_CONF)
+    return path
+
+
+@pytest.fixture(name="conf_b")
+def fixture_conf_b(tmp_path, conf_a):
+    """Same config as conf_a re-encrypted with F5MKU_K_NEW and new salts."""
+    path = tmp_path / "b.conf"
+    rewrite_file(conf_a, F5MKU_K, F5MKU_K_NEW, target=path)
+    return path
+
+
+class Test_diff_files:
+    def test_reencrypted_equal(self, conf_a, conf_b):
+        assert conf_a.read_text() != conf_b.read_text()
+        assert not list(diff_files(conf_a, conf_b, F5MKU_K, F5MKU_K_NEW))
+
+    def test_same_file(self, conf_a):
+        assert not list(diff_files(conf_a, conf_a, F5MKU_K))
+
+    def test_changed_secret(self, conf_a, conf_b):
+        cipher = F5MkuCipher(F5MKU_K_NEW)
+        conf_b.write_text(
+            conf_b.read_text().replace(
+                conf_b.read_text().splitlines()[-5].split()[-1],
+                cipher.encrypt("otherSecretKey"),
+            )
+        )
+        (stanza_diff,) = diff_files(conf_a, conf_b, F5MKU_K, F5MKU_K_NEW)
+        assert stanza_diff.status == "changed"
+        assert stanza_diff.header == "sys file ssl-key rsa.key"
+        changed = [line[1:].split() for line in stanza_diff.diff if line[0] in "+-"]
+        assert [attribute for attribute, _ in changed] == ["passphrase", "passphrase"]
+        assert changed[0][1].startswith("<secret:")
+        assert changed[0][1] != changed[1][1]
+
+    def test_no_plaintext_in_diff(self, conf_a, conf_b):
+        conf_b.write_text(conf_b.read_text().replace("sys snmp", "sys snmp_other"))
+        diffs = list(diff_files(conf_a, conf_b, F5MKU_K, F5MKU_K_NEW))
+        assert [(d.status, d.header) for d in diffs] == [
+            ("added", "sys snmp_other"),
+            ("removed", "sys snmp"),
+        ]
+        output = "\n".join(line for d in diffs for line in d.diff)
+        for ciphertext, plaintext in PARTIAL_BIGIP_CONF_SECRETS.items():
+            assert ciphertext not in output
+            assert plaintext not in output
+        assert output.count("<secret:") == 4
+
+    def test_non_secret_lines(self, conf_a, conf_b):
+        conf_b.write_text(
+            conf_b.read_text().replace("    mode 33184\n", "    mode 33188\n")
+        )
+        (stanza_diff,) = diff_files(conf_a, conf_b, F5MKU_K, F5MKU_K_NEW, context=0)
+        assert stanza_diff == StanzaDiff(
+            "changed",
+            "sys file ssl-key rsa.key",
+            ["@@ -4 +4 @@", "-    mode 33184", "+    mode 33188"],
+        )
+
+    def test_order_and_blank_lines_ignored(self, conf_a, tmp_path):
+        stanzas = PARTIAL_BIGIP_CONF.split("}\nsys file")
+        reordered = tmp_path / "reordered.conf"
+        reordered.write_text("sys file" + stanzas[1] + "\n" + stanzas[0] + "}\n")
+        assert not list(diff_files(conf_a, reordered, F5MKU_K))
+
+    def test_decrypts_every_ciphertext_once(self, conf_a, conf_b, mocker):
+        conf_b.write_text(conf_b.read_text().replace("2048", "4096"))
+        decrypt_many = mocker.spy(F5MkuCipher, "decrypt_many")
+        list(diff_files(conf_a, conf_b, F5MKU_K, F5MKU_K_NEW))
+        decrypted = [
+            ciphertext
+            for call in decrypt_many.call_args_list
+            for ciphertext in call.args[1]
+        ]
+        assert len(decrypted) == len(set(decrypted)) == 10
@@ -14,6 +14,8 @@ from f5mkupy.f5mku import (
     _force_str,
     _format_ciphertext,
     _generate_salt,
+    _pkcs7_pad,
+    _pkcs7_unpad,
     _remove_salt,
     _salt_plaintext,
 )
@@ -247,3 +249,25 @@ class Test__encryptor:
             salted_plaintext=example.get("plaintext").encode(), key=b64decode(F5MKU_K)
         )
         assert isinstance(_ciphertext, bytes)
+
+
+class Test__pkcs7:
+    def test_pad(self):
+        assert _pkcs7_pad(b"") == bytes((16,)) * 16
+        assert _pkcs7_pad(b"A" * 15) == b"A" * 15 + b"\x01"
+        assert _pkcs7_pad(b"A" * 16) == b"A" * 16 + bytes((16,)) * 16
+
+    def test_unpad(self):
+        for length in range(40):
+            assert _pkcs7_unpad(_pkcs7_pad(b"A" * length)) == b"A" * length
+
+    def test_invalid_padding(self):
+        for data in [
+            b"",
+            b"A" * 15 + b"\x00",
+            b"A" * 15 + b"\x11",
+            b"A" * 14 + b"\x01\x02",
+        ]:
+            with pytest.raises(ValueError) as e_info:
+                _pkcs7_unpad(data)
+            assert str(e_info.value) == "Invalid padding bytes."
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+from f5mkupy.f5mku import F5MkuCipher, encrypt, encrypt_many
+from f5mkupy.identify import identify_key, identify_keys
+
+from .testdata import EXAMPLE_DATASET, F5MKU_K, F5MKU_K_NEW
+
+
+class Test_Identify_Key:
+    ciphertexts = [example.get("ciphertext_raw") for example in EXAMPLE_DATASET]
+
+    def test_dict(self):
+        assert (
+            identify_key(self.ciphertexts, {"new": F5MKU_K_NEW, "old": F5MKU_K})
+            == "old"
+        )
+
+    def test_iterable(self):
+        cipher = F5MkuCipher(F5MKU_K)
+        assert identify_key(self.ciphertexts, [F5MKU_K_NEW, cipher]) is cipher
+        assert identify_key(self.ciphertexts, [F5MKU_K_NEW]) is None
+
+    def test_invalid_skipped(self):
+        assert (
+            identify_key(
+                ["not a ciphertext", "$M$iP$YWJj"] + self.ciphertexts, [F5MKU_K]
+            )
+            == F5MKU_K
+        )
+        assert identify_key(["not a ciphertext"], [F5MKU_K]) is None
+
+    def test_invalid_key_skipped(self):
+        assert (
+            identify_key(self.ciphertexts, {"typo": "not a key", "old": F5MKU_K})
+            == "old"
+        )
+        assert identify_key(self.ciphertexts, ["not a key"]) is None
+
+    def test_all_samples_must_match(self):
+        mixed = [self.ciphertexts[0], encrypt("secret", F5MKU_K_NEW)]
+        assert identify_key(mixed, [F5MKU_K, F5MKU_K_NEW]) is None
+        assert identify_key(mixed, [F5MKU_K, F5MKU_K_NEW], sample_size=1) == F5MKU_K
+
+    def test_only_first_block_decrypted(self, mocker):
+        decrypt_many_spy = mocker.spy(F5MkuCipher, "decrypt_many")
+        assert identify_key(self.ciphertexts, [F5MKU_K]) == F5MKU_K
+        assert decrypt_many_spy.call_count == 0
+
+    def test_identify_keys(self):
+        groups = {
+            "old": self.ciphertexts,
+            "new": encrypt_many(["a", "b" * 40], F5MKU_K_NEW),
+            "empty": [],
+        }
+        groups["new"] = [result.value for result in groups["new"]]
+        assert identify_keys(groups, {"k1": F5MKU_K, "k2": F5MKU_K_NEW}) == {
+            "old": "k1",
+            "new": "k2",
+            "empty": None,
+        }
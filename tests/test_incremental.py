@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import json
+
+import pytest
+
+from f5mkupy.conf import rotate_key
+from f5mkupy.f5mku import encrypt
+from f5mkupy.incremental import IncrementalStats, StanzaChange, process_incremental
+
+from .testdata import (
+    F5MKU_K,
+    F5MKU_K_NEW,
+    PARTIAL_BIGIP_CONF,
+    PARTIAL_BIGIP_CONF_SECRETS,
+)
+
+
+@pytest.fixture(name="bigip_conf")
+def fixture_bigip_conf(tmp_path):
+    path = tmp_path / "bigip.conf"
+    path.write_text(PARTIAL_BIGIP_CONF)
+    return path
+
+
+@pytest.fixture(name="state")
+def fixture_state(tmp_path, bigip_conf):
+    path = tmp_path / "state.json"
+    process_incremental([bigip_conf], F5MKU_K, path)
+    return path
+
+
+class Test_process_incremental:
+    def test_first_run(self, tmp_path, bigip_conf):
+        changes, stats = process_incremental(
+            [bigip_conf], F5MKU_K, tmp_path / "state.json"
+        )
+        assert stats == IncrementalStats(stanzas=4, reused=0, processed=4, decrypted=5)
+        assert [(change.status, change.header) for change in changes] == [
+            ("added", "ltm profile http http_encrypted_cookie"),
+            ("added", "ltm persistence cookie encrypted_cookie_persistence"),
+            ("added", "sys snmp"),
+            ("added", "sys file ssl-key rsa.key"),
+        ]
+        assert changes[2].secrets == [
+            "users snmp_user auth-password",
+            "users snmp_user privacy-password",
+        ]
+
+    def test_unchanged_reused(self, bigip_conf, state, mocker):
+        decrypt_many = mocker.patch("f5mkupy.f5mku.F5MkuCipher.decrypt_many")
+        changes, stats = process_incremental([bigip_conf], F5MKU_K, state)
+        assert not changes
+        assert stats == IncrementalStats(stanzas=4, reused=4, processed=0, decrypted=0)
+        assert decrypt_many.call_count == 0
+
+    def test_full_unchanged(self, bigip_conf, state):
+        changes, stats = process_incremental([bigip_conf], F5MKU_K, state, full=True)
+        assert not changes
+        assert stats == IncrementalStats(stanzas=4, reused=0, processed=4, decrypted=5)
+
+    def test_full_reports_changes(self, bigip_conf, state):
+        bigip_conf.write_text(PARTIAL_BIGIP_CONF.replace("    mode 33184\n", ""))
+        changes, stats = process_incremental([bigip_conf], F5MKU_K, state, full=True)
+        assert changes == [
+            StanzaChange(str(bigip_conf), "changed", "sys file ssl-key rsa.key", [])
+        ]
+        assert stats.processed == 4
+
+    def test_new_salt_not_reported(self, bigip_conf, state):
+        rotate_key(bigip_conf, F5MKU_K, F5MKU_K, keep_salt=False)
+        changes, stats = process_incremental([bigip_conf], F5MKU_K, state)
+        assert not changes
+        assert stats.processed == 4
+
+    def test_changes(self, bigip_conf, state):
+        conf = PARTIAL_BIGIP_CONF.replace("    mode 33184\n", "    mode 33188\n")
+        conf = conf.replace(
+            "$M$94$JoV46NWhBTc2/C8iEiq+bQ==", encrypt("other_secret", F5MKU_K)
+        )
+        conf = conf.replace("ltm persistence cookie", "ltm persistence other")
+        bigip_conf.write_text(conf)
+        changes, stats = process_incremental([bigip_conf], F5MKU_K, state)
+        assert stats == IncrementalStats(stanzas=4, reused=1, processed=3, decrypted=4)
+        assert changes == [
+            StanzaChange(
+                str(bigip_conf),
+                "added",
+                "ltm persistence other encrypted_cookie_persistence",
+                ["cookie-encryption-passphrase"],
+            ),
+            StanzaChange(
+                str(bigip_conf),
+                "changed",
+                "sys snmp",
+                ["users snmp_user auth-password"],
+            ),
+            StanzaChange(str(bigip_conf), "changed", "sys file ssl-key rsa.key", []),
+            StanzaChange(
+                str(bigip_conf),
+                "removed",
+                "ltm persistence cookie encrypted_cookie_persistence",
+                ["cookie-encryption-passphrase"],
+            ),
+        ]
+        # the state of the run is the baseline of the next run
+        assert not process_incremental([bigip_conf], F5MKU_K, state)[0]
+
+    def test_no_plaintext_in_state(self, state):
+        content = state.read_text()
+        for plaintext in PARTIAL_BIGIP_CONF_SECRETS.values():
+            assert plaintext not in content
+        assert json.loads(content)["version"] == 1
+
+    def test_other_key_requires_full(self, bigip_conf, state):
+        rotate_key(bigip_conf, F5MKU_K, F5MKU_K_NEW)
+        with pytest.raises(ValueError, match="full rebuild"):
+            process_incremental([bigip_conf], F5MKU_K_NEW, state)
+        changes, stats = process_incremental(
+            [bigip_conf], F5MKU_K_NEW, state, full=True
+        )
+        assert stats.processed == 4
+        assert {change.status for change in changes} == {"added"}
+        assert process_incremental([bigip_conf], F5MKU_K_NEW, state)[1].reused == 4
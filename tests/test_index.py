@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import io
+import os
+import sqlite3
+import tarfile
+
+import pytest
+
+import f5mkupy.index
+from f5mkupy.index import IndexStats, SecretIndex, SecretRecord
+
+from .testdata import PARTIAL_BIGIP_CONF, PARTIAL_BIGIP_CONF_SECRETS
+
+
+@pytest.fixture(name="config_dir")
+def fixture_config_dir(tmp_path):
+    config_dir = tmp_path / "config"
+    (config_dir / "partitions" / "tenant").mkdir(parents=True)
+    (config_dir / "bigip.conf").write_text(PARTIAL_BIGIP_CONF)
+    (config_dir / "partitions" / "tenant" / "bigip.conf").write_text(
+        "ltm node /tenant/node {\n    address 10.0.0.1\n}\n"
+    )
+    return config_dir
+
+
+@pytest.fixture(name="index")
+def fixture_index(tmp_path):
+    with SecretIndex(tmp_path / "index.sqlite") as index:
+        yield index
+
+
+class Test_SecretIndex:
+    def test_update(self, index, config_dir):
+        assert index.update([config_dir]) == IndexStats(
+            indexed=2, unchanged=0, removed=0, secrets=5
+        )
+        records = index.secrets()
+        assert [record.token for record in records] == list(PARTIAL_BIGIP_CONF_SECRETS)
+        assert {record.path for record in records} == {str(config_dir / "bigip.conf")}
+        conf = PARTIAL_BIGIP_CONF.encode()
+        for record in records:
+            assert conf[record.offset :].startswith(record.token.encode())
+            assert record.token in PARTIAL_BIGIP_CONF.splitlines()[record.line - 1]
+
+    def test_objects_and_attributes(self, index, config_dir):
+        index.update([config_dir])
+        assert [(record.object, record.attribute) for record in index.secrets()] == [
+            ("ltm profile http http_encrypted_cookie", "encrypt-cookie-secret"),
+            (
+                "ltm persistence cookie encrypted_cookie_persistence",
+                "cookie-encryption-passphrase",
+            ),
+            ("sys snmp", "users snmp_user auth-password"),
+            ("sys snmp", "users snmp_user privacy-password"),
+            ("sys file ssl-key rsa.key", "passphrase"),
+        ]
+
+    def test_query(self, index, config_dir):
+        index.update([config_dir])
+        assert len(index.secrets(object="sys snmp")) == 2
+        assert len(index.secrets(attribute="*password")) == 2
+        assert len(index.secrets(path="*/partitions/*")) == 0
+        assert index.secrets(token="$M$ot$tjQRL4+Md7egq3uxcYIN8g==") == [
+            SecretRecord(
+                str(config_dir / "bigip.conf"),
+                24,
+                PARTIAL_BIGIP_CONF.index("$M$ot$"),
+                "sys file ssl-key rsa.key",
+                "passphrase",
+                "ot",
+                "tjQRL4+Md7egq3uxcYIN8g==",
+            )
+        ]
+        with pytest.raises(ValueError):
+            index.secrets(token="not a ciphertext")
+
+    def test_unchanged_files_skipped(self, index, config_dir, mocker):
+        index.update([config_dir])
+        file_sha256 = mocker.spy(f5mkupy.index, "_file_sha256")
+        assert index.update([config_dir]).unchanged == 2
+        assert file_sha256.call_count == 0
+
+        # touched but same content: hash is compared, secrets are not scanned again
+        os.utime(config_dir / "bigip.conf", ns=(0, 0))
+        scan = mocker.spy(f5mkupy.index, "stanza_secrets")
+        assert index.update([config_dir]).unchanged == 2
+        assert file_sha256.call_count == 1
+        assert scan.call_count == 0
+        assert index.files()[0][2] == 0
+
+    def test_changed_and_removed_files(self, index, config_dir):
+        index.update([config_dir])
+        (config_dir / "bigip.conf").write_text(
+            PARTIAL_BIGIP_CONF.split("sys snmp", maxsplit=1)[0]
+        )
+        (config_dir / "partitions" / "tenant" / "bigip.conf").unlink()
+        assert index.update([config_dir]) == IndexStats(
+            indexed=1, unchanged=0, removed=1, secrets=2
+        )
+        assert len(index.files()) == 1
+
+    def test_persistent(self, tmp_path, config_dir):
+        with SecretIndex(tmp_path / "index.sqlite") as index:
+            index.update([config_dir])
+        with SecretIndex(tmp_path / "index.sqlite") as index:
+            assert len(index.secrets()) == 5
+            assert index.update([config_dir]).indexed == 0
+
+    def test_unsupported_schema(self, tmp_path):
+        path = tmp_path / "index.sqlite"
+        connection = sqlite3.connect(path)
+        connection.execute("PRAGMA user_version = 99")
+        connection.close()
+        with pytest.raises(ValueError):
+            SecretIndex(path)
+
+    def test_archive(self, index, tmp_path):
+        archive = tmp_path / "backup.ucs"
+        with tarfile.open(archive, "w:gz") as ucs:
+            for name in ("config/bigip.conf", "config/partitions/tenant/bigip.conf"):
+                info = tarfile.TarInfo(name)
+                info.size = len(PARTIAL_BIGIP_CONF)
+                ucs.addfile(info, io.BytesIO(PARTIAL_BIGIP_CONF.encode()))
+        assert index.update([archive]) == IndexStats(
+            indexed=1, unchanged=0, removed=0, secrets=10
+        )
+        records = index.secrets(member="config/partitions/*")
+        assert len(records) == 5
+        assert {record.path for record in records} == {str(archive)}
+        assert PARTIAL_BIGIP_CONF.encode()[records[0].offset :].startswith(
+            records[0].token.encode()
+        )
+        assert index.update([archive]).unchanged == 1
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import pytest
+
+from f5mkupy import metrics
+from f5mkupy.cache import DecryptCache
+from f5mkupy.conf import rewrite_file
+from f5mkupy.f5mku import F5MkuCipher
+from f5mkupy.metrics import (
+    Histogram,
+    Metrics,
+    disable_metrics,
+    enable_metrics,
+    get_metrics,
+)
+
+from .testdata import EXAMPLE_DATASET, F5MKU_K, F5MKU_K_NEW, PARTIAL_BIGIP_CONF
+
+
+@pytest.fixture(name="active_metrics")
+def fixture_active_metrics():
+    yield enable_metrics()
+    disable_metrics()
+
+
+class Test_enable_metrics:
+    def test_enable_disable(self):
+        assert get_metrics() is None
+        instance = Metrics()
+        assert enable_metrics(instance) is instance
+        assert metrics.active is instance
+        disable_metrics()
+        assert get_metrics() is None
+
+    def test_disabled_records_nothing(self, mocker):
+        observe = mocker.spy(Metrics, "observe")
+        F5MkuCipher(F5MKU_K).decrypt_many(
+            [example["ciphertext_raw"] for example in EXAMPLE_DATASET]
+        )
+        assert observe.call_count == 0
+
+
+class Test_Metrics:
+    def test_decrypt_stages(self, active_metrics):
+        cipher = F5MkuCipher(F5MKU_K)
+        cipher.decrypt(EXAMPLE_DATASET[0]["ciphertext_raw"])
+        assert {"key", "parse", "decode", "crypt", "unpad"} <= set(
+            active_metrics.latencies
+        )
+        for stage in ("crypt", "unpad", "decode"):
+            histogram = active_metrics.latencies[stage]
+            assert (histogram.count, histogram.items) == (1, 1)
+
+    def test_batch_items(self, active_metrics):
+        cipher = F5MkuCipher(F5MKU_K)
+        active_metrics.reset()
+        ciphertexts = [example["ciphertext_raw"] for example in EXAMPLE_DATASET]
+        cipher.decrypt_many(ciphertexts)
+        for stage in ("crypt", "unpad"):
+            histogram = active_metrics.latencies[stage]
+            assert (histogram.count, histogram.items) == (1, len(ciphertexts))
+        assert active_metrics.latencies["parse"].count == len(ciphertexts)
+        cipher.encrypt_many(["a", "b"])
+        assert {"pad", "encode"} <= set(active_metrics.latencies)
+        assert active_metrics.latencies["crypt"].items == len(ciphertexts) + 2
+
+    def test_cache_hit_rate(self, active_metrics):
+        cipher = F5MkuCipher(F5MKU_K, cache=DecryptCache())
+        ciphertext = EXAMPLE_DATASET[0]["ciphertext_raw"]
+        for _ in range(4):
+            cipher.decrypt(ciphertext)
+        assert active_metrics.counters == {
+            "decrypt_cache_hits": 3,
+            "decrypt_cache_misses": 1,
+        }
+        assert active_metrics.hit_rate("decrypt_cache") == 0.75
+        assert "decrypt_cache hit rate: 75.0%" in active_metrics.summary()
+        assert active_metrics.hit_rate("unknown") is None
+
+    def test_hooks(self, active_metrics):
+        events = []
+        active_metrics.add_hook(lambda *event: events.append(event))
+        F5MkuCipher(F5MKU_K).encrypt("secret")
+        active_metrics.increment("custom", 2)
+        assert ("counter", "custom", 2) in events
+        assert [name for kind, name, _ in events if kind == "latency"] == [
+            "key",
+            "crypt",
+        ]
+
+    def test_rewrite_file(self, active_metrics, tmp_path):
+        source = tmp_path / "bigip.conf"
+        source.write_text(PARTIAL_BIGIP_CONF)
+        rewrite_file(source, F5MKU_K, F5MKU_K_NEW, target=tmp_path / "target.conf")
+        assert active_metrics.latencies["scan"].items == len(
+            PARTIAL_BIGIP_CONF.splitlines()
+        )
+        assert active_metrics.latencies["write"].count == 1
+
+    def test_summary_and_snapshot(self, active_metrics):
+        active_metrics.observe("crypt", 0.002, items=4)
+        active_metrics.observe("crypt", 0.000_000_4)
+        assert active_metrics.summary() == [
+            "crypt: calls: 2, items: 5, total: 2.000ms, mean: 1000.2us, max: 2000.0us"
+        ]
+        counters, latencies = active_metrics.snapshot()
+        assert counters == {}
+        assert latencies["crypt"].buckets == [1, 0, 0, 0, 1, 0, 0, 0]
+        active_metrics.observe("crypt", 2.0)
+        assert latencies["crypt"].count == 2
+        assert active_metrics.latencies["crypt"].buckets[-1] == 1
+
+
+class Test_Histogram:
+    def test_observe(self):
+        histogram = Histogram()
+        histogram.observe(1e-6)
+        histogram.observe(0.5, items=10)
+        assert histogram == Histogram(
+            count=2,
+            items=11,
+            total=0.500001,
+            max=0.5,
+            buckets=[1, 0, 0, 0, 0, 0, 1, 0],
+        )
+
+    def test_bucket_bounds(self):
+        histogram = Histogram()
+        for seconds in (*Histogram.bounds, 10.0):
+            histogram.observe(seconds)
+        assert histogram.buckets == [1] * (len(Histogram.bounds) + 1)
+        assert (histogram.count, histogram.max) == (8, 10.0)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import pytest
+
+import f5mkupy.model
+from f5mkupy.f5mku import F5MkuCipher
+from f5mkupy.model import LazySecret, TmshBlock, TmshConfig
+
+from .testdata import F5MKU_K, PARTIAL_BIGIP_CONF, PARTIAL_BIGIP_CONF_SECRETS
+
+CLIENTSSL_PROFILE = """#TMSH-VERSION: 15.1.0
+
+ltm profile client-ssl /Common/clientssl_foo {
+    app-service none
+    cert-key-chain {
+        default {
+            cert /Common/foo.crt
+            key /Common/foo.key
+            passphrase $M$ot$tjQRL4+Md7egq3uxcYIN8g==
+        }
+    }
+    description "multi line
+description with spaces"
+    inherit-certkeychain false
+    options { dont-insert-empty-fragments no-tlsv1.3 }
+    renegotiation
+}
+ltm pool /Common/clientssl_foo {
+    members {
+        /Common/node:80 {
+            address 10.0.0.1
+        }
+    }
+}
+"""
+
+
+@pytest.fixture(name="config_path")
+def fixture_config_path(tmp_path):
+    path = tmp_path / "bigip.conf"
+    path.write_text(CLIENTSSL_PROFILE + PARTIAL_BIGIP_CONF)
+    return path
+
+
+class Test_TmshConfig:
+    def test_index(self, config_path):
+        config = TmshConfig(config_path)
+        assert len(config) == 6
+        assert [tmsh_object.header for tmsh_object in config][:2] == [
+            "ltm profile client-ssl /Common/clientssl_foo",
+            "ltm pool /Common/clientssl_foo",
+        ]
+        assert "sys snmp" in config
+        assert config.types()[:2] == ["ltm profile client-ssl", "ltm pool"]
+        assert [o.header for o in config.objects("ltm profile http")] == [
+            "ltm profile http http_encrypted_cookie"
+        ]
+        assert len(config.find("/Common/clientssl_foo")) == 2
+        (pool,) = config.find("/Common/clientssl_foo", type="ltm pool")
+        assert pool.line == 18
+        assert not config.objects("ltm virtual")
+        with pytest.raises(KeyError):
+            config["ltm virtual /Common/vs"]  # pylint: disable=pointless-statement
+
+    def test_lazy_parsing(self, config_path, mocker):
+        parse = mocker.spy(f5mkupy.model, "_parse_stanza")
+        config = TmshConfig(config_path)
+        assert parse.call_count == 0
+        tmsh_object = config["sys file ssl-key rsa.key"]
+        assert not tmsh_object.parsed
+        assert tmsh_object["key-size"] == "2048"
+        assert tmsh_object.parsed
+        assert tmsh_object.raw.startswith(b"sys file ssl-key rsa.key {\n")
+        tmsh_object.get("mode")
+        assert parse.call_count == 1
+        assert not any(o.parsed for o in config if o is not tmsh_object)
+
+    def test_tree(self, config_path):
+        profile = TmshConfig(config_path).find("/Common/clientssl_foo")[0]
+        assert list(profile.body) == [
+            "app-service",
+            "cert-key-chain",
+            "description",
+            "inherit-certkeychain",
+            "options",
+            "renegotiation",
+        ]
+        assert profile["cert-key-chain"]["default"]["cert"] == "/Common/foo.crt"
+        assert profile["description"] == '"multi line\ndescription with spaces"'
+        assert profile["options"] == ["dont-insert-empty-fragments", "no-tlsv1.3"]
+        assert "renegotiation" in profile
+        assert profile["renegotiation"] is None
+        assert profile.get("missing", "default") == "default"
+        pool = TmshConfig(config_path)["ltm pool /Common/clientssl_foo"]
+        assert pool["members"]["/Common/node:80"]["address"] == "10.0.0.1"
+
+    def test_secrets(self, config_path, mocker):
+        decrypt = mocker.spy(F5MkuCipher, "decrypt")
+        config = TmshConfig(config_path, F5MKU_K)
+        secrets = config["sys snmp"].secrets()
+        assert list(secrets) == [
+            "users snmp_user auth-password",
+            "users snmp_user privacy-password",
+        ]
+        secret = secrets["users snmp_user auth-password"]
+        assert isinstance(secret, LazySecret)
+        assert decrypt.call_count == 0
+        assert not secret.decrypted
+        assert secret.value == PARTIAL_BIGIP_CONF_SECRETS[secret.token]
+        assert secret.value == "auth_secret"
+        assert decrypt.call_count == 1
+        assert "auth_secret" not in repr(secret) + str(secret)
+        passphrase = config.find("/Common/clientssl_foo")[0]["cert-key-chain"][
+            "default"
+        ]["passphrase"]
+        assert passphrase.value == "RSASecretKey"
+
+    def test_without_key(self, config_path):
+        secret = TmshConfig(config_path)["sys file ssl-key rsa.key"]["passphrase"]
+        assert str(secret) == "$M$ot$tjQRL4+Md7egq3uxcYIN8g=="
+        with pytest.raises(ValueError):
+            secret.value  # pylint: disable=pointless-statement
+
+
+class Test_TmshBlock:
+    def test_repeated_keys(self):
+        block = TmshBlock([("a", "1"), ("a", "2")])
+        assert block["a"] == "1"
+        assert block.items() == [("a", "1"), ("a", "2")]
+        assert len(block) == 2
+
+    def test_missing_key(self):
+        block = TmshBlock([("a", "1")])
+        assert "b" not in block
+        assert block.get("b") is None
+        assert block.get("b", "2") == "2"
+        with pytest.raises(KeyError):
+            block["b"]  # pylint: disable=pointless-statement
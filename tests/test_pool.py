@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import pytest
+
+import f5mkupy.pool
+from f5mkupy.f5mku import F5MkuCipher
+from f5mkupy.pool import F5MkuPool
+
+from .testdata import EXAMPLE_DATASET, F5MKU_K, F5MKU_K_NEW
+
+CIPHERTEXTS = [example["ciphertext_raw"] for example in EXAMPLE_DATASET] * 100
+PLAINTEXTS = [example["plaintext"] for example in EXAMPLE_DATASET] * 100
+
+
+class Test_F5MkuPool:
+    @pytest.mark.parametrize("processes", [False, True])
+    def test_decrypt_many(self, processes):
+        with F5MkuPool(F5MKU_K, workers=2, processes=processes, chunk_size=64) as pool:
+            results = pool.decrypt_many(CIPHERTEXTS + ["$M$invalid"])
+        assert [result.value for result in results[:-1]] == PLAINTEXTS
+        assert results[-1].value is None and results[-1].error
+
+    @pytest.mark.parametrize("processes", [False, True])
+    def test_encrypt_and_compare_many(self, processes):
+        salts = [example["salt"] for example in EXAMPLE_DATASET] * 100
+        with F5MkuPool(F5MKU_K, workers=2, processes=processes) as pool:
+            encrypted = pool.encrypt_many(PLAINTEXTS, salts=salts)
+            assert [result.value for result in encrypted] == CIPHERTEXTS
+            random_salts = [result.value for result in pool.encrypt_many(PLAINTEXTS)]
+            assert F5MkuCipher(F5MKU_K).decrypt_many(random_salts) == [
+                (plaintext, None) for plaintext in PLAINTEXTS
+            ]
+            compared = pool.compare_many(zip(PLAINTEXTS, CIPHERTEXTS))
+        assert all(result.value is True for result in compared)
+
+    def test_salts_length(self):
+        with pytest.raises(ValueError, match="Number of salts"):
+            F5MkuPool(F5MKU_K).encrypt_many(["a", "b"], salts=["ab"])
+
+    def test_invalid_arguments(self):
+        with pytest.raises(ValueError):
+            F5MkuPool(F5MKU_K, workers=0)
+        with pytest.raises(ValueError):
+            F5MkuPool(F5MKU_K, chunk_size=0)
+
+    def test_single_worker_runs_inline(self, mocker):
+        submit = mocker.spy(f5mkupy.pool.ThreadPoolExecutor, "submit")
+        pool = F5MkuPool(F5MKU_K_NEW, workers=1)
+        assert pool.decrypt_many(CIPHERTEXTS)[0].error
+        assert submit.call_count == 0
+        assert pool._executor is None  # pylint: disable=protected-access
+
+    def test_adaptive_chunk_size(self, mocker):
+        # every item takes 1ms: chunks of 20 items take the target of 20ms
+        mocker.patch.object(
+            f5mkupy.pool,
+            "_run_chunk",
+            side_effect=lambda function, items: (function(items), len(items) * 0.001),
+        )
+        with F5MkuPool(F5MKU_K, workers=4) as pool:
+            assert pool.chunk_size == 256
+            results = pool.decrypt_many(CIPHERTEXTS * 20)
+            assert pool.item_seconds == pytest.approx(0.001)
+            assert pool.chunk_size == 20
+        assert [result.value for result in results] == PLAINTEXTS * 20
+
+    def test_chunks_are_spread_across_workers(self, mocker):
+        run_chunk = mocker.spy(f5mkupy.pool, "_run_chunk")
+        with F5MkuPool(F5MKU_K, workers=4, chunk_size=1000) as pool:
+            pool.decrypt_many(CIPHERTEXTS)
+        sizes = [len(call.args[1]) for call in run_chunk.call_args_list]
+        assert sum(sizes) == len(CIPHERTEXTS)
+        assert sizes[0] == len(CIPHERTEXTS) // 4
+        assert sizes == sorted(sizes, reverse=True)
+        assert min(sizes[:-1]) == 16
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import hashlib
+import io
+import re
+
+import f5mkupy.redact
+from f5mkupy.redact import placeholder, redact_file, redact_stream
+from f5mkupy.scan import scan
+
+from .testdata import PARTIAL_BIGIP_CONF, PARTIAL_BIGIP_CONF_SECRETS
+
+PLACEHOLDER_PATTERN = re.compile(r"\[REDACTED:[0-9a-f]{12}\]")
+
+
+def _redacted_conf():
+    conf = PARTIAL_BIGIP_CONF
+    for ciphertext in PARTIAL_BIGIP_CONF_SECRETS:
+        conf = conf.replace(ciphertext, placeholder(ciphertext.encode()).decode())
+    return conf.encode()
+
+
+class Test_placeholder:
+    def test_function(self):
+        assert (
+            placeholder(b"$M$iP$rr0su9oHn9J9p1t3nRzydA==") == b"[REDACTED:b36bd7179433]"
+        )
+        tokens = [token.encode() for token in PARTIAL_BIGIP_CONF_SECRETS]
+        placeholders = [placeholder(token) for token in tokens]
+        assert len(set(placeholders)) == len(tokens)
+        assert all(PLACEHOLDER_PATTERN.fullmatch(p.decode()) for p in placeholders)
+
+    def test_fingerprint(self):
+        token = b"$M$ot$tjQRL4+Md7egq3uxcYIN8g=="
+        assert placeholder(token) == placeholder(token)
+        assert (
+            placeholder(token)[10:-1] == hashlib.sha256(token).hexdigest()[:12].encode()
+        )
+
+
+class Test_redact_stream:
+    def test_function(self):
+        target = io.BytesIO()
+        assert redact_stream(io.BytesIO(PARTIAL_BIGIP_CONF.encode()), target) == 5
+        assert target.getvalue() == _redacted_conf()
+        assert not list(scan(target.getvalue()))
+
+    def test_small_reads(self, monkeypatch):
+        monkeypatch.setattr(f5mkupy.redact, "_READ_SIZE", 7)
+        target = io.BytesIO()
+        assert redact_stream(io.BytesIO(PARTIAL_BIGIP_CONF.encode()), target) == 5
+        assert target.getvalue() == _redacted_conf()
+
+    def test_without_trailing_line_break(self):
+        token = "$M$ot$tjQRL4+Md7egq3uxcYIN8g=="
+        target = io.BytesIO()
+        source = f"a {token} b {token}\npassphrase {token}".encode()
+        assert redact_stream(io.BytesIO(source), target) == 3
+        expected = placeholder(token.encode())
+        assert target.getvalue() == b"a %s b %s\npassphrase %s" % ((expected,) * 3)
+
+    def test_empty(self):
+        target = io.BytesIO()
+        assert redact_stream(io.BytesIO(b""), target) == 0
+        assert target.getvalue() == b""
+
+    def test_malformed_tokens(self):
+        tokens = [b"$M$xx$YWJj", b"$M$ot$tjQRL4+Md7", b"$M$ot", b"$M$$"]
+        source = (
+            b'description $M$xx$YWJj\npassphrase "$M$ot$tjQRL4+Md7"\nkey $M$ot $M$$\n'
+        )
+        target = io.BytesIO()
+        assert redact_stream(io.BytesIO(source), target) == 4
+        assert (
+            target.getvalue()
+            == b'description %s\npassphrase "%s"\nkey %s %s\n'
+            % tuple(placeholder(token) for token in tokens)
+        )
+
+
+class Test_redact_file:
+    def test_target(self, tmp_path):
+        source = tmp_path / "bigip.conf"
+        source.write_text(PARTIAL_BIGIP_CONF)
+        target = tmp_path / "redacted.conf"
+        assert redact_file(source, target) == 5
+        assert target.read_bytes() == _redacted_conf()
+        assert redact_file(source, source) == 5
+        assert source.read_bytes() == _redacted_conf()
+
+    def test_stdout(self, tmp_path, capfdbinary):
+        source = tmp_path / "bigip.conf"
+        source.write_text(PARTIAL_BIGIP_CONF)
+        assert redact_file(source) == 5
+        out, _ = capfdbinary.readouterr()
+        assert out == _redacted_conf()
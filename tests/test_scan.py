@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import mmap
+
+from f5mkupy.f5mku import decrypt
+from f5mkupy.scan import F5Span, _is_block_aligned, scan, scan_file
+
+from .testdata import F5MKU_K, PARTIAL_BIGIP_CONF, PARTIAL_BIGIP_CONF_SECRETS
+
+
+class Test_scan:
+    def test_function(self):
+        buffer = PARTIAL_BIGIP_CONF.encode()
+        spans = list(scan(buffer))
+        assert [span.token.decode() for span in spans] == list(
+            PARTIAL_BIGIP_CONF_SECRETS
+        )
+        for span in spans:
+            assert buffer[span.start : span.end] == span.token
+            assert (
+                decrypt(span.token.decode(), F5MKU_K)
+                == PARTIAL_BIGIP_CONF_SECRETS[span.token.decode()]
+            )
+
+    def test_span(self):
+        assert list(scan(b'x "$M$ot$tjQRL4+Md7egq3uxcYIN8g==" y')) == [
+            F5Span(start=3, end=33, salt=b"ot", ciphertext=b"tjQRL4+Md7egq3uxcYIN8g==")
+        ]
+
+    def test_multiple_per_line(self):
+        spans = list(
+            scan(b"{ $M$ot$tjQRL4+Md7egq3uxcYIN8g== $M$94$JoV46NWhBTc2/C8iEiq+bQ== }\n")
+        )
+        assert [span.salt for span in spans] == [b"ot", b"94"]
+
+    def test_drops_invalid_lengths(self):
+        assert not list(scan(b"$M$xx$YWJj $M$xx$YWJjZA= $M$xx$ $M$$YWJj"))
+
+    def test_memoryview_and_range(self):
+        buffer = memoryview(PARTIAL_BIGIP_CONF.encode())
+        spans = list(scan(buffer))
+        assert list(scan(buffer, start=spans[1].start, end=spans[2].end)) == spans[1:3]
+
+    def test_mmap(self, tmp_path):
+        path = tmp_path / "bigip.conf"
+        path.write_bytes(PARTIAL_BIGIP_CONF.encode() * 3)
+        with open(path, "rb") as config_file, mmap.mmap(
+            config_file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as buffer:
+            assert len(list(scan(buffer))) == 3 * len(PARTIAL_BIGIP_CONF_SECRETS)
+
+
+class Test_scan_file:
+    def test_function(self, tmp_path):
+        path = tmp_path / "bigip.conf"
+        path.write_bytes(PARTIAL_BIGIP_CONF.encode())
+        assert list(scan_file(path)) == list(scan(PARTIAL_BIGIP_CONF.encode()))
+
+    def test_empty_file(self, tmp_path):
+        path = tmp_path / "empty.conf"
+        path.write_bytes(b"")
+        assert not list(scan_file(path))
+
+
+class Test_is_block_aligned:
+    def test_aligned(self):
+        assert _is_block_aligned(b"tjQRL4+Md7egq3uxcYIN8g==")
+        assert _is_block_aligned(b"RSno8kNmrJa2x1UuC9A5InWj8kNBCO8YWOVhoH7Kkic=")
+
+    def test_not_aligned(self):
+        assert not _is_block_aligned(b"YWJj")
+        assert not _is_block_aligned(b"tjQRL4+Md7egq3uxcYIN8g=")
+        assert not _is_block_aligned(b"")
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=line-too-long,missing-module-docstring,missing-function-docstring,missing-class-docstring,invalid-name
+import json
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from f5mkupy.f5mku import F5MkuCipher, decrypt
+from f5mkupy.server import F5MkuClient, make_server, parse_keys, process_requests
+
+from .testdata import EXAMPLE_DATASET, F5MKU_K, F5MKU_K_NEW
+
+
+@pytest.fixture(name="unix_server")
+def fixture_unix_server(tmp_path):
+    path = str(tmp_path / "f5mkupy.sock")
+    server = make_server({"default": F5MKU_K, "new": F5MKU_K_NEW}, path=path)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture(name="tcp_server")
+def fixture_tcp_server():
+    server = make_server({"default": F5MKU_K}, port=0)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+class Test_parse_keys:
+    def test_function(self):
+        assert parse_keys([F5MKU_K, f"new:{F5MKU_K_NEW}"]) == {
+            "default": F5MKU_K,
+            "new": F5MKU_K_NEW,
+        }
+
+    def test_names_with_colons(self):
+        assert parse_keys([f"site:old:{F5MKU_K}"]) == {"site:old": F5MKU_K}
+
+
+class Test_process_requests:
+    def test_function(self):
+        ciphers = {"default": F5MkuCipher(F5MKU_K)}
+        example = EXAMPLE_DATASET[0]
+        requests = [
+            {"id": 1, "op": "decrypt", "ciphertext": example.get("ciphertext_raw")},
+            {
+                "id": 2,
+                "op": "encrypt",
+                "plaintext": example.get("plaintext"),
+                "salt": example.get("salt"),
+            },
+            {
+                "id": 3,
+                "op": "compare",
+                "plaintext": example.get("plaintext"),
+                "ciphertext": example.get("ciphertext_raw"),
+            },
+            {
+                "id": 4,
+                "op": "decrypt",
+                "ciphertext": EXAMPLE_DATASET[1].get("ciphertext_raw"),
+            },
+        ]
+        responses = process_requests(
+            [json.dumps(request).encode() for request in requests], ciphers
+        )
+        assert responses == [
+            {"id": 1, "result": example.get("plaintext")},
+            {"id": 2, "result": example.get("ciphertext_raw")},
+            {"id": 3, "result": True},
+            {"id": 4, "result": EXAMPLE_DATASET[1].get("plaintext")},
+        ]
+
+    def test_errors(self):
+        ciphers = {"default": F5MkuCipher(F5MKU_K)}
+        responses = process_requests(
+            [
+                b"not json",
+                b"[]",
+                b'{"id": 1, "op": "unknown"}',
+                b'{"id": 2, "op": "decrypt", "key": "missing", "ciphertext": "x"}',
+                b'{"id": 3, "op": "decrypt", "ciphertext": 5}',
+                b'{"id": 4, "op": "decrypt", "ciphertext": "$M$xx$invalid"}',
+                b'{"id": 5, "op": "decrypt", "key": ["unhashable"], "ciphertext": "x"}',
+            ],
+            ciphers,
+        )
+        assert [response["id"] for response in responses] == [None, None, 1, 2, 3, 4, 5]
+        assert all("error" in response for response in responses)
+        assert responses[2]["error"] == "Unknown op: unknown"
+        assert responses[3]["error"] == "Unknown key: missing"
+
+    def test_batch_error(self, mocker):
+        mocker.patch.object(
+            F5MkuCipher, "decrypt_many", side_effect=RuntimeError("boom")
+        )
+        example = EXAMPLE_DATASET[0]
+        responses = process_requests(
+            [
+                json.dumps(
+                    {"id": 1, "op": "decrypt", "ciphertext": example["ciphertext_raw"]}
+                ).encode(),
+                json.dumps(
+                    {
+                        "id": 2,
+                        "op": "compare",
+                        "plaintext": example["plaintext"],
+                        "ciphertext": example["ciphertext_raw"],
+                    }
+                ).encode(),
+            ],
+            {"default": F5MkuCipher(F5MKU_K)},
+        )
+        assert responses == [
+            {"id": 1, "error": "Internal error: RuntimeError('boom')"},
+            {"id": 2, "result": True},
+        ]
+
+
+class Test_server:
+    def test_unix_socket(self, unix_server):
+        assert stat.S_IMODE(os.stat(unix_server).st_mode) == 0o600
+        example = EXAMPLE_DATASET[0]
+        with F5MkuClient(path=unix_server, timeout=5) as client:
+            assert client.decrypt(example.get("ciphertext_raw")) == example.get(
+                "plaintext"
+            )
+            assert client.encrypt(
+                example.get("plaintext"), salt=example.get("salt")
+            ) == example.get("ciphertext_raw")
+            assert client.compare(
+                example.get("plaintext"), example.get("ciphertext_raw")
+            )
+            assert not client.compare("wrong", example.get("ciphertext_raw"))
+            ciphertext = client.encrypt(example.get("plaintext"), key="new")
+            assert decrypt(ciphertext, F5MKU_K_NEW) == example.get("plaintext")
+            with pytest.raises(ValueError):
+                client.decrypt(example.get("ciphertext_raw"), key="new")
+
+    def test_pipelining(self, unix_server):
+        requests = [
+            {"id": index, "op": "decrypt", "ciphertext": example.get("ciphertext_raw")}
+            for index, example in enumerate(EXAMPLE_DATASET * 500)
+        ]
+        with F5MkuClient(path=unix_server, timeout=5) as client:
+            responses = client.request_many(requests)
+        assert [response["id"] for response in responses] == list(range(len(requests)))
+        assert [response["result"] for response in responses] == [
+            example.get("plaintext") for example in EXAMPLE_DATASET * 500
+        ]
+
+    def test_pipelining_bad_item(self, unix_server):
+        example = EXAMPLE_DATASET[0]
+        requests = [
+            {"id": 1, "op": "decrypt", "ciphertext": example.get("ciphertext_raw")},
+            {
+                "id": 2,
+                "op": "compare",
+                "plaintext": "\ud800",
+                "ciphertext": example.get("ciphertext_raw"),
+            },
+            {
+                "id": 3,
+                "op": "compare",
+                "plaintext": example.get("plaintext"),
+                "ciphertext": example.get("ciphertext_raw"),
+            },
+            {"id": 4, "op": "encrypt", "plaintext": "\ud800"},
+        ]
+        with F5MkuClient(path=unix_server, timeout=5) as client:
+            responses = client.request_many(requests)
+            assert client.decrypt(example.get("ciphertext_raw")) == example.get(
+                "plaintext"
+            )
+        assert [response["id"] for response in responses] == [1, 2, 3, 4]
+        assert responses[0]["result"] == example.get("plaintext")
+        assert "error" in responses[1]
+        assert responses[2]["result"] is True
+        assert "error" in responses[3]
+
+    def test_tcp(self, tcp_server):
+        host, port = tcp_server
+        example = EXAMPLE_DATASET[3]
+        with F5MkuClient(host=host, port=port, timeout=5) as client:
+            assert client.decrypt(example.get("ciphertext_raw")) == example.get(
+                "plaintext"
+            )
+
+    def test_make_server_arguments(self, tmp_path):
+        with pytest.raises(ValueError):
+            make_server({}, path=str(tmp_path / "sock"))
+        with pytest.raises(ValueError):
+            make_server({"default": F5MKU_K})
+        with pytest.raises(ValueError, match="non-loopback"):
+            make_server({"default": F5MKU_K}, host="0.0.0.0", port=0)
+        with pytest.raises(ValueError, match="non-loopback"):
+            make_server({"default": F5MKU_K}, host="invalid.invalid", port=0)
+
+    def test_running_server_socket_is_kept(self, unix_server):
+        with pytest.raises(OSError):
+            make_server({"default": F5MKU_K}, path=unix_server)
+        with F5MkuClient(path=unix_server, timeout=5) as client:
+            assert client.compare(
+                EXAMPLE_DATASET[0].get("plaintext"),
+                EXAMPLE_DATASET[0].get("ciphertext_raw"),
+            )
+
+    def test_stale_socket_is_replaced(self, tmp_path):
+        path = str(tmp_path / "f5mkupy.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(path)
+        server = make_server({"default": F5MKU_K}, path=path)
+        server.server_close()
+        assert not os.path.exists(path)
+
+    def test_other_files_are_kept(self, tmp_path):
+        path = tmp_path / "f5mkupy.sock"
+        path.write_text("not a socket")
+        with pytest.raises(OSError):
+            make_server({"default": F5MKU_K}, path=str(path))
+        assert path.read_text() == "not a socket"
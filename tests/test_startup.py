@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Startup imports of the package and the CLI, recorded with python -X importtime."""
+
+# pylint: disable=line-too-long,missing-function-docstring
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from .testdata import EXAMPLE_DATASET, F5MKU_K
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules which must only be imported by the code paths that need them
+HEAVY_MODULES = [
+    "cryptography",
+    "multiprocessing",
+    "concurrent.futures.process",
+    "socketserver",
+]
+
+
+def _import_times(*args):
+    """Runs python -X importtime with `args`, returns cumulative import time (us) by module name."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        import_times[module.strip()] = int(cumulative)
+    return import_times
+
+
+def _heavy_modules(import_times):
+    return [
+        module
+        for module in import_times
+        for heavy_module in HEAVY_MODULES
+        if module == heavy_module or module.startswith(f"{heavy_module}.")
+    ]
+
+
+def test_import_cli():
+    import_times = _import_times("-c", "import f5mkupy.cli")
+    assert "f5mkupy.cli" in import_times
+    assert _heavy_modules(import_times) == []
+
+
+def test_import_package():
+    import_times = _import_times("-c", "import f5mkupy")
+    assert "f5mkupy.f5mku" not in import_times
+    assert _heavy_modules(import_times) == []
+
+
+def test_validate():
+    import_times = _import_times(
+        "-c", "import f5mkupy; f5mkupy.validate('$M$iP$rr0su9oHn9J9p1t3nRzydA==')"
+    )
+    assert "f5mkupy.f5mku" not in import_times
+    assert _heavy_modules(import_times) == []
+
+
+def test_version():
+    assert _heavy_modules(_import_times("-m", "f5mkupy", "--version")) == []
+
+
+def test_extract_salt():
+    import_times = _import_times(
+        "-m", "f5mkupy", "extract_salt", EXAMPLE_DATASET[0].get("ciphertext_raw")
+    )
+    assert _heavy_modules(import_times) == []
+
+
+def test_redact(tmp_path):
+    source = tmp_path / "bigip.conf"
+    source.write_text(f"passphrase {EXAMPLE_DATASET[0].get('ciphertext_raw')}\n")
+    import_times = _import_times(
+        "-m", "f5mkupy", "redact", "-o", str(tmp_path / "redacted.conf"), str(source)
+    )
+    assert _heavy_modules(import_times) == []
+
+
+def test_decrypt_imports_cryptography():
+    import_times = _import_times(
+        "-m",
+        "f5mkupy",
+        "decrypt",
+        "-k",
+        F5MKU_K,
+        EXAMPLE_DATASET[0].get("ciphertext_raw"),
+    )
+    assert "cryptography" in import_times
+
+
+def test_lazy_package_attributes():
+    import f5mkupy  # pylint: disable=import-outside-toplevel
+
+    assert f5mkupy.decrypt(EXAMPLE_DATASET[0].get("ciphertext_raw"), F5MKU_K) == (
+        EXAMPLE_DATASET[0].get("plaintext")
+    )
+    assert set(f5mkupy.__all__) <= set(dir(f5mkupy))
+    # pylint: disable-next=import-outside-toplevel
+    from f5mkupy import f5mku, identify, validation
+
+    for module in (f5mku, identify, validation):
+        assert set(module.__all__) <= set(f5mkupy.__all__)
+    assert f5mkupy.identify_keys is identify.identify_keys
+    assert f5mkupy.validate is validation.validate is f5mku.validate
+    with pytest.raises(AttributeError):
+        f5mkupy.does_not_exist  # pylint: disable=pointless-statement,no-member
@@ -29,3 +29,40 @@ EXAMPLE_DATASET = [
         "ciphertext_raw": "$M$fR$RSno8kNmrJa2x1UuC9A5InWj8kNBCO8YWOVhoH7Kkic=",
     },
 ]
+F5MKU_K_NEW = "ukDKiN3j4YfWPI8FPbZLoA=="
+PARTIAL_BIGIP_CONF = """ltm profile http http_encrypted_cookie {
+    encrypt-cookie-secret $M$a5$aN5T54P8HpAU6tjBWSFcFQ==
+    encrypt-cookies { CookieName }
+}
+ltm persistence cookie encrypted_cookie_persistence {
+    cookie-encryption required
+    cookie-encryption-passphrase $M$0R$qWOqGDNDRFsadpueQtUXxwBDMV17KJUEP4uDVuJE3Ls=
+}
+sys snmp {
+    users {
+        snmp_user {
+            auth-password $M$94$JoV46NWhBTc2/C8iEiq+bQ==
+            auth-protocol sha256
+            privacy-password $M$oR$W698cPIUCI6u73Go0qXhTA==
+            privacy-protocol aes256
+            username snmp_user
+        }
+    }
+}
+sys file ssl-key rsa.key {
+    checksum SHA1:1766:7a1a1fb0aa1e73d0a298f9cf673bad33967b80bc
+    key-size 2048
+    mode 33184
+    passphrase $M$ot$tjQRL4+Md7egq3uxcYIN8g==
+    revision 1
+    security-type password
+    size 1766
+}
+"""
+PARTIAL_BIGIP_CONF_SECRETS = {
+    "$M$a5$aN5T54P8HpAU6tjBWSFcFQ==": "newSecretKey",
+    "$M$0R$qWOqGDNDRFsadpueQtUXxwBDMV17KJUEP4uDVuJE3Ls=": "new_secretive_passphrase",
+    "$M$94$JoV46NWhBTc2/C8iEiq+bQ==": "auth_secret",
+    "$M$oR$W698cPIUCI6u73Go0qXhTA==": "priv_secret",
+    "$M$ot$tjQRL4+Md7egq3uxcYIN8g==": "RSASecretKey",
+}